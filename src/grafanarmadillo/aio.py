@@ -0,0 +1,381 @@
+"""
+Asyncio counterparts of Finder, Dashboarder and Alerter, using the `AsyncGrafanaApi` from grafana_client.
+
+They have the same methods and semantics as their synchronous counterparts, as coroutines.
+Many requests can be in flight at once:
+	finder = AsyncFinder(AsyncGrafanaApi(**cfg))
+	dashboards = await asyncio.gather(*(finder.get_dashboard(folder, name) for folder, name in paths))
+
+Creating objects is serialised per object, so concurrent `create_or_get_*` calls for the same object only create it once.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from itertools import count
+from typing import (
+	AsyncIterator,
+	Awaitable,
+	Callable,
+	Dict,
+	Hashable,
+	Iterable,
+	List,
+	Optional,
+	Tuple,
+	TypeVar,
+	Union,
+)
+
+from grafana_client import AsyncGrafanaApi
+from grafana_client.client import GrafanaClientError
+
+from grafanarmadillo.alerter import AlerterBase
+from grafanarmadillo.dashboarder import DashboarderBase
+from grafanarmadillo.find import FinderBase, default_api_v, default_page_size
+from grafanarmadillo.instrument import instrumented
+from grafanarmadillo.paths import PathCodec
+from grafanarmadillo.types import (
+	AlertContent,
+	AlertSearchResult,
+	DashboardContent,
+	DashboardSearchResult,
+	FolderSearchResult,
+	GrafanaPath,
+	GrafanaVersion,
+	PathLike,
+)
+from grafanarmadillo.util import Cache, CacheMode
+
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+
+async def async_prefetch_map(f: Callable[[T], Awaitable[U]], xs: Iterable[T], concurrency: int) -> AsyncIterator[U]:
+	"""
+	Map a coroutine function over items, with up to `concurrency` in flight, yielding results in order.
+
+	This is the asyncio counterpart of `prefetch_map`.
+	"""
+	pending: deque = deque()
+	try:
+		for x in xs:
+			pending.append(asyncio.ensure_future(f(x)))
+			if len(pending) >= concurrency:
+				yield await pending.popleft()
+		while pending:
+			yield await pending.popleft()
+	finally:
+		for task in pending:
+			task.cancel()
+		await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def async_iterate(xs: Iterable[T]) -> AsyncIterator[T]:
+	"""Iterate over a blocking iterable, advancing it in worker threads so that the event loop is not blocked."""
+	it = iter(xs)
+	done = object()
+	while (x := await asyncio.to_thread(next, it, done)) is not done:
+		yield x
+
+
+class _KeyedLocks:
+	"""Locks which serialise work on the same key."""
+
+	def __init__(self):
+		self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+	def __call__(self, k: Hashable) -> asyncio.Lock:
+		if k not in self._locks:
+			self._locks[k] = asyncio.Lock()
+		return self._locks[k]
+
+
+class AsyncFinder(FinderBase):
+	"""
+	Collection of methods for finding Grafana dashboards and folders, with asyncio.
+
+	See `Finder`. The logic which does not make requests is shared with it through `FinderBase`.
+	"""
+
+	def __init__(self, api: AsyncGrafanaApi, api_v: GrafanaVersion = default_api_v, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+		super().__init__(api, api_v, cache_mode)
+		self._creating = _KeyedLocks()
+
+	async def iter_dashboards(self, page_size: int = default_page_size) -> AsyncIterator[DashboardSearchResult]:
+		"""Iterate over all dashboards, a page of search results at a time. See `Finder.iter_dashboards`."""
+		for page in count(1):
+			results = await self._cache.agetor(
+				("list_dashboards", page_size, page),
+				lambda: self.api.search.search_dashboards(type_="dash-db", limit=page_size, page=page),
+			)
+			for result in results:
+				yield result
+			if len(results) < page_size:
+				return
+
+	@instrumented
+	async def list_dashboards(self, page_size: int = default_page_size) -> List[DashboardSearchResult]:
+		"""List all dashboards."""
+		return [d async for d in self.iter_dashboards(page_size)]
+
+	@instrumented
+	async def list_alerts(self) -> List[AlertSearchResult]:
+		"""List all alerts."""
+		return await self._cache.agetor("list_alerts", lambda: self.api.alertingprovisioning.get_alertrules_all())
+
+	@instrumented
+	async def find_dashboards(self, name: str) -> List[DashboardSearchResult]:
+		"""Find all dashboards with a name. Returns exact matches only."""
+		return [x for x in await self.api.search.search_dashboards(query=name, type_="dash-db") if x["title"] == name]
+
+	async def _enumerate_dashboards_in_folders(self, folder_ids: Tuple[str, ...]):
+		return await self._cache.agetor(
+			("_enumerate_dashboards_in_folders", folder_ids),
+			lambda: self.api.search.search_dashboards(query=None, type_="dash-db", **self._folder_search_kwargs(folder_ids)),
+		)
+
+	@instrumented
+	async def get_dashboards_in_folders(self, folder_names: List[str]) -> List[DashboardSearchResult]:
+		"""Get all dashboards in folders."""
+		folder_objects = await asyncio.gather(*(self.get_folder(name=folder_name) for folder_name in folder_names))
+		return await self._enumerate_dashboards_in_folders(self._folder_ids(folder_objects))
+
+	@instrumented
+	async def get_alerts_in_folders(self, folder_names: List[str]) -> List[AlertSearchResult]:
+		"""Get all alerts in folders."""
+		folder_objects = await asyncio.gather(*(self.get_folder(name=folder_name) for folder_name in folder_names))
+		return self._alerts_in_folders(await self.list_alerts(), folder_objects)
+
+	@instrumented
+	async def get_folder(self, name) -> FolderSearchResult:
+		"""Get a folder by name. Folders don't nest, so this will return at most 1 folder."""
+		async def _get_folder() -> FolderSearchResult:
+			if name == "General":
+				return self._general_folder(await self.api.folder.get_folder_by_id(0))
+			else:
+				search_result = await self.api.search.search_dashboards(query=name, type_="dash-folder")
+				return self._one_folder(await asyncio.gather(*(self.api.folder.get_folder(sr["uid"]) for sr in search_result)), name)
+		return await self._cache.agetor(("get_folder", name), _get_folder)
+
+	@instrumented
+	async def create_or_get_folder(self, name: str) -> FolderSearchResult:
+		"""
+		Create a new folder if it does not exist.
+
+		Returns the search information if it does.
+		"""
+		async with self._creating(("folder", name)):
+			try:
+				folder = await self.get_folder(name)
+			except ValueError:
+				folder = await self.api.folder.create_folder(name)
+				self._cache.set(("get_folder", name), folder)
+		return folder
+
+	@instrumented
+	async def get_dashboard(self, folder_name: str, dashboard_name: str) -> DashboardSearchResult:
+		"""
+		Get a dashboard by its parent folder and dashboard name.
+
+		Dashboards without a parent are children of the "General" folder.
+		"""
+		folder_object = await self.get_folder(folder_name)
+		dashboards = await self._enumerate_dashboards_in_folders(self._folder_ids([folder_object]))
+		return self._one_dashboard(dashboards, folder_name, dashboard_name)
+
+	@instrumented
+	async def resolve_dashboard_uids(self, uids: Iterable[str], chunk_size: int = 100) -> Dict[str, GrafanaPath]:
+		"""Get the paths of many dashboards by their uids, with a search for every `chunk_size` uids. See `Finder.resolve_dashboard_uids`."""
+		resolved, missing = self._cached_dashboard_paths(uids)
+		chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+		searches = await asyncio.gather(*(self.api.search.search_dashboards(type_="dash-db", dashboard_uids=chunk, limit=len(chunk)) for chunk in chunks))
+		for results in searches:
+			self._remember_dashboard_paths(results, resolved)
+		return resolved
+
+	@instrumented
+	async def get_dashboard_by_uid(self, uid: str) -> GrafanaPath:
+		"""Get a dashboard by its uid. See `Finder.get_dashboard_by_uid`."""
+		resolved = await self.resolve_dashboard_uids([uid])
+		if uid in resolved:
+			return resolved[uid]
+		return self._dashboard_path(await self.api.dashboard.get_dashboard(uid))
+
+	@instrumented
+	async def get_alert(self, folder_name, alert_name) -> AlertSearchResult:
+		"""Get an alert by its parent folder and alert name."""
+		return self._one_alert(await self.list_alerts(), await self.get_folder(folder_name), folder_name, alert_name)
+
+	@instrumented
+	async def get_from_path(self, path: PathLike) -> Union[DashboardSearchResult, AlertSearchResult]:
+		"""Get a dashboard from a string path like `/folder0/dashboard0`."""
+		address = PathCodec.try_parse(path)
+		return await self.get_dashboard(address.folder, address.name)
+
+	@instrumented
+	async def get_alert_from_path(self, path: PathLike) -> AlertSearchResult:
+		"""Get an alert from a string path like `/folder0/alert0`."""
+		address = PathCodec.try_parse(path)
+		return await self.get_alert(address.folder, address.name)
+
+	@instrumented
+	async def create_or_get_dashboard(self, path: PathLike) -> Tuple[DashboardSearchResult, Optional[FolderSearchResult]]:
+		"""
+		Create a new empty dashboard if it does not exist.
+
+		Returns the search information if it does
+		"""
+		address = PathCodec.try_parse(path)
+		folder = await self.create_or_get_folder(address.folder)
+
+		async with self._creating(("dashboard", address.folder, address.name)):
+			try:
+				dashboard = await self.get_dashboard(address.folder, address.name)
+			except ValueError:
+				await self.api.dashboard.update_dashboard(self._new_dashboard(address.name, folder))
+				self._forget_dashboards()
+
+				dashboard = await self.get_dashboard(address.folder, address.name)
+
+		return dashboard, folder
+
+	@instrumented
+	async def create_or_get_alert(self, path: PathLike) -> Tuple[AlertSearchResult, FolderSearchResult]:
+		"""
+		Get the information about an alert or create a new "empty" alert if it does not exist.
+
+		See `Finder.create_or_get_alert`.
+		"""
+		address = PathCodec.try_parse(path)
+		folder = await self.create_or_get_folder(address.folder)
+
+		async with self._creating(("alert", address.folder, address.name)):
+			try:
+				alert = await self.get_alert(address.folder, address.name)
+			except ValueError:
+				await self.api.alertingprovisioning.create_alertrule(
+					self._mk_null_alert(folder["uid"], address.name),
+					disable_provenance=True
+				)
+				self._cache.unset("list_alerts")
+
+				alert = await self.get_alert(address.folder, address.name)
+
+		return alert, folder
+
+
+class AsyncDashboarder(DashboarderBase):
+	"""
+	Collection of methods for managing dashboards, with asyncio.
+
+	See `Dashboarder`. The logic which does not make requests is shared with it through `DashboarderBase`.
+	"""
+
+	def __init__(self, api: AsyncGrafanaApi, skip_unchanged: bool = False, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+		super().__init__(api, skip_unchanged, cache_mode)
+
+	@instrumented
+	async def get_dashboard_content(self, dashboard: DashboardSearchResult) -> DashboardContent:
+		"""Get the contents of a Grafana dashboard."""
+		return (await self.api.dashboard.get_dashboard(dashboard["uid"]))["dashboard"]
+
+	async def live_state(self, uid: str) -> Optional[dict]:
+		"""Get the hash, folder and identity of the dashboard in Grafana, if it exists."""
+		async def _get_live_state():
+			try:
+				result = await self.api.dashboard.get_dashboard(uid)
+			except GrafanaClientError as e:
+				if e.status_code == 404:
+					return None
+				raise
+			return self._live_state_of(result)
+
+		return await self._cache.agetor(("dashboard_state", uid), _get_live_state, cache_falsy=True)
+
+	async def _save(self, new_dashboard: dict):
+		"""Save a dashboard, unless it is unchanged."""
+		uid = self._comparable_uid(new_dashboard)
+		if uid is not None:
+			unchanged = self._unchanged_result(new_dashboard, await self.live_state(uid))
+			if unchanged:
+				return unchanged
+
+		result = await self.api.dashboard.update_dashboard(new_dashboard)
+		self._remember_saved(new_dashboard, result)
+		return result
+
+	@instrumented
+	async def set_dashboard_content(
+		self, dashboard: DashboardSearchResult, content: DashboardContent
+	):
+		"""Set the content of a Grafana dashboard, leaving out the identity information."""
+		return await self._save(self._updated_dashboard(dashboard, content))
+
+	@instrumented
+	async def import_dashboard(
+		self, content: DashboardContent, folder: Optional[FolderSearchResult] = None
+	):
+		"""Import a dashboard into Grafana, optionally into a folder."""
+		return await self._save(self._imported_dashboard(content, folder))
+
+	@instrumented
+	async def export_dashboard(
+		self, dashboard: DashboardSearchResult
+	) -> Tuple[DashboardContent, Optional[FolderSearchResult]]:
+		"""Export a dashboard from grafana, with its folder information if applicable."""
+		result = await self.api.dashboard.get_dashboard(dashboard["uid"])
+		meta, dashboard = result["meta"], result["dashboard"]
+		if meta["folderUid"]:
+			folder = await self._cache.agetor(("folder", meta["folderUid"]), lambda: self.api.folder.get_folder(meta["folderUid"]))
+		else:
+			folder = None
+
+		return dashboard, folder
+
+
+class AsyncAlerter(AlerterBase):
+	"""
+	Collection of methods for managing alert rules, with asyncio.
+
+	See `Alerter`. The logic which does not make requests is shared with it through `AlerterBase`.
+	"""
+
+	def __init__(self, api: AsyncGrafanaApi, disable_provenance=True, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+		super().__init__(api, disable_provenance, cache_mode)
+
+	@instrumented
+	async def import_alert(
+		self, content: AlertContent, folder: FolderSearchResult
+	):
+		"""Import an alert into Grafana."""
+		content = self._imported_alert(content, folder)
+
+		try:
+			if "uid" in content:
+				exists = await self.api.alertingprovisioning.get_alertrule(content["uid"])
+			else:
+				exists = None
+		except GrafanaClientError as e:
+			if e.status_code == 404:
+				exists = None
+			else:
+				raise
+
+		if exists:
+			await self.api.alertingprovisioning.update_alertrule(content["uid"], content, disable_provenance=self.disable_provenance)
+		else:
+			await self.api.alertingprovisioning.create_alertrule(content, disable_provenance=self.disable_provenance)
+		self._remember_saved()
+
+	@instrumented
+	async def export_alert(
+		self, alert: AlertSearchResult
+	) -> Tuple[AlertContent, Optional[FolderSearchResult]]:
+		"""Export an alert from Grafana and its folder information too."""
+		alert_content = await self.api.alertingprovisioning.get_alertrule(alert["uid"])
+
+		folder = await self._cache.agetor(("folder", alert_content["folderUID"]), lambda: self.api.folder.get_folder(alert_content["folderUID"]))
+
+		return alert_content, folder
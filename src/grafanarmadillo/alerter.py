@@ -4,27 +4,51 @@ from typing import Optional, Tuple, Union
 from grafana_client import GrafanaApi
 from grafana_client.client import GrafanaClientError
 
+from grafanarmadillo.instrument import instrumented
 from grafanarmadillo.types import AlertContent, AlertSearchResult, FolderSearchResult
 from grafanarmadillo.util import Cache, CacheMode
 
 
-class Alerter:
-	"""Collection of methods for managing alert rules."""
+class AlerterBase:
+	"""
+	The parts of managing alert rules which do not make requests.
 
-	def __init__(self, api: GrafanaApi, disable_provenance=True, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+	These are shared by Alerter and `grafanarmadillo.aio.AsyncAlerter`,
+	which make the requests synchronously or with asyncio, and use these to build the requests and interpret their results.
+	"""
+
+	def __init__(self, api, disable_provenance=True, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
 		super().__init__()
 		self.api = api
 		self.disable_provenance = disable_provenance
 		self._cache = CacheMode.select(cache_mode)
 
-	def import_alert(
-		self, content: AlertContent, folder: FolderSearchResult
-	):
-		"""Import an alert into Grafana."""
+	@staticmethod
+	def _imported_alert(content: AlertContent, folder: FolderSearchResult) -> AlertContent:
+		"""Build the request to import an alert into a folder."""
 		content = content.copy()
 		# set the folder in case it isn't, which would happen if the metadata was scrubbed from the alert content
 		content["folderUID"] = folder["uid"]
 		content.pop("id", None)
+		return content
+
+	def _remember_saved(self):
+		"""Forget cached alert listings, which no longer match Grafana."""
+		self._cache.unset("list_alerts")
+
+
+class Alerter(AlerterBase):
+	"""Collection of methods for managing alert rules."""
+
+	def __init__(self, api: GrafanaApi, disable_provenance=True, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+		super().__init__(api, disable_provenance, cache_mode)
+
+	@instrumented
+	def import_alert(
+		self, content: AlertContent, folder: FolderSearchResult
+	):
+		"""Import an alert into Grafana."""
+		content = self._imported_alert(content, folder)
 
 		try:
 			if "uid" in content:
@@ -41,8 +65,9 @@ class Alerter:
 			self.api.alertingprovisioning.update_alertrule(content["uid"], content, disable_provenance=self.disable_provenance)
 		else:
 			self.api.alertingprovisioning.create_alertrule(content, disable_provenance=self.disable_provenance)
-		self._cache.unset("list_alerts")
+		self._remember_saved()
 
+	@instrumented
 	def export_alert(
 		self, alert: AlertSearchResult
 	) -> Tuple[AlertContent, Optional[FolderSearchResult]]:
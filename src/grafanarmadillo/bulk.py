@@ -8,56 +8,471 @@ BulkOperations defines the basic interface. It is meant to be parametrised in 2
 For example:
 	BulkGrafanaOperation uses a Grafana instance as its source
 	BulkExporter uses BulkGrafanaOperations to list all objects and write them to disk
+
+AsyncBulkExporter and AsyncBulkImporter do the same with asyncio,
+with up to `concurrency` requests to Grafana in flight at once.
+
+Resources on disk are arranged by a BulkLayout:
+	TreeLayout writes one file per object, under `{kind}/{org}/{folder}/{name}.json`
+	JSONLinesLayout packs all objects of an org into one file, under `{kind}/{org}.jsonl`
 """
+import asyncio
+import json
 import logging
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
-from functools import lru_cache
+from collections import Counter
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from enum import Enum
 from pathlib import Path
-from typing import Generator, List, Tuple
+from typing import (
+	IO,
+	AsyncIterator,
+	Awaitable,
+	Callable,
+	Dict,
+	Generator,
+	Iterator,
+	List,
+	Optional,
+	Set,
+	Tuple,
+)
 
-from grafana_client import GrafanaApi
+from grafana_client import AsyncGrafanaApi, GrafanaApi
+from grafana_client.client import AsyncGrafanaClient
 
+from grafanarmadillo.aio import (
+	AsyncAlerter,
+	AsyncDashboarder,
+	AsyncFinder,
+	async_iterate,
+	async_prefetch_map,
+)
 from grafanarmadillo.alerter import Alerter
 from grafanarmadillo.dashboarder import Dashboarder
 from grafanarmadillo.find import Finder
+from grafanarmadillo.instrument import instrument_api, phase, timed_iter
 from grafanarmadillo.paths import PathCodec
 from grafanarmadillo.templator import Templator
-from grafanarmadillo.types import AlertContent, DashboardContent, GrafanaPath, OrgMeta
-from grafanarmadillo.util import exactly_one, read_from_file, write_to_file
+from grafanarmadillo.throttle import Throttle
+from grafanarmadillo.types import (
+	AlertContent,
+	AlertSearchResult,
+	DashboardContent,
+	DashboardSearchResult,
+	GrafanaPath,
+	GrafanaPathKey,
+	OrgMeta,
+)
+from grafanarmadillo.util import (
+	alert_rule_volatile_fields,
+	content_hash,
+	exactly_one,
+	prefetch_map,
+	read_from_file,
+	write_to_file,
+)
 
 
 l = logging.getLogger(__name__)
 
+TOK_DASHBOARDS = "dashboards"
+TOK_ALERTS = "alerts"
+
+
+class OrgRegistry:
+	"""
+	Index of Grafana orgs by name and by id.
+
+	The orgs are listed once and reused.
+	Set `ttl` to list them again after that many seconds,
+	or call `invalidate` after creating or deleting orgs.
+	Looking up an org which isn't known lists the orgs again, in case it was created since.
+	"""
+
+	def __init__(self, gfn_multiorg: GrafanaApi, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+		self.gfn_multiorg = gfn_multiorg
+		self.ttl = ttl
+		self.clock = clock
+		self._lock = threading.Lock()
+		self._by_name: Dict[str, OrgMeta] = {}
+		self._by_id: Dict[int, OrgMeta] = {}
+		self._fetched_at: Optional[float] = None
+
+	def refresh(self):
+		"""List all orgs again."""
+		orgs = self.gfn_multiorg.organizations.list_organization()
+		with self._lock:
+			self._by_name = {o["name"]: o for o in orgs}
+			self._by_id = {o["id"]: o for o in orgs}
+			self._fetched_at = self.clock()
+
+	def invalidate(self):
+		"""Forget all orgs, so they are listed again on the next lookup."""
+		with self._lock:
+			self._fetched_at = None
+
+	def _is_stale(self) -> bool:
+		return self._fetched_at is None or (self.ttl is not None and self.clock() - self._fetched_at >= self.ttl)
+
+	def _lookup(self, index: Callable[[], Dict], k, description: str) -> OrgMeta:
+		refreshed = False
+		if self._is_stale():
+			self.refresh()
+			refreshed = True
+		if k not in index() and not refreshed:
+			self.refresh()
+		try:
+			return index()[k]
+		except KeyError:
+			raise ValueError(f"could not find org with {description}")
+
+	def all(self) -> List[OrgMeta]:
+		"""Get a list of all orgs."""
+		if self._is_stale():
+			self.refresh()
+		return list(self._by_id.values())
+
+	def by_name(self, org_name: str) -> OrgMeta:
+		"""Get an org by name."""
+		return self._lookup(lambda: self._by_name, org_name, f"name {org_name}")
+
+	def by_id(self, org_id: int) -> OrgMeta:
+		"""Get an org by id."""
+		return self._lookup(lambda: self._by_id, org_id, f"id {org_id}")
+
 
-@lru_cache
 def get_all_orgs(gfn_multiorg) -> List[OrgMeta]:
-	"""Get a list of all orgs."""
+	"""
+	Get a list of all orgs.
+
+	Prefer an `OrgRegistry` for repeated lookups.
+	"""
 	return gfn_multiorg.organizations.list_organization()
 
 
-@lru_cache
 def get_org(gfn_multiorg, org_name: str):
-	"""Get an org by name, efficiently."""
+	"""
+	Get an org by name.
+
+	Prefer an `OrgRegistry` for repeated lookups.
+	"""
 	return exactly_one(
 		list(filter(lambda o: o["name"] == org_name, get_all_orgs(gfn_multiorg))),
 		f"org with name {org_name}"
 	)
 
 
+class BulkLayout(ABC):
+	"""How resources are arranged on disk."""
+
+	def __init__(self, root_directory: Path):
+		self.root_directory = root_directory
+
+	@abstractmethod
+	def list_orgs(self) -> Set[str]:
+		"""List the names of all orgs with resources."""
+
+	@abstractmethod
+	def read(self, kind: str, org_name: str) -> Generator[Tuple[GrafanaPath, dict], None, None]:
+		"""Read all resources of a kind (`dashboards` or `alerts`) in an org."""
+
+	@abstractmethod
+	def write(self, kind: str, path: GrafanaPath, content: dict):
+		"""Write a resource of a kind (`dashboards` or `alerts`)."""
+
+	def close(self):
+		"""Finish writing resources."""
+
+
+class TreeLayout(BulkLayout):
+	"""
+	Write one file per object, under `{kind}/{org}/{folder}/{name}.json`.
+
+	Files are read and parsed by a pool of `workers` threads,
+	which hides the latency of reading many small files, for example on network filesystems.
+	"""
+
+	def __init__(self, root_directory: Path, workers: int = 8):
+		super().__init__(root_directory)
+		self.workers = workers
+
+	def list_orgs(self) -> Set[str]:
+		"""List the names of all orgs with resources."""
+		return {PathCodec.decode_segment(o.name) for o in self.root_directory.glob("*/*")}
+
+	def _scan(self, kind: str, org_name: str) -> Iterator[Tuple[GrafanaPath, Path]]:
+		"""Find the files of all resources of a kind in an org."""
+		org_directory = self.root_directory / kind / PathCodec.encode_segment(org_name)
+		try:
+			folders = os.scandir(org_directory)
+		except FileNotFoundError:
+			return
+
+		with folders:
+			for folder in folders:
+				if not folder.is_dir():
+					continue
+				folder_name = PathCodec.decode_segment(folder.name)
+				with os.scandir(folder.path) as entries:
+					for entry in entries:
+						if entry.name.endswith(".json") and entry.is_file():
+							object_path = Path(entry.path)
+							yield GrafanaPath(PathCodec.decode_segment(object_path.stem), folder_name, org_name), object_path
+
+	def read(self, kind: str, org_name: str) -> Generator[Tuple[GrafanaPath, dict], None, None]:
+		"""Read all resources of a kind in an org."""
+		def _read(found: Tuple[GrafanaPath, Path]) -> Tuple[GrafanaPath, dict]:
+			path, object_path = found
+			return path, read_from_file(object_path)
+
+		yield from prefetch_map(_read, self._scan(kind, org_name), self.workers)
+
+	def write(self, kind: str, path: GrafanaPath, content: dict):
+		"""Write a resource to its own file."""
+		write_to_file((self.root_directory / kind / PathCodec.encode_grafana(path)).with_suffix(".json"), content)
+
+
+class JSONLinesLayout(BulkLayout):
+	"""
+	Pack all objects of a kind in an org into one file, under `{kind}/{org}.jsonl`.
+
+	Each line is a compact JSON object with the `folder`, `name`, and `content` of a resource.
+	Keys are sorted, so the same resources always produce the same file.
+	This makes import and export sequential I/O over a few large files, rather than many small ones.
+	"""
+
+	suffix = ".jsonl"
+
+	def __init__(self, root_directory: Path):
+		super().__init__(root_directory)
+		self._files: Dict[Tuple[str, str], IO] = {}
+		self._started: Set[Tuple[str, str]] = set()
+
+	def _file_for(self, kind: str, org_name: str) -> Path:
+		return (self.root_directory / kind / PathCodec.encode_segment(org_name)).with_suffix(self.suffix)
+
+	def list_orgs(self) -> Set[str]:
+		"""List the names of all orgs with resources."""
+		return {PathCodec.decode_segment(o.stem) for o in self.root_directory.glob(f"*/*{self.suffix}")}
+
+	def read(self, kind: str, org_name: str) -> Generator[Tuple[GrafanaPath, dict], None, None]:
+		"""Read all resources of a kind in an org."""
+		file = self._file_for(kind, org_name)
+		if not file.exists():
+			return
+		with file.open(mode="r", encoding="utf-8") as f:
+			for line in f:
+				if not line.strip():
+					continue
+				record = json.loads(line)
+				yield GrafanaPath(record["name"], record["folder"], org_name), record["content"]
+
+	def write(self, kind: str, path: GrafanaPath, content: dict):
+		"""Append a resource to the file for its org."""
+		key = (kind, path.org)
+		if key not in self._files:
+			# Bulk operations work through orgs one at a time, so we only need the current org's files open
+			if any(org != path.org for _, org in self._files):
+				self.close()
+			file = self._file_for(kind, path.org)
+			file.parent.mkdir(parents=True, exist_ok=True)
+			mode = "a" if key in self._started else "w"
+			self._files[key] = file.open(mode=mode, encoding="utf-8")
+			self._started.add(key)
+
+		record = {"folder": path.folder, "name": path.name, "content": content}
+		self._files[key].write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), sort_keys=True))
+		self._files[key].write("\n")
+
+	def close(self):
+		"""Close all open files."""
+		for f in self._files.values():
+			f.close()
+		self._files.clear()
+
+
+layouts = {
+	"tree": TreeLayout,
+	"jsonl": JSONLinesLayout,
+}
+
+
+class Checkpoint:
+	"""
+	Journal of the work completed by bulk operations, so that a rerun can skip it.
+
+	Each line of the journal is a JSON record of a completed object, with its org, kind, path and content hash,
+	or of a completed org.
+	Records are appended and flushed as work completes, so the journal survives the operation failing.
+	An object is only skipped if its content is unchanged since it was recorded.
+	Delete the journal to start from scratch.
+
+	The first line of the journal is a `header` describing the operation, like the one from `Checkpoint.header_for`.
+	A journal written with a different header is not resumed, and raises a ValueError,
+	since work completed against another Grafana or with another templator has not been done.
+	"""
+
+	TOK_ORG = "org"
+	TOK_HEADER = "header"
+
+	def __init__(self, path: Path, header: Optional[dict] = None):
+		self.path = path
+		# compare headers as they are read back from JSON
+		self.header = json.loads(json.dumps(header))
+		self._lock = threading.Lock()
+		self._file: Optional[IO] = None
+		self._done: Dict[Tuple[str, str, Optional[str]], Optional[str]] = {}
+		journal_header, has_records = None, False
+		if path.exists():
+			with path.open(mode="r", encoding="utf-8") as f:
+				for line in f:
+					try:
+						record = json.loads(line)
+					except json.JSONDecodeError:
+						# a partial line, from a write which was interrupted
+						continue
+					has_records = True
+					if self.TOK_HEADER in record:
+						journal_header = record[self.TOK_HEADER]
+						continue
+					self._done[(record["org"], record["kind"], record["path"])] = record["hash"]
+		if has_records and journal_header != self.header:
+			raise ValueError(f"checkpoint journal was written for a different Grafana or templator, delete it to start again {path=} {journal_header=}")
+		self._needs_header = not has_records and self.header is not None
+
+	@staticmethod
+	def header_for(cfg: dict, templator_spec: dict) -> dict:
+		"""
+		Describe an operation by the Grafana it targets and a hash of the spec of its templator.
+
+		>>> Checkpoint.header_for({"host": "grafana", "auth": "secret"}, {"env_grafana": "production"})["target"]
+		{'protocol': None, 'host': 'grafana', 'port': None, 'url_path_prefix': None, 'organization_id': None}
+		"""
+		target = {k: cfg.get(k) for k in ("protocol", "host", "port", "url_path_prefix", "organization_id")}
+		return {"target": target, "templator": content_hash(templator_spec)}
+
+	@staticmethod
+	def _encode_path(path: Optional[GrafanaPath]) -> Optional[str]:
+		if path is None:
+			return None
+		return PathCodec.encode_grafana(GrafanaPathKey(path.name, path.folder)).as_posix()
+
+	def is_done(self, org_name: str, kind: str, path: Optional[GrafanaPath] = None, content_hash: Optional[str] = None) -> bool:
+		"""Check whether an object, or a whole org if there is no path, has been completed."""
+		k = (org_name, kind, self._encode_path(path))
+		return k in self._done and self._done[k] == content_hash
+
+	def record(self, org_name: str, kind: str, path: Optional[GrafanaPath] = None, content_hash: Optional[str] = None):
+		"""Record that an object, or a whole org if there is no path, has been completed. Safe to use from multiple threads."""
+		encoded_path = self._encode_path(path)
+		line = json.dumps({"org": org_name, "kind": kind, "path": encoded_path, "hash": content_hash}, separators=(",", ":"))
+		with self._lock:
+			if self._file is None:
+				self.path.parent.mkdir(parents=True, exist_ok=True)
+				self._file = self.path.open(mode="a", encoding="utf-8")
+			if self._needs_header:
+				self._file.write(json.dumps({self.TOK_HEADER: self.header}, separators=(",", ":")) + "\n")
+				self._needs_header = False
+			self._file.write(line + "\n")
+			self._file.flush()
+			self._done[(org_name, kind, encoded_path)] = content_hash
+
+	def close(self):
+		"""Close the journal."""
+		with self._lock:
+			if self._file is not None:
+				self._file.close()
+				self._file = None
+
+
 class BulkOperation(ABC):
-	"""Run bulk operations on Grafana."""
+	"""
+	Run bulk operations on Grafana.
 
-	def __init__(self, cfg: dict):
+	With a `checkpoint`, completed objects are recorded, and skipped when the operation is run again.
+	Operations which can't check objects individually record and skip whole orgs instead.
+	"""
+
+	# whether objects can be skipped individually, or only whole orgs
+	checkpoint_objects = True
+
+	def __init__(self, cfg: dict, throttle: Optional[Throttle] = None, checkpoint: Optional[Checkpoint] = None):
 		self.cfg = cfg
-		self.gfn_multiorg = GrafanaApi(**self.cfg)
+		self.throttle = throttle
+		self.checkpoint = checkpoint
+		self.gfn_multiorg = self._make_client(self.cfg)
+		self.orgs = OrgRegistry(self.gfn_multiorg)
+		self._org_clients: Dict[int, GrafanaApi] = {}
+
+	@property
+	def _checkpointing(self) -> bool:
+		return self.checkpoint is not None
 
 	def run(self):
 		"""Run this bulk operation."""
-		for org, gfn in self.all_orgs():
-			for out_path, dashboard_content in self.get_all_dashboards(org, gfn):
-				self.each_dashboard(out_path, dashboard_content)
-			for out_path, alert_content in self.get_all_alerts(org, gfn):
-				self.each_alert(out_path, alert_content)
+		try:
+			for org, gfn in self.all_orgs():
+				if self._org_done(org):
+					continue
+				for out_path, dashboard_content in timed_iter("read_dashboards", self.get_all_dashboards(org, gfn)):
+					with phase("each_dashboard"):
+						self._each(TOK_DASHBOARDS, out_path, dashboard_content, self.each_dashboard)
+				for out_path, alert_content in timed_iter("read_alerts", self.get_all_alerts(org, gfn)):
+					with phase("each_alert"):
+						self._each(TOK_ALERTS, out_path, alert_content, self.each_alert)
+				self._record_org_done(org)
+		finally:
+			if self.checkpoint:
+				self.checkpoint.close()
+
+	def _org_done(self, org: OrgMeta) -> bool:
+		"""
+		Check the checkpoint for whether an org was completed.
+
+		Orgs are only skipped by operations which can't check objects, since objects may have changed since their org was completed.
+		"""
+		if self._checkpointing and not self.checkpoint_objects and self.checkpoint.is_done(org["name"], Checkpoint.TOK_ORG):
+			l.info(f"skip completed org org={org['name']}")
+			return True
+		return False
+
+	def _record_org_done(self, org: OrgMeta):
+		if self._checkpointing and not self.checkpoint_objects:
+			self.checkpoint.record(org["name"], Checkpoint.TOK_ORG)
+
+	def _each(self, kind: str, path: GrafanaPath, content: dict, f: Callable[[GrafanaPath, dict], None]):
+		"""Act on an object, unless the checkpoint records it as completed with the same content."""
+		if not (self._checkpointing and self.checkpoint_objects):
+			f(path, content)
+			return
+
+		h = content_hash(content)
+		if self.checkpoint.is_done(path.org, kind, path, h):
+			l.info(f"skip completed {kind} path={path}")
+			return
+		f(path, content)
+		self.checkpoint.record(path.org, kind, path, h)
+
+	def _make_client(self, cfg: dict) -> GrafanaApi:
+		gfn = instrument_api(GrafanaApi(**cfg))
+		if self.throttle:
+			self.throttle.wrap(gfn)
+		return gfn
+
+	def get_org(self, org_name: str) -> OrgMeta:
+		"""Get an org by name from the registry of orgs for this operation."""
+		return self.orgs.by_name(org_name)
+
+	def org_client(self, org: OrgMeta) -> GrafanaApi:
+		"""Get a client for an org. Clients are reused for the lifetime of this operation."""
+		if org["id"] not in self._org_clients:
+			self._org_clients[org["id"]] = self._make_client({**self.cfg, "organization_id": org["id"]})
+		return self._org_clients[org["id"]]
 
 	@abstractmethod
 	def all_orgs(self) -> Generator[Tuple[OrgMeta, GrafanaApi], None, None]:
@@ -101,20 +516,36 @@ class BulkOperation(ABC):
 
 
 class BulkGrafanaOperation(BulkOperation, ABC):
-	"""Bulk operations which uses a Grafana instance as its source."""
+	"""
+	Bulk operations which uses a Grafana instance as its source.
+
+	The contents of objects are fetched by `prefetch` threads, ahead of the object being acted on.
+	This overlaps fetching objects with templating and writing them.
+	At most `prefetch_buffer` objects (defaults to 4 per thread) are held ahead, to bound memory.
+	"""
+
+	def __init__(
+		self,
+		cfg: dict,
+		throttle: Optional[Throttle] = None,
+		prefetch: int = 8,
+		prefetch_buffer: Optional[int] = None,
+		checkpoint: Optional[Checkpoint] = None,
+	):
+		self.prefetch = prefetch
+		self.prefetch_buffer = prefetch_buffer
+		super().__init__(cfg, throttle, checkpoint)
 
 	def all_orgs(self) -> Generator[Tuple[OrgMeta, GrafanaApi], None, None]:
 		"""Iterate over all organisations in Grafana."""
-		orgs = self.gfn_multiorg.organizations.list_organization()
-		for org in orgs:
-			gfn = GrafanaApi(**{**self.cfg, "organization_id": org["id"]})
-			yield org, gfn
+		for org in self.orgs.all():
+			yield org, self.org_client(org)
 
 	def get_all_dashboards(self, org: OrgMeta, gfn: GrafanaApi) -> Generator[Tuple[GrafanaPath, DashboardContent], None, None]:
 		"""Get all dashboards."""
 		finder, dashboarder = Finder(gfn), Dashboarder(gfn)
-		dashboards = finder.list_dashboards()
-		for dashboard in dashboards:
+
+		def _export(dashboard: DashboardSearchResult) -> Tuple[GrafanaPath, DashboardContent]:
 			dashboard_content, folder = dashboarder.export_dashboard(dashboard)
 
 			if folder is None:
@@ -122,104 +553,712 @@ class BulkGrafanaOperation(BulkOperation, ABC):
 			else:
 				folder_name = folder["title"]
 
-			out_path = GrafanaPath(dashboard_content["title"], folder_name, org["name"])
+			return GrafanaPath(dashboard_content["title"], folder_name, org["name"]), dashboard_content
 
-			yield out_path, dashboard_content
+		yield from prefetch_map(_export, finder.list_dashboards(), self.prefetch, self.prefetch_buffer)
 
 	def get_all_alerts(self, org: OrgMeta, gfn: GrafanaApi) -> Generator[Tuple[GrafanaPath, AlertContent], None, None]:
 		"""Get all alerts."""
 		finder, alerter = Finder(gfn), Alerter(gfn)
-		alerts = finder.list_alerts()
-		for alert in alerts:
+
+		def _export(alert: AlertSearchResult) -> Tuple[GrafanaPath, AlertContent]:
 			alert_content, folder = alerter.export_alert(alert)
 
 			folder_name = folder["title"]
-			out_path = GrafanaPath(alert_content["title"], folder_name, org["name"])
+			return GrafanaPath(alert_content["title"], folder_name, org["name"]), alert_content
 
-			yield out_path, alert_content
+		yield from prefetch_map(_export, finder.list_alerts(), self.prefetch, self.prefetch_buffer)
 
 
 class BulkFileOperation(BulkOperation, ABC):
 	"""Bulk operation which uses a filetree as its source."""
 
-	def __init__(self, cfg: dict, root_directory: Path):
+	def __init__(
+		self,
+		cfg: dict,
+		root_directory: Path,
+		layout: Optional[BulkLayout] = None,
+		throttle: Optional[Throttle] = None,
+		checkpoint: Optional[Checkpoint] = None,
+	):
 		self.root_directory = root_directory
-		super().__init__(cfg)
+		self.layout = layout or TreeLayout(root_directory)
+		super().__init__(cfg, throttle, checkpoint)
 
 	def all_orgs(self) -> Generator[Tuple[OrgMeta, GrafanaApi], None, None]:
 		"""Iterate over all organisations in Grafana."""
-		orgs = {PathCodec.decode_segment(o.name) for o in self.root_directory.glob("*/*")}
-		for org_name in orgs:
-			org = self.gfn_multiorg.organization.find_organization(org_name)
-			gfn = GrafanaApi(**{**self.cfg, "organization_id": org["id"]})
-
-			yield org, gfn
+		for org_name in self.layout.list_orgs():
+			org = self.get_org(org_name)
+			yield org, self.org_client(org)
 
 	def get_all_dashboards(self, org: OrgMeta, gfn: GrafanaApi) -> Generator[Tuple[GrafanaPath, DashboardContent], None, None]:
 		"""Get all dashboards."""
-		folders = (self.root_directory / "dashboards" / PathCodec.encode_segment(org["name"])).glob("*")
-		for folder_path in folders:
-			for dashboard_path in folder_path.glob("*.json"):
-				content = read_from_file(dashboard_path)
-				yield GrafanaPath(PathCodec.decode_segment(dashboard_path.stem), PathCodec.decode_segment(folder_path.name), org["name"]), content
+		yield from self.layout.read(TOK_DASHBOARDS, org["name"])
 
 	def get_all_alerts(self, org: OrgMeta, gfn: GrafanaApi) -> Generator[Tuple[GrafanaPath, AlertContent], None, None]:
 		"""Get all alerts."""
-		folders = (self.root_directory / "alerts" / PathCodec.encode_segment(org["name"])).glob("*")
-		for folder_path in folders:
-			for alert_path in folder_path.glob("*.json"):
-				content = read_from_file(alert_path)
-				yield GrafanaPath(PathCodec.decode_segment(alert_path.stem), PathCodec.decode_segment(folder_path.name), org["name"]), content
+		yield from self.layout.read(TOK_ALERTS, org["name"])
 
 
 class BulkExporter(BulkGrafanaOperation):
-	"""Export all resources from Grafana to files."""
+	"""
+	Export all resources from Grafana to files.
+
+	With a `checkpoint`, only whole orgs are skipped.
+	Objects have to be fetched to know whether they changed,
+	and layouts like JSONLinesLayout rewrite the files of an org.
+	"""
 
-	def __init__(self, cfg: dict, root_directory: Path, templator: Templator):
+	checkpoint_objects = False
+
+	def __init__(
+		self,
+		cfg: dict,
+		root_directory: Path,
+		templator: Templator,
+		layout: Optional[BulkLayout] = None,
+		throttle: Optional[Throttle] = None,
+		prefetch: int = 8,
+		prefetch_buffer: Optional[int] = None,
+		checkpoint: Optional[Checkpoint] = None,
+	):
 		self.root_directory = root_directory
+		self.layout = layout or TreeLayout(root_directory)
 		self.templator = templator
-		super().__init__(cfg)
+		super().__init__(cfg, throttle, prefetch, prefetch_buffer, checkpoint)
+
+	def run(self):
+		"""Export all resources, then finish writing files."""
+		try:
+			super().run()
+		finally:
+			self.layout.close()
 
 	def each_dashboard(self, path: GrafanaPath, dashboard: DashboardContent):
 		"""Write each dashboard to files."""
-		dashboard_templated = self.templator.make_template_from_dashboard(dashboard)
+		with phase("template"):
+			dashboard_templated = self.templator.make_template_from_dashboard(dashboard)
 		l.info(f"export dashboard path={path}")
-		write_to_file((self.root_directory / "dashboards" / PathCodec.encode_grafana(path)).with_suffix(".json"), dashboard_templated)
+		with phase("write"):
+			self.layout.write(TOK_DASHBOARDS, path, dashboard_templated)
 
 	def each_alert(self, path: GrafanaPath, alert: AlertContent):
 		"""Write each alert to files."""
-		alert_templated = self.templator.make_template_from_dashboard(alert)
+		with phase("template"):
+			alert_templated = self.templator.make_template_from_dashboard(alert)
 		l.info(f"export alert path={path}")
-		write_to_file((self.root_directory / "alerts" / PathCodec.encode_grafana(path)).with_suffix(".json"), alert_templated)
+		with phase("write"):
+			self.layout.write(TOK_ALERTS, path, alert_templated)
+
+
+class PlanAction(Enum):
+	"""What an import will do to an object in Grafana."""
+
+	CREATE = "create"
+	UPDATE = "update"
+	NOOP = "noop"
+
+
+@dataclass
+class PlannedChange:
+	"""A change an import will make to an object in Grafana."""
+
+	kind: str
+	path: GrafanaPath
+	action: PlanAction
+
+
+@dataclass
+class ImportPlan:
+	"""The changes an import will make to Grafana."""
+
+	changes: List[PlannedChange] = field(default_factory=list)
+
+	def add(self, kind: str, path: GrafanaPath, action: PlanAction):
+		"""Record a planned change."""
+		self.changes.append(PlannedChange(kind, path, action))
+
+	def counts(self) -> Counter:
+		"""Count the changes by action."""
+		return Counter(c.action for c in self.changes)
+
+	def summary(self) -> str:
+		"""Summarise the changes, listing all the creates and updates."""
+		counts = self.counts()
+		lines = [" ".join(f"{action.value}={counts[action]}" for action in PlanAction)]
+		for c in self.changes:
+			if c.action != PlanAction.NOOP:
+				lines.append(f"{c.action.value} {c.kind} {PathCodec.encode_grafana(c.path)}")
+		return "\n".join(lines)
+
+
+class BulkImportError(Exception):
+	"""Some objects could not be imported."""
+
+	def __init__(self, errors: List[Tuple[str, GrafanaPath, BaseException]]):
+		self.errors = errors
+		details = "; ".join(f"{kind} {PathCodec.encode_grafana(path)}: {e!r}" for kind, path, e in errors)
+		super().__init__(f"failed to import {len(errors)} objects: {details}")
+
+
+def alert_dashboard_refs(alert: AlertContent) -> Set[GrafanaPathKey]:
+	"""Find the dashboards an alert references, with a `$$folder/name` reference in its `__dashboardUid__` annotation."""
+	ref = alert.get("annotations", {}).get("__dashboardUid__")
+	if not (isinstance(ref, str) and ref.startswith("$$")):
+		return set()
+	path = PathCodec.try_parse(PathCodec.decode(Path(ref[2:])))
+	return {GrafanaPathKey(path.name, path.folder)}
+
+
+def submit_after(pool: Executor, dependencies: List[Future], f: Callable, *args) -> Future:
+	"""
+	Submit a task to a pool once all of its dependencies are done.
+
+	No worker is blocked waiting for the dependencies; the task is submitted by the last of them to finish.
+	If any dependency failed, the task is not run and its future fails with a ValueError.
+	Wait for the returned future before shutting down the pool, or the task can't be submitted.
+	"""
+	result: Future = Future()
+	remaining = len(dependencies)
+	lock = threading.Lock()
+
+	def _forward(task: Future):
+		if task.exception() is not None:
+			result.set_exception(task.exception())
+		else:
+			result.set_result(task.result())
+
+	def _submit():
+		if any(dependency.exception() is not None for dependency in dependencies):
+			result.set_exception(ValueError("a dependency of this task failed"))
+			return
+		try:
+			task = pool.submit(f, *args)
+		except RuntimeError as e:  # the pool was shut down
+			result.set_exception(e)
+			return
+		task.add_done_callback(_forward)
+
+	def _dependency_done(_: Future):
+		nonlocal remaining
+		with lock:
+			remaining -= 1
+			ready = remaining == 0
+		if ready:
+			_submit()
+
+	if not dependencies:
+		_submit()
+	for dependency in dependencies:
+		dependency.add_done_callback(_dependency_done)
+	return result
 
 
 class BulkImporter(BulkFileOperation):
-	"""Import all resources from files into Grafana."""
+	"""
+	Import all resources from files into Grafana.
+
+	With `skip_unchanged`, objects are compared to the current state of Grafana first,
+	and only objects that would change are imported.
+	This avoids creating a new version of every dashboard on every import.
+	With `dry_run`, the changes are only planned and nothing is imported.
+	In both cases, the planned changes are available in `plan`.
+	When planning, the objects in Grafana are listed once per org,
+	and the contents of the dashboards to compare are fetched by `plan_prefetch` threads before the org is planned.
+
+	With `workers`, objects in each org are imported concurrently by a pool of threads.
+	Folders are created first, then dashboards and alerts are imported together.
+	Alerts which reference a dashboard (see `alert_dashboard_refs`) are only submitted once that dashboard is imported.
+	Imported dashboards are remembered with their org in the `dashboard_refs` of the templator, if it has them,
+	so that references to them from the same org are resolved without searching Grafana again.
+	Errors do not stop the import; they are collected and raised together as a `BulkImportError` at the end.
+	"""
+
+	plan_prefetch = 8
 
-	def __init__(self, cfg: dict, root_directory: Path, templator: Templator):
+	def __init__(
+		self,
+		cfg: dict,
+		root_directory: Path,
+		templator: Templator,
+		layout: Optional[BulkLayout] = None,
+		skip_unchanged: bool = False,
+		dry_run: bool = False,
+		throttle: Optional[Throttle] = None,
+		workers: int = 1,
+		checkpoint: Optional[Checkpoint] = None,
+	):
 		self.templator = templator
-		super().__init__(cfg, root_directory)
+		self.skip_unchanged = skip_unchanged
+		self.dry_run = dry_run
+		self.workers = workers
+		self.plan = ImportPlan()
+		self._index_lock = threading.Lock()
+		self._live_dashboards: Dict[int, Dict[GrafanaPathKey, DashboardSearchResult]] = {}
+		self._live_dashboards_by_uid: Dict[int, Dict[str, DashboardSearchResult]] = {}
+		self._live_alerts: Dict[int, Dict[GrafanaPathKey, AlertSearchResult]] = {}
+		self._live_dashboarders: Dict[int, Dashboarder] = {}
+		super().__init__(cfg, root_directory, layout, throttle, checkpoint)
+
+	@property
+	def _planning(self) -> bool:
+		return self.skip_unchanged or self.dry_run
+
+	@property
+	def _checkpointing(self) -> bool:
+		# nothing is completed in a dry run
+		return self.checkpoint is not None and not self.dry_run
+
+	def live_dashboards(self, org: OrgMeta) -> Dict[GrafanaPathKey, DashboardSearchResult]:
+		"""Index the dashboards in Grafana by folder and title, with a single search."""
+		with self._index_lock:
+			if org["id"] not in self._live_dashboards:
+				dashboards = Finder(self.org_client(org)).list_dashboards()
+				self._live_dashboards[org["id"]] = {GrafanaPathKey(d["title"], d.get("folderTitle") or "General"): d for d in dashboards}
+				self._live_dashboards_by_uid[org["id"]] = {d["uid"]: d for d in dashboards}
+			return self._live_dashboards[org["id"]]
+
+	def live_dashboard(self, org: OrgMeta, path: GrafanaPath, dashboard: DashboardContent) -> Optional[DashboardSearchResult]:
+		"""
+		Find the dashboard in Grafana which importing a dashboard would replace.
+
+		Dashboards are saved by uid, so that is tried first. Otherwise they are matched by path, and then by their title after templating.
+		"""
+		by_path = self.live_dashboards(org)
+		live = self._live_dashboards_by_uid[org["id"]].get(dashboard.get("uid"))
+		if live is None:
+			live = by_path.get(GrafanaPathKey(path.name, path.folder))
+		if live is None:
+			live = by_path.get(GrafanaPathKey(dashboard.get("title"), path.folder))
+		return live
+
+	def live_dashboarder(self, org: OrgMeta) -> Dashboarder:
+		"""Get a Dashboarder for an org which caches the states of dashboards in Grafana for the lifetime of this operation."""
+		with self._index_lock:
+			if org["id"] not in self._live_dashboarders:
+				self._live_dashboarders[org["id"]] = Dashboarder(self.org_client(org))
+			return self._live_dashboarders[org["id"]]
+
+	def live_alerts(self, org: OrgMeta) -> Dict[GrafanaPathKey, AlertSearchResult]:
+		"""Index the alerts in Grafana by folder and title, with a single listing of alerts and folders."""
+		with self._index_lock:
+			if org["id"] not in self._live_alerts:
+				gfn = self.org_client(org)
+				folder_titles = {f["uid"]: f["title"] for f in gfn.folder.get_all_folders()}
+				alerts = Finder(gfn).list_alerts()
+				self._live_alerts[org["id"]] = {GrafanaPathKey(a["title"], folder_titles.get(a["folderUID"])): a for a in alerts}
+			return self._live_alerts[org["id"]]
+
+	def run(self):
+		"""Import all resources, concurrently if there are multiple `workers`."""
+		if self.workers <= 1:
+			return super().run()
+
+		errors = []
+		try:
+			for org, gfn in self.all_orgs():
+				if self._org_done(org):
+					continue
+				org_errors = self.run_org_concurrently(org, gfn)
+				if not org_errors:
+					self._record_org_done(org)
+				errors.extend(org_errors)
+		finally:
+			if self.checkpoint:
+				self.checkpoint.close()
+		if errors:
+			raise BulkImportError(errors)
+
+	def run_org_concurrently(self, org: OrgMeta, gfn: GrafanaApi) -> List[Tuple[str, GrafanaPath, BaseException]]:
+		"""Import all resources in an org with a pool of threads, and return the errors."""
+		dashboards = list(timed_iter("read_dashboards", self.get_all_dashboards(org, gfn)))
+		alerts = list(timed_iter("read_alerts", self.get_all_alerts(org, gfn)))
+
+		if not self.dry_run:
+			# create folders up front, so that concurrent imports into a folder don't race to create it
+			finder = Finder(gfn)
+			for folder in dict.fromkeys(path.folder for path, _ in (*dashboards, *alerts)):
+				finder.create_or_get_folder(folder)
+
+		def _dashboard(path: GrafanaPath, dashboard: DashboardContent):
+			with phase("each_dashboard"):
+				self._each(TOK_DASHBOARDS, path, dashboard, self.each_dashboard)
+
+		def _alert(path: GrafanaPath, alert: AlertContent):
+			with phase("each_alert"):
+				self._each(TOK_ALERTS, path, alert, self.each_alert)
+
+		with ThreadPoolExecutor(max_workers=self.workers) as pool:
+			dashboard_futures = [(path, pool.submit(_dashboard, path, dashboard)) for path, dashboard in dashboards]
+			by_path = {GrafanaPathKey(path.name, path.folder): future for path, future in dashboard_futures}
+			alert_futures = [
+				(path, submit_after(pool, [by_path[ref] for ref in alert_dashboard_refs(alert) if ref in by_path], _alert, path, alert))
+				for path, alert in alerts
+			]
+			wait([future for _, future in alert_futures])
+
+		errors = []
+		for kind, futures in ((TOK_DASHBOARDS, dashboard_futures), (TOK_ALERTS, alert_futures)):
+			for path, future in futures:
+				if future.exception() is not None:
+					l.error(f"failed to import {kind} path={path} error={future.exception()!r}")
+					errors.append((kind, path, future.exception()))
+		return errors
+
+	def get_all_dashboards(self, org: OrgMeta, gfn: GrafanaApi) -> Generator[Tuple[GrafanaPath, DashboardContent], None, None]:
+		"""Get all dashboards. When planning, also fetch the dashboards in Grafana which they will be compared to."""
+		dashboards = super().get_all_dashboards(org, gfn)
+		if not self._planning:
+			yield from dashboards
+			return
+
+		dashboards = list(dashboards)
+		with phase("fetch_live"):
+			live_uids = dict.fromkeys(live["uid"] for live in (self.live_dashboard(org, path, d) for path, d in dashboards) if live)
+			self.live_dashboarder(org).fetch_live_states(live_uids, self.plan_prefetch)
+		yield from dashboards
+
+	def plan_dashboard(self, path: GrafanaPath, dashboard_templated: DashboardContent) -> PlanAction:
+		"""Compare a templated dashboard to the dashboard in Grafana."""
+		org = self.get_org(path.org)
+		live = self.live_dashboard(org, path, dashboard_templated)
+		if live is None:
+			return PlanAction.CREATE
+
+		if (live.get("folderTitle") or "General") != path.folder:
+			return PlanAction.UPDATE
+		live_state = self.live_dashboarder(org).live_state(live["uid"])
+		if Dashboarder.is_unchanged(live_state, dashboard_templated, live_state and live_state["folderUid"]):
+			return PlanAction.NOOP
+		return PlanAction.UPDATE
+
+	def plan_alert(self, path: GrafanaPath, alert: AlertContent) -> PlanAction:
+		"""Compare an alert to the alert in Grafana."""
+		live = self.live_alerts(self.get_org(path.org)).get(GrafanaPathKey(path.name, path.folder))
+		if live is None:
+			return PlanAction.CREATE
+
+		alert_templated = self.templator.make_dashboard_from_template(live, alert)
+		if content_hash(live, alert_rule_volatile_fields) == content_hash(alert_templated, alert_rule_volatile_fields):
+			return PlanAction.NOOP
+		return PlanAction.UPDATE
 
 	def each_dashboard(self, path: GrafanaPath, dashboard: DashboardContent):
 		"""Import each dashboard into Grafana."""
-		org = get_org(self.gfn_multiorg, path.org)
-		gfn = GrafanaApi(**{**self.cfg, "organization_id": org["id"]})
+		gfn = self.org_client(self.get_org(path.org))
+
+		with phase("template"):
+			dashboard_templated = self.templator.make_dashboard_from_template(
+				dashboard, dashboard
+			)
+		if self._planning:
+			with phase("plan"):
+				action = self.plan_dashboard(path, dashboard_templated)
+			self.plan.add(TOK_DASHBOARDS, path, action)
+			if self.dry_run or action == PlanAction.NOOP:
+				l.info(f"plan dashboard path={path} action={action.value}")
+				return
 
 		finder, dashboarder = Finder(gfn), Dashboarder(gfn)
-		folder = finder.create_or_get_folder(path.folder)
-		dashboard_templated = self.templator.make_dashboard_from_template(
-			dashboard, dashboard
-		)
 		l.info(f"import dashboard path={path}")
-		dashboarder.import_dashboard(dashboard_templated, folder)
+		with phase("write"):
+			folder = finder.create_or_get_folder(path.folder)
+			result = dashboarder.import_dashboard(dashboard_templated, folder)
+		self.remember_dashboard(path, dashboard_templated, result)
+
+	def remember_dashboard(self, path: GrafanaPath, dashboard: DashboardContent, result: dict):
+		"""Remember an imported dashboard in the templator's `dashboard_refs`, so that alerts can reference it."""
+		if self.templator.dashboard_refs is not None:
+			self.templator.dashboard_refs.remember(result["uid"], GrafanaPath(dashboard.get("title", path.name), path.folder, path.org))
 
 	def each_alert(self, path: GrafanaPath, alert: AlertContent):
 		"""Import each alert into Grafana."""
-		org = get_org(self.gfn_multiorg, path.org)
-		gfn = GrafanaApi(**{**self.cfg, "organization_id": org["id"]})
+		gfn = self.org_client(self.get_org(path.org))
+
+		if self._planning:
+			with phase("plan"):
+				action = self.plan_alert(path, alert)
+			self.plan.add(TOK_ALERTS, path, action)
+			if self.dry_run or action == PlanAction.NOOP:
+				l.info(f"plan alert path={path} action={action.value}")
+				return
 
 		finder, alerter = Finder(gfn), Alerter(gfn)
 		alert_info, folder_info = finder.create_or_get_alert(path)
-		alert_templated = self.templator.make_dashboard_from_template(alert_info, alert)
+		with phase("template"):
+			alert_templated = self.templator.make_dashboard_from_template(alert_info, alert)
+		l.info(f"import alert path={path}")
+		with phase("write"):
+			alerter.import_alert(alert_templated, folder_info)
+
+
+class AsyncBulkOperation(ABC):
+	"""
+	Run bulk operations on Grafana with asyncio.
+
+	Up to `concurrency` objects are handled at once, each in its own task.
+	The first error cancels the remaining tasks of the operation.
+	Operations which must handle objects in order, like writing to a layout, set `ordered`.
+	Orgs are looked up in an `OrgRegistry`, from a worker thread so that the event loop is not blocked.
+	Templators are synchronous, and may make requests to Grafana, so they are also run in worker threads.
+	Requests are measured, and go through the `throttle` if there is one, like those of `BulkOperation`.
+	"""
+
+	ordered = False
+
+	def __init__(self, cfg: dict, concurrency: int = 32, throttle: Optional[Throttle] = None):
+		self.cfg = cfg
+		self.concurrency = concurrency
+		self.throttle = throttle
+		self._org_clients: Dict[int, AsyncGrafanaApi] = {}
+		self._org_clients_lock = asyncio.Lock()
+		orgs_gfn = instrument_api(GrafanaApi(**self.cfg))
+		if self.throttle:
+			self.throttle.wrap(orgs_gfn)
+		self.orgs = OrgRegistry(orgs_gfn)
+
+	def run(self):
+		"""Run this bulk operation in a new event loop."""
+		asyncio.run(self.arun())
+
+	async def arun(self):
+		"""Run this bulk operation."""
+		try:
+			for org, gfn in await self.all_orgs():
+				await self._each_all(self.get_all_dashboards(org, gfn), self.each_dashboard)
+				await self._each_all(self.get_all_alerts(org, gfn), self.each_alert)
+		finally:
+			await self.close()
+
+	async def _each_all(self, items: AsyncIterator[Tuple[GrafanaPath, dict]], f: Callable[[GrafanaPath, dict], Awaitable]):
+		"""Act on all items, with at most `concurrency` in flight."""
+		if self.ordered:
+			async for path, content in items:
+				await f(path, content)
+			return
+
+		limit = asyncio.Semaphore(self.concurrency)
+		pending: Set[asyncio.Future] = set()
+
+		def _done(task: asyncio.Future):
+			limit.release()
+			pending.discard(task)
+			if not task.cancelled() and task.exception() is not None:
+				failed.append(task.exception())
+
+		failed: List[BaseException] = []
+		try:
+			async for path, content in items:
+				await limit.acquire()
+				if failed:
+					limit.release()
+					break
+				task = asyncio.ensure_future(f(path, content))
+				pending.add(task)
+				task.add_done_callback(_done)
+			while pending and not failed:
+				await asyncio.wait(set(pending), return_when=asyncio.FIRST_EXCEPTION)
+			if failed:
+				raise failed[0]
+		finally:
+			for task in pending:
+				task.cancel()
+			await asyncio.gather(*pending, return_exceptions=True)
+
+	async def _make_client(self, cfg: dict) -> AsyncGrafanaApi:
+		gfn = AsyncGrafanaApi(**cfg)
+		# AsyncGrafanaApi doesn't pass a pool size to its client, and the default pool only has 10 connections, which would limit concurrency.
+		# The API objects hold the client, so we can only swap its session
+		default_session = gfn.client.s
+		gfn.client.s = AsyncGrafanaClient(**cfg, session_pool_size=self.concurrency).s
+		await default_session.close()
+
+		instrument_api(gfn)
+		if self.throttle:
+			self.throttle.wrap(gfn)
+		return gfn
+
+	async def close(self):
+		"""Close all clients."""
+		for gfn in self._org_clients.values():
+			await gfn.client.s.close()
+		self._org_clients.clear()
+
+	async def list_orgs(self) -> List[OrgMeta]:
+		"""List all orgs in Grafana."""
+		return await asyncio.to_thread(self.orgs.all)
+
+	async def get_org(self, org_name: str) -> OrgMeta:
+		"""Get an org by name from the registry of orgs for this operation."""
+		return await asyncio.to_thread(self.orgs.by_name, org_name)
+
+	async def org_client(self, org: OrgMeta) -> AsyncGrafanaApi:
+		"""Get a client for an org. Clients are reused for the lifetime of this operation."""
+		async with self._org_clients_lock:
+			if org["id"] not in self._org_clients:
+				self._org_clients[org["id"]] = await self._make_client({**self.cfg, "organization_id": org["id"]})
+		return self._org_clients[org["id"]]
+
+	@abstractmethod
+	async def all_orgs(self) -> List[Tuple[OrgMeta, AsyncGrafanaApi]]:
+		"""List all organisations."""
+
+	@abstractmethod
+	def get_all_dashboards(self, org: OrgMeta, gfn: AsyncGrafanaApi) -> AsyncIterator[Tuple[GrafanaPath, DashboardContent]]:
+		"""Iterate over all dashboards."""
+
+	@abstractmethod
+	def get_all_alerts(self, org: OrgMeta, gfn: AsyncGrafanaApi) -> AsyncIterator[Tuple[GrafanaPath, AlertContent]]:
+		"""Iterate over all alerts."""
+
+	@abstractmethod
+	async def each_dashboard(self, path: GrafanaPath, dashboard: DashboardContent):
+		"""Act on each dashboard."""
+
+	@abstractmethod
+	async def each_alert(self, path: GrafanaPath, alert: AlertContent):
+		"""Act on each alert."""
+
+
+class AsyncBulkExporter(AsyncBulkOperation):
+	"""
+	Export all resources from Grafana to files, with asyncio.
+
+	Up to `concurrency` objects are fetched ahead of the one being written, and they are written in order.
+	"""
+
+	ordered = True
+
+	def __init__(
+		self,
+		cfg: dict,
+		root_directory: Path,
+		templator: Templator,
+		layout: Optional[BulkLayout] = None,
+		concurrency: int = 32,
+		throttle: Optional[Throttle] = None,
+	):
+		self.root_directory = root_directory
+		self.layout = layout or TreeLayout(root_directory)
+		self.templator = templator
+		super().__init__(cfg, concurrency, throttle)
+
+	async def arun(self):
+		"""Export all resources, then finish writing files."""
+		try:
+			await super().arun()
+		finally:
+			self.layout.close()
+
+	async def all_orgs(self) -> List[Tuple[OrgMeta, AsyncGrafanaApi]]:
+		"""List all organisations in Grafana."""
+		return [(org, await self.org_client(org)) for org in await self.list_orgs()]
+
+	async def get_all_dashboards(self, org: OrgMeta, gfn: AsyncGrafanaApi) -> AsyncIterator[Tuple[GrafanaPath, DashboardContent]]:
+		"""Get all dashboards."""
+		finder, dashboarder = AsyncFinder(gfn), AsyncDashboarder(gfn)
+
+		async def _export(dashboard: DashboardSearchResult) -> Tuple[GrafanaPath, DashboardContent]:
+			dashboard_content, folder = await dashboarder.export_dashboard(dashboard)
+			folder_name = "General" if folder is None else folder["title"]
+			return GrafanaPath(dashboard_content["title"], folder_name, org["name"]), dashboard_content
+
+		async for exported in async_prefetch_map(_export, await finder.list_dashboards(), self.concurrency):
+			yield exported
+
+	async def get_all_alerts(self, org: OrgMeta, gfn: AsyncGrafanaApi) -> AsyncIterator[Tuple[GrafanaPath, AlertContent]]:
+		"""Get all alerts."""
+		finder, alerter = AsyncFinder(gfn), AsyncAlerter(gfn)
+
+		async def _export(alert: AlertSearchResult) -> Tuple[GrafanaPath, AlertContent]:
+			alert_content, folder = await alerter.export_alert(alert)
+			return GrafanaPath(alert_content["title"], folder["title"], org["name"]), alert_content
+
+		async for exported in async_prefetch_map(_export, await finder.list_alerts(), self.concurrency):
+			yield exported
+
+	async def each_dashboard(self, path: GrafanaPath, dashboard: DashboardContent):
+		"""Write each dashboard to files."""
+		dashboard_templated = await asyncio.to_thread(self.templator.make_template_from_dashboard, dashboard)
+		l.info(f"export dashboard path={path}")
+		self.layout.write(TOK_DASHBOARDS, path, dashboard_templated)
+
+	async def each_alert(self, path: GrafanaPath, alert: AlertContent):
+		"""Write each alert to files."""
+		alert_templated = await asyncio.to_thread(self.templator.make_template_from_dashboard, alert)
+		l.info(f"export alert path={path}")
+		self.layout.write(TOK_ALERTS, path, alert_templated)
+
+
+class AsyncBulkImporter(AsyncBulkOperation):
+	"""
+	Import all resources from files into Grafana, with asyncio.
+
+	All dashboards of an org are imported before its alerts.
+	Folders are shared between objects, and are only created once.
+	With `skip_unchanged`, dashboards which are the same as in Grafana are not saved again.
+	"""
+
+	def __init__(
+		self,
+		cfg: dict,
+		root_directory: Path,
+		templator: Templator,
+		layout: Optional[BulkLayout] = None,
+		skip_unchanged: bool = False,
+		concurrency: int = 32,
+		throttle: Optional[Throttle] = None,
+	):
+		self.root_directory = root_directory
+		self.layout = layout or TreeLayout(root_directory)
+		self.templator = templator
+		self.skip_unchanged = skip_unchanged
+		self._finders: Dict[int, AsyncFinder] = {}
+		super().__init__(cfg, concurrency, throttle)
+
+	async def finder(self, org: OrgMeta) -> AsyncFinder:
+		"""Get the Finder for an org, which is shared so that its cache and locks are too."""
+		gfn = await self.org_client(org)
+		if org["id"] not in self._finders:
+			self._finders[org["id"]] = AsyncFinder(gfn)
+		return self._finders[org["id"]]
+
+	async def all_orgs(self) -> List[Tuple[OrgMeta, AsyncGrafanaApi]]:
+		"""List all organisations with resources in files."""
+		orgs = [await self.get_org(org_name) for org_name in await asyncio.to_thread(self.layout.list_orgs)]
+		return [(org, await self.org_client(org)) for org in orgs]
+
+	def _read(self, kind: str, org: OrgMeta) -> AsyncIterator[Tuple[GrafanaPath, dict]]:
+		"""Read objects from the layout, scanning and parsing files in worker threads."""
+		return async_iterate(self.layout.read(kind, org["name"]))
+
+	def get_all_dashboards(self, org: OrgMeta, gfn: AsyncGrafanaApi) -> AsyncIterator[Tuple[GrafanaPath, DashboardContent]]:
+		"""Get all dashboards."""
+		return self._read(TOK_DASHBOARDS, org)
+
+	def get_all_alerts(self, org: OrgMeta, gfn: AsyncGrafanaApi) -> AsyncIterator[Tuple[GrafanaPath, AlertContent]]:
+		"""Get all alerts."""
+		return self._read(TOK_ALERTS, org)
+
+	async def each_dashboard(self, path: GrafanaPath, dashboard: DashboardContent):
+		"""Import each dashboard into Grafana."""
+		org = await self.get_org(path.org)
+		dashboard_templated = await asyncio.to_thread(self.templator.make_dashboard_from_template, dashboard, dashboard)
+		l.info(f"import dashboard path={path}")
+		finder = await self.finder(org)
+		folder = await finder.create_or_get_folder(path.folder)
+		result = await AsyncDashboarder(await self.org_client(org), skip_unchanged=self.skip_unchanged).import_dashboard(dashboard_templated, folder)
+		if self.templator.dashboard_refs is not None:
+			# remembering a path in an org may look up the org of the memo
+			await asyncio.to_thread(
+				self.templator.dashboard_refs.remember, result["uid"], GrafanaPath(dashboard_templated.get("title", path.name), path.folder, path.org)
+			)
+
+	async def each_alert(self, path: GrafanaPath, alert: AlertContent):
+		"""Import each alert into Grafana."""
+		org = await self.get_org(path.org)
+		finder = await self.finder(org)
+		alert_info, folder_info = await finder.create_or_get_alert(path)
+		alert_templated = await asyncio.to_thread(self.templator.make_dashboard_from_template, alert_info, alert)
 		l.info(f"import alert path={path}")
-		alerter.import_alert(alert_templated, folder_info)
+		await AsyncAlerter(await self.org_client(org)).import_alert(alert_templated, folder_info)
@@ -1,29 +1,39 @@
-"""Ready-to-run commands for common Grafana templating scenarios."""
+"""
+Ready-to-run commands for common Grafana templating scenarios.
+
+Modules are imported by the commands which use them, rather than when this module is imported.
+This keeps the CLI quick to start, which matters when it is invoked many times, for example in CI.
+"""
+from __future__ import annotations
+
 import datetime
 import json
 import logging
 import textwrap
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import IO
+from typing import IO, TYPE_CHECKING, List, Optional
 
 import click
-from grafana_client import GrafanaApi
-
-from grafanarmadillo.alerter import Alerter
-from grafanarmadillo.bulk import BulkExporter, BulkImporter
-from grafanarmadillo.dashboarder import Dashboarder
-from grafanarmadillo.find import Finder, default_api_v
-from grafanarmadillo.templator import (
-	Templator,
-	alert_dashboarduid_templator,
-	make_mapping_templator,
-	remove_edit_metadata_transformer,
-)
-from grafanarmadillo.types import GrafanaVersion
+
+from grafanarmadillo.types import GrafanaVersion, default_api_v
 from grafanarmadillo.util import load_data
 
 
+if TYPE_CHECKING:
+	from grafana_client import GrafanaApi
+
+	from grafanarmadillo.instrument import Metrics
+	from grafanarmadillo.templator import Templator
+	from grafanarmadillo.throttle import Throttle
+	from grafanarmadillo.util import JSONSelector
+
+
+l = logging.getLogger(__name__)
+
+# the keys of `grafanarmadillo.bulk.layouts`, listed here so that the options don't import the bulk module
+layout_names = ["tree", "jsonl"]
+
 load_file_help = """Should be encoded as json. You can pass this in as a string; or as file using 'file://path/to/file'"""
 auto_template_env_help = "The special value '$auto' will automatically provide a value by prepending a '$' to the keys of the grafana mapping"
 
@@ -47,16 +57,31 @@ templator_extra_opts_help = (
 		
 		- resolve_alert_dashboarduid : resolve the dashboard referenced by an alert to a reference.
 		
+		- include_keys : only template strings under these keys, as dotted paths like `panels.*.targets.*.expr` or `**.datasource.uid`
+		
+		- exclude_keys : never template strings under these keys
+		
+		- memo_size : remember the replacements of this many distinct strings, which helps when many dashboards share strings
+		
+		- profile : print the time taken and sizes in and out of each stage of the templator to stderr when the command finishes
+		
 		"""
 	) + load_file_help
 )
 
 
-def make_grafana(config) -> GrafanaApi:
+def make_grafana(config, throttle: Optional[Throttle] = None) -> GrafanaApi:
 	"""Make a GrafanaApi from the passed config."""
+	from grafana_client import GrafanaApi
+
+	from grafanarmadillo.instrument import instrument_api
+
 	if isinstance(config.get("auth"), list):
 		config["auth"] = tuple(config["auth"])
-	return GrafanaApi(**config)
+	gfn = instrument_api(GrafanaApi(**config))
+	if throttle:
+		throttle.wrap(gfn)
+	return gfn
 
 
 @dataclass(frozen=True)
@@ -65,23 +90,51 @@ class TemplatorOpts:
 
 	remove_edit_metadata: bool = False
 	resolve_alert_dashboarduid: bool = False
+	include_keys: Optional[List[str]] = None
+	exclude_keys: List[str] = field(default_factory=list)
+	memo_size: Optional[int] = None
+	profile: bool = False
+
+	@property
+	def selector(self) -> Optional[JSONSelector]:
+		"""Build the selector for the keys to template, if any are restricted."""
+		from grafanarmadillo.util import JSONSelector
+
+		if self.include_keys is None and not self.exclude_keys:
+			return None
+		return JSONSelector(include=self.include_keys, exclude=self.exclude_keys)
+
+
+def apply_template_opts(gfn: GrafanaApi, opts: TemplatorOpts, templator: Templator, bulk: bool = False) -> Templator:
+	"""Apply the extra templator options. Set `bulk` for templators which will template many objects."""
+	from grafanarmadillo.find import Finder
+	from grafanarmadillo.templator import (
+		Templator,
+		alert_dashboarduid_templator,
+		remove_edit_metadata_transformer,
+	)
 
-
-def apply_template_opts(gfn: GrafanaApi, opts: TemplatorOpts, templator: Templator) -> Templator:
-	"""Apply the extra templator options."""
 	if opts.remove_edit_metadata:
 		templator = templator.chain(Templator(make_template=remove_edit_metadata_transformer))
 	if opts.resolve_alert_dashboarduid:
-		templator = templator.chain(alert_dashboarduid_templator(Finder(gfn)))
+		templator = templator.chain(alert_dashboarduid_templator(Finder(gfn), warm=bulk))
 	return templator
 
 
-def make_templator(gfn: GrafanaApi, mapping, env_grafana, env_template, templator_extra_opts) -> Templator:
-	"""Assemble the templator."""
+def make_templator(gfn: GrafanaApi, mapping, env_grafana, env_template, templator_extra_opts, bulk: bool = False) -> Templator:
+	"""Assemble the templator. Set `bulk` for templators which will template many objects."""
+	from grafanarmadillo.templator import TemplatorProfile, make_mapping_templator
+
 	mapping = load_data(mapping)
-	templator = make_mapping_templator(mapping, env_grafana, env_template)
 	extra_opts = TemplatorOpts(**load_data(templator_extra_opts))
-	templator = apply_template_opts(gfn, extra_opts, templator)
+	templator = make_mapping_templator(mapping, env_grafana, env_template, extra_opts.selector, extra_opts.memo_size)
+	templator = apply_template_opts(gfn, extra_opts, templator, bulk)
+	if extra_opts.profile:
+		profile = TemplatorProfile()
+		templator = templator.profiled(profile)
+		ctx = click.get_current_context(silent=True)
+		if ctx:
+			ctx.call_on_close(lambda: click.echo(profile.format_table(), err=True))
 	return templator
 
 
@@ -99,8 +152,28 @@ def with_template_options(f):
 @click.group()
 @click.option("--cfg", "-c", help=f"Config for connecting to Grafana. {load_file_help}")
 @click.option("--api-version", help="Major Grafana API version", default=default_api_v)
+@click.option("--rate-limit", help="Maximum requests per second to Grafana. Slows down automatically if Grafana is overloaded", type=float, default=None)
+@click.option("--max-retries", help="Retry requests which fail transiently, like those rejected with 429 or 503", type=int, default=0)
+@click.option(
+	"--latency-target",
+	help="Slow down if requests to Grafana take longer than this many seconds. Needs --rate-limit",
+	type=float,
+	default=None,
+)
+@click.option(
+	"--report",
+	help="Print a report of requests, timings and cache hit rates to stderr when the command finishes",
+	type=click.Choice(["text", "json"]),
+	default=None,
+)
+@click.option(
+	"--metrics-file",
+	help="Write metrics in the OpenMetrics text format to this file when the command finishes",
+	type=click.Path(dir_okay=False, path_type=Path),
+	default=None,
+)
 @click.pass_context
-def grafanarmadillo(ctx, cfg, api_version):
+def grafanarmadillo(ctx, cfg, api_version, rate_limit, max_retries, latency_target, report, metrics_file):
 	"""Template Grafana things."""
 	ctx.ensure_object(dict)
 	if cfg:
@@ -111,6 +184,33 @@ def grafanarmadillo(ctx, cfg, api_version):
 		config = {}
 	ctx.obj["cfg"] = config
 	ctx.obj["api_v"] = api_version
+	if rate_limit or max_retries:
+		from grafanarmadillo.throttle import Throttle
+
+		throttle = Throttle(rate=rate_limit, max_retries=max_retries, latency_target=latency_target)
+		ctx.obj["throttle"] = throttle
+		ctx.call_on_close(lambda: l.info(f"requests to Grafana {throttle.metrics.as_dict()}"))
+	if report or metrics_file:
+		from grafanarmadillo.instrument import collecting
+
+		metrics = ctx.with_resource(collecting())
+		ctx.call_on_close(lambda: emit_metrics(metrics, report, metrics_file, ctx.obj.get("throttle")))
+
+
+def emit_metrics(metrics: Metrics, report: Optional[str], metrics_file: Optional[Path], throttle: Optional[Throttle] = None):
+	"""Output the report and metrics collected during a command."""
+	if report == "json":
+		structured = metrics.report()
+		if throttle:
+			structured["throttle"] = throttle.metrics.as_dict()
+		click.echo(json.dumps(structured, indent=2), err=True)
+	elif report == "text":
+		text = metrics.format_report()
+		if throttle:
+			text += "\nthrottle\n" + "\n".join(f"  {k}={v:g}" for k, v in throttle.metrics.as_dict().items())
+		click.echo(text, err=True)
+	if metrics_file:
+		metrics_file.write_text(metrics.openmetrics())
 
 
 @grafanarmadillo.group()
@@ -125,13 +225,16 @@ def dashboard():
 @click.pass_context
 def _export_dashboard(ctx, src, dst, mapping, env_grafana, env_template, templator_extra_opts):
 	"""Capture a dashboard from Grafana."""
-	gfn = make_grafana(ctx.obj["cfg"])
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
 	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
 	return export_dashboard(gfn, src, dst, templator, ctx.obj["api_v"])
 
 
 def export_dashboard(gfn: GrafanaApi, src: str, dst: IO, templator: Templator, api_v: GrafanaVersion = default_api_v):
 	"""Capture a dashboard from Grafana."""
+	from grafanarmadillo.dashboarder import Dashboarder
+	from grafanarmadillo.find import Finder
+
 	finder, dashboarder = Finder(gfn, api_v), Dashboarder(gfn)
 
 	dashboard_info = finder.get_from_path(src)
@@ -144,18 +247,22 @@ def export_dashboard(gfn: GrafanaApi, src: str, dst: IO, templator: Templator, a
 @dashboard.command(name="import")
 @click.option("--src", help="Path of the template", type=click.File("r"))
 @click.option("--dst", help="Path to write the dashboard to")
+@click.option("--skip-unchanged", help="Do not save the dashboard if it is identical to the dashboard in Grafana", is_flag=True, default=False)
 @with_template_options
 @click.pass_context
-def _import_dashboard(ctx, src, dst, mapping, env_grafana, env_template, templator_extra_opts):
+def _import_dashboard(ctx, src, dst, skip_unchanged, mapping, env_grafana, env_template, templator_extra_opts):
 	"""Deploy a template to Grafana."""
-	gfn = make_grafana(ctx.obj["cfg"])
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
 	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
-	return import_dashboard(gfn, src, dst, templator, ctx.obj["api_v"])
+	return import_dashboard(gfn, src, dst, templator, ctx.obj["api_v"], skip_unchanged=skip_unchanged)
 
 
-def import_dashboard(gfn: GrafanaApi, src: IO, dst: str, templator: Templator, api_v: GrafanaVersion = default_api_v):
+def import_dashboard(gfn: GrafanaApi, src: IO, dst: str, templator: Templator, api_v: GrafanaVersion = default_api_v, skip_unchanged: bool = False):
 	"""Deploy a template to Grafana."""
-	finder, dashboarder = Finder(gfn, api_v), Dashboarder(gfn)
+	from grafanarmadillo.dashboarder import Dashboarder
+	from grafanarmadillo.find import Finder
+
+	finder, dashboarder = Finder(gfn, api_v), Dashboarder(gfn, skip_unchanged=skip_unchanged)
 
 	template = load_data(src.read())
 
@@ -176,13 +283,16 @@ def alert():
 @click.pass_context
 def _export_alert(ctx, src, dst, mapping, env_grafana, env_template, templator_extra_opts):
 	"""Capture an alert from Grafana."""
-	gfn = make_grafana(ctx.obj["cfg"])
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
 	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
 	return export_alert(gfn, src, dst, templator, ctx.obj["api_v"])
 
 
 def export_alert(gfn: GrafanaApi, src: str, dst: IO, templator: Templator, api_v: GrafanaVersion = default_api_v):
 	"""Capture an alert from Grafana."""
+	from grafanarmadillo.alerter import Alerter
+	from grafanarmadillo.find import Finder
+
 	finder, alerter = Finder(gfn, api_v), Alerter(gfn)
 
 	alert_info = finder.get_alert_from_path(src)
@@ -199,13 +309,16 @@ def export_alert(gfn: GrafanaApi, src: str, dst: IO, templator: Templator, api_v
 @click.pass_context
 def _import_alert(ctx, src, dst, mapping, env_grafana, env_template, templator_extra_opts):
 	"""Deploy an alert from a template."""
-	gfn = make_grafana(ctx.obj["cfg"])
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
 	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
 	return import_alert(gfn, src, dst, templator, ctx.obj["api_v"])
 
 
 def import_alert(gfn: GrafanaApi, src: IO, dst: str, templator: Templator, api_v: GrafanaVersion = default_api_v):
 	"""Deploy an alert from a template."""
+	from grafanarmadillo.alerter import Alerter
+	from grafanarmadillo.find import Finder
+
 	finder, alerter = Finder(gfn, api_v), Alerter(gfn)
 
 	template = load_data(src.read())
@@ -279,7 +392,7 @@ def upgrade_alerting(
 	"""
 	from grafanarmadillo.migrate import migrate
 
-	gfn = make_grafana(ctx.obj["cfg"])
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
 	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
 
 	cfg = ctx.obj["cfg"]
@@ -304,27 +417,97 @@ def resources():
 	"""Move many resources to a Grafana."""
 
 
+def with_layout_option(f):
+	"""Add the option for how resources are arranged on disk."""
+	return click.option(
+		"--layout",
+		help="How resources are arranged on disk: 'tree' writes one file per object, 'jsonl' packs each org into one file",
+		type=click.Choice(layout_names),
+		default="tree",
+	)(f)
+
+
+def with_checkpoint_option(f):
+	"""Add the option for a checkpoint journal, to resume bulk operations."""
+	return click.option(
+		"--checkpoint",
+		help="Journal of completed work. Rerunning with the same journal skips work already completed. "
+		"A journal can only be resumed with the same Grafana and templator options",
+		type=click.Path(dir_okay=False, path_type=Path),
+		default=None,
+	)(f)
+
+
+def make_checkpoint(checkpoint: Optional[Path], cfg: dict, mapping, env_grafana, env_template, templator_extra_opts):
+	"""Open the checkpoint journal, if there is one, for an operation on a Grafana with a templator."""
+	from grafanarmadillo.bulk import Checkpoint
+
+	if checkpoint is None:
+		return None
+	templator_spec = {
+		"mapping": load_data(mapping),
+		"env_grafana": env_grafana,
+		"env_template": env_template,
+		"templator_extra_opts": load_data(templator_extra_opts),
+	}
+	return Checkpoint(checkpoint, Checkpoint.header_for(cfg, templator_spec))
+
+
 @resources.command("import")
 @click.option(
 	"--root-directory",
 	help="Root directory for all resources",
 	type=click.Path(exists=True, path_type=Path),
 )
+@click.option(
+	"--skip-unchanged",
+	help="Compare resources to Grafana first, and only import those that would change",
+	is_flag=True,
+	default=False,
+)
+@click.option(
+	"--dry-run",
+	help="Only print the changes that an import would make",
+	is_flag=True,
+	default=False,
+)
+@click.option("--workers", help="Number of objects to import concurrently. Alerts wait for the dashboards they reference", type=int, default=1)
+@with_layout_option
+@with_checkpoint_option
 @with_template_options
 @click.pass_context
 def _import_resources(
 	ctx,
 	root_directory: Path,
+	skip_unchanged: bool,
+	dry_run: bool,
+	workers: int,
+	layout: str,
+	checkpoint: Optional[Path],
 	mapping,
 	env_grafana,
 	env_template,
 	templator_extra_opts,
 ):
 	"""Load exported dashboards and alerts."""
-	gfn = make_grafana(ctx.obj["cfg"])
-	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
-	operator = BulkImporter(ctx.obj["cfg"], root_directory, templator=templator)
+	from grafanarmadillo.bulk import BulkImporter, layouts
+
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
+	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts, bulk=True)
+	operator = BulkImporter(
+		ctx.obj["cfg"],
+		root_directory,
+		templator=templator,
+		layout=layouts[layout](root_directory),
+		skip_unchanged=skip_unchanged,
+		dry_run=dry_run,
+		throttle=ctx.obj.get("throttle"),
+		workers=workers,
+		checkpoint=make_checkpoint(checkpoint, ctx.obj["cfg"], mapping, env_grafana, env_template, templator_extra_opts),
+	)
 	operator.run()
+	if skip_unchanged or dry_run:
+		click.echo(operator.plan.summary())
 
 
 @resources.command("export")
@@ -333,23 +516,59 @@ def _import_resources(
 	help="Root directory for all resources",
 	type=click.Path(exists=True, path_type=Path),
 )
+@with_layout_option
+@click.option("--prefetch", help="Number of objects to fetch from Grafana concurrently, ahead of writing them", type=int, default=8)
+@with_checkpoint_option
 @with_template_options
 @click.pass_context
 def _export_resources(
 	ctx,
 	root_directory: Path,
+	layout: str,
+	prefetch: int,
+	checkpoint: Optional[Path],
 	mapping,
 	env_grafana,
 	env_template,
 	templator_extra_opts,
 ):
 	"""Export dashboards and alerts from a Grafana instance."""
-	gfn = make_grafana(ctx.obj["cfg"])
-	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts)
-	operator = BulkExporter(ctx.obj["cfg"], root_directory, templator=templator)
+	from grafanarmadillo.bulk import BulkExporter, layouts
+
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
+	templator = make_templator(gfn, mapping, env_grafana, env_template, templator_extra_opts, bulk=True)
+	operator = BulkExporter(
+		ctx.obj["cfg"],
+		root_directory,
+		templator=templator,
+		layout=layouts[layout](root_directory),
+		throttle=ctx.obj.get("throttle"),
+		prefetch=prefetch,
+		checkpoint=make_checkpoint(checkpoint, ctx.obj["cfg"], mapping, env_grafana, env_template, templator_extra_opts),
+	)
 	operator.run()
 
 
+@grafanarmadillo.command()
+@click.option("--socket", "socket_path", help="Path of the Unix socket to listen on", type=click.Path(dir_okay=False, path_type=Path), required=True)
+@click.pass_context
+def serve(ctx, socket_path: Path):
+	"""
+	Serve import and export requests on a Unix socket.
+
+	Connections, caches and templators are kept warm between requests. Send requests with `grafanarmadillo.serve.Client`.
+	"""
+	from grafanarmadillo.serve import Server, Worker
+
+	gfn = make_grafana(ctx.obj["cfg"], ctx.obj.get("throttle"))
+	with Server(socket_path, Worker(gfn, ctx.obj["api_v"])) as server:
+		l.info(f"serving on {socket_path}")
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+
+
 if __name__ == "__main__":
 	logging.basicConfig(level=logging.DEBUG)
 	grafanarmadillo()
@@ -1,27 +1,166 @@
 """Push and pull Grafana dashboards."""
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple, Union
 
 from grafana_client import GrafanaApi
+from grafana_client.client import GrafanaClientError
 
+from grafanarmadillo.instrument import instrumented
 from grafanarmadillo.types import (
 	DashboardContent,
 	DashboardSearchResult,
 	FolderSearchResult,
 )
-from grafanarmadillo.util import project_dashboard_identity
+from grafanarmadillo.util import (
+	Cache,
+	CacheMode,
+	content_hash,
+	dashboard_volatile_fields,
+	prefetch_map,
+	project_dashboard_identity,
+	project_dict,
+)
+
+
+def _normalise_folder_uid(folder_uid: Optional[str]) -> str:
+	"""Dashboards in the General folder have no folder uid, but we synthesise one for searching."""
+	if folder_uid in (None, "general"):
+		return ""
+	return folder_uid
 
 
-class Dashboarder:
-	"""Collection of methods for managing dashboards."""
+class DashboarderBase:
+	"""
+	The parts of managing dashboards which do not make requests.
 
-	def __init__(self, api: GrafanaApi) -> None:
+	These are shared by Dashboarder and `grafanarmadillo.aio.AsyncDashboarder`,
+	which make the requests synchronously or with asyncio, and use these to build the requests and interpret their results.
+	"""
+
+	def __init__(self, api, skip_unchanged: bool = False, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
 		super().__init__()
 		self.api = api
+		self.skip_unchanged = skip_unchanged
+		self._cache = CacheMode.select(cache_mode)
+
+	@staticmethod
+	def _state(content: DashboardContent, folder_uid: Optional[str], identity: dict) -> dict:
+		return {
+			"hash": content_hash(content, dashboard_volatile_fields),
+			"folderUid": _normalise_folder_uid(folder_uid),
+			"identity": project_dict(identity, {"id", "uid", "version"}),
+		}
+
+	@classmethod
+	def _live_state_of(cls, result: dict) -> dict:
+		"""Get the state of a dashboard from the response of the get_dashboard API."""
+		return cls._state(result["dashboard"], result["meta"].get("folderUid"), result["dashboard"])
+
+	@staticmethod
+	def is_unchanged(live: Optional[dict], content: DashboardContent, folder_uid: Optional[str]) -> bool:
+		"""Check whether a dashboard matches the state of the dashboard in Grafana, from `live_state`."""
+		return (
+			live is not None
+			and live["hash"] == content_hash(content, dashboard_volatile_fields)
+			and live["folderUid"] == _normalise_folder_uid(folder_uid)
+		)
+
+	def _comparable_uid(self, new_dashboard: dict) -> Optional[str]:
+		"""Get the uid to compare a dashboard to Grafana by, or None if it should be saved unconditionally."""
+		uid = new_dashboard["dashboard"].get("uid")
+		return uid if self.skip_unchanged and uid else None
+
+	@staticmethod
+	def _saved_folder_uid(new_dashboard: dict) -> Optional[str]:
+		"""Get the folder a save would put the dashboard in. Without a folder, that is the General folder, wherever the dashboard is now."""
+		return new_dashboard.get("folderUid")
+
+	def _unchanged_result(self, new_dashboard: dict, live: Optional[dict]) -> Optional[dict]:
+		"""Get the result of saving a dashboard which is unchanged, or None if it needs saving."""
+		if self.is_unchanged(live, new_dashboard["dashboard"], self._saved_folder_uid(new_dashboard)):
+			return {**live["identity"], "status": "unchanged"}
+		return None
+
+	def _remember_saved(self, new_dashboard: dict, result: dict):
+		"""Record the state of a dashboard we have saved, and forget the searches for dashboards which it may have changed."""
+		# these are the Finder's entries, when it shares this cache. See `Finder._forget_dashboards`
+		self._cache.unset_method("_enumerate_dashboards_in_folders")
+		self._cache.unset_method("list_dashboards")
+
+		content = new_dashboard["dashboard"]
+		if content.get("uid"):
+			self._cache.set(("dashboard_state", content["uid"]), self._state(content, self._saved_folder_uid(new_dashboard), result))
 
+	@staticmethod
+	def _updated_dashboard(dashboard: DashboardSearchResult, content: DashboardContent) -> dict:
+		"""Build the request to set the content of a dashboard, keeping its identity."""
+		new_dashboard = dashboard.copy()
+		new_content = content.copy()
+
+		new_content.update(project_dashboard_identity(new_dashboard))
+
+		new_dashboard.update({"dashboard": new_content, "overwrite": True})
+		return new_dashboard
+
+	@staticmethod
+	def _imported_dashboard(content: DashboardContent, folder: Optional[FolderSearchResult]) -> dict:
+		"""Build the request to import a dashboard, optionally into a folder."""
+		content.pop("id", None)
+		new_dashboard = {"dashboard": content, "overwrite": True}
+		if folder:
+			new_dashboard.update({"folderUid": folder["uid"], "folderId": folder["id"]})
+		return new_dashboard
+
+
+class Dashboarder(DashboarderBase):
+	"""
+	Collection of methods for managing dashboards.
+
+	With `skip_unchanged`, dashboards are only saved if their content differs from the dashboard in Grafana.
+	Content is compared by a hash which ignores volatile fields like the `version`.
+	The hash of the dashboard in Grafana is cached, so repeatedly importing the same dashboard is nearly free.
+	Only dashboards with a `uid` can be compared.
+	"""
+
+	def __init__(self, api: GrafanaApi, skip_unchanged: bool = False, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+		super().__init__(api, skip_unchanged, cache_mode)
+
+	@instrumented
 	def get_dashboard_content(self, dashboard: DashboardSearchResult) -> DashboardContent:
 		"""Get the contents of a Grafana dashboard."""
 		return self.api.dashboard.get_dashboard(dashboard["uid"])["dashboard"]
 
+	def live_state(self, uid: str) -> Optional[dict]:
+		"""Get the hash, folder and identity of the dashboard in Grafana, if it exists."""
+		def _get_live_state():
+			try:
+				result = self.api.dashboard.get_dashboard(uid)
+			except GrafanaClientError as e:
+				if e.status_code == 404:
+					return None
+				raise
+			return self._live_state_of(result)
+
+		# a missing dashboard is cached too, since saving it records its state
+		return self._cache.getor(("dashboard_state", uid), _get_live_state, cache_falsy=True)
+
+	def fetch_live_states(self, uids: Iterable[str], workers: int = 8):
+		"""Fetch the states of many dashboards concurrently, so that `live_state` answers from the cache."""
+		for _ in prefetch_map(self.live_state, uids, workers):
+			pass
+
+	def _save(self, new_dashboard: dict):
+		"""Save a dashboard, unless it is unchanged."""
+		uid = self._comparable_uid(new_dashboard)
+		if uid is not None:
+			unchanged = self._unchanged_result(new_dashboard, self.live_state(uid))
+			if unchanged:
+				return unchanged
+
+		result = self.api.dashboard.update_dashboard(new_dashboard)
+		self._remember_saved(new_dashboard, result)
+		return result
+
+	@instrumented
 	def set_dashboard_content(
 		self, dashboard: DashboardSearchResult, content: DashboardContent
 	):
@@ -31,26 +170,16 @@ class Dashboarder:
 		This explicitly leaves out the identity information.
 		That allows you to graft the contents of a dashboard into another
 		"""
-		new_dashboard = dashboard.copy()
-		new_content = content.copy()
-
-		new_content.update(project_dashboard_identity(new_dashboard))
-
-		new_dashboard.update({"dashboard": new_content, "overwrite": True})
-
-		return self.api.dashboard.update_dashboard(new_dashboard)
+		return self._save(self._updated_dashboard(dashboard, content))
 
+	@instrumented
 	def import_dashboard(
 		self, content: DashboardContent, folder: Optional[FolderSearchResult] = None
 	):
 		"""Import a dashboard into Grafana, optionally into a folder."""
-		content.pop("id", None)
-		new_dashboard = {"dashboard": content, "overwrite": True}
-		if folder:
-			new_dashboard.update({"folderUid": folder["uid"], "folderId": folder["id"]})
-
-		return self.api.dashboard.update_dashboard(new_dashboard)
+		return self._save(self._imported_dashboard(content, folder))
 
+	@instrumented
 	def export_dashboard(
 		self, dashboard: DashboardSearchResult
 	) -> Tuple[DashboardContent, Optional[FolderSearchResult]]:
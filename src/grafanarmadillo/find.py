@@ -1,10 +1,12 @@
 """Find Grafana dashboards and folders."""
 from __future__ import annotations
 
-from typing import List, Optional, Tuple, Union
+from itertools import count
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from grafana_client import GrafanaApi
 
+from grafanarmadillo.instrument import instrumented
 from grafanarmadillo.paths import PathCodec
 from grafanarmadillo.types import (
 	AlertSearchResult,
@@ -13,8 +15,9 @@ from grafanarmadillo.types import (
 	GrafanaPath,
 	GrafanaVersion,
 	PathLike,
+	default_api_v,
 )
-from grafanarmadillo.util import Cache, CacheMode, exactly_one
+from grafanarmadillo.util import Cache, CacheMode, exactly_one, prefetch_map
 
 
 def _query_message(query_type: str, query: str) -> str:
@@ -22,96 +25,242 @@ def _query_message(query_type: str, query: str) -> str:
 	return f"type={query_type}, query={query}"
 
 
-default_api_v = GrafanaVersion(11)
+default_page_size = 5000  # the most results Grafana returns from one search
 
 
-class Finder:
+class FinderBase:
 	"""
-	Collection of methods for finding Grafana dashboards and folders.
+	The parts of finding objects which do not make requests.
 
-	If not using the latest Grafana version, set the `api_v` parameter to the major version.
-	Some APIs have changed.
+	These are shared by Finder and `grafanarmadillo.aio.AsyncFinder`,
+	which make the requests synchronously or with asyncio, and use these to build the requests and interpret their results.
 	"""
 
-	def __init__(self, api: GrafanaApi, api_v: GrafanaVersion = default_api_v, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+	def __init__(self, api, api_v: GrafanaVersion = default_api_v, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
 		super().__init__()
 		self.api = api
 		self.api_v = api_v
 		self._cache = CacheMode.select(cache_mode)
 
-	def list_dashboards(self) -> List[DashboardSearchResult]:
-		"""List all dashboards."""
-		return self._cache.getor("list_dashboards", lambda: self.api.search.search_dashboards(type_="dash-db"))
+	@property
+	def _folder_lookup_param(self) -> str:
+		return "uid" if self.api_v >= 10 else "id"
+
+	def _folder_ids(self, folder_objects: Iterable[FolderSearchResult]) -> Tuple[str, ...]:
+		"""Get the identifiers to search for dashboards in folders by."""
+		return tuple(str(f[self._folder_lookup_param]) for f in folder_objects)
+
+	def _folder_search_kwargs(self, folder_ids: Tuple[str, ...]) -> dict:
+		if self.api_v >= 10:
+			return {"folder_uids": folder_ids}
+		else:
+			return {"folder_ids": folder_ids}
+
+	def _general_folder(self, folder: FolderSearchResult) -> FolderSearchResult:
+		if self.api_v >= 10:
+			# search API uses this for the folderUIDs parameter
+			folder["uid"] = "general"
+		return folder
+
+	@staticmethod
+	def _one_folder(folders: Iterable[FolderSearchResult], name: str) -> FolderSearchResult:
+		return exactly_one([f for f in folders if f["title"] == name], _query_message("folder", name))
+
+	@staticmethod
+	def _one_dashboard(dashboards: Iterable[DashboardSearchResult], folder_name: str, dashboard_name: str) -> DashboardSearchResult:
+		return exactly_one(
+			[d for d in dashboards if d["title"] == dashboard_name],
+			_query_message("dashboard", f"/{folder_name}/{dashboard_name}"),
+		)
+
+	@staticmethod
+	def _one_alert(alerts: Iterable[AlertSearchResult], folder: FolderSearchResult, folder_name: str, alert_name: str) -> AlertSearchResult:
+		return exactly_one(
+			[a for a in alerts if a["title"] == alert_name and a["folderUID"] == folder["uid"]],
+			_query_message("alert", f"/{folder_name}/{alert_name}")
+		)
+
+	@staticmethod
+	def _alerts_in_folders(alerts: Iterable[AlertSearchResult], folder_objects: Iterable[FolderSearchResult]) -> List[AlertSearchResult]:
+		folder_uids = {e["uid"] for e in folder_objects}
+		return [e for e in alerts if e.get("folderUID") in folder_uids]
+
+	@staticmethod
+	def search_result_path(result: DashboardSearchResult) -> GrafanaPath:
+		"""Get the path of a dashboard from its search result. Dashboards in the General folder have no folder in search results."""
+		return GrafanaPath(folder=result.get("folderTitle") or "General", name=result["title"])
+
+	@staticmethod
+	def _dashboard_path(d: dict) -> GrafanaPath:
+		"""Get the path of a dashboard from the result of getting it."""
+		return GrafanaPath(folder=d["meta"].get("folderTitle", None), name=d["dashboard"]["title"])
+
+	def _cached_dashboard_paths(self, uids: Iterable[str]) -> Tuple[Dict[str, GrafanaPath], List[str]]:
+		"""Split uids into the paths which are cached, and the uids which are not."""
+		resolved = {}
+		missing = []
+		for uid in dict.fromkeys(uids):
+			path = self._cache.get(("dashboard_path", uid))
+			if path:
+				resolved[uid] = path
+			else:
+				missing.append(uid)
+		return resolved, missing
+
+	def _remember_dashboard_paths(self, results: Iterable[DashboardSearchResult], resolved: Dict[str, GrafanaPath]):
+		for result in results:
+			resolved[result["uid"]] = self.search_result_path(result)
+			self._cache.set(("dashboard_path", result["uid"]), resolved[result["uid"]])
 
+	@staticmethod
+	def _new_dashboard(name: str, folder: FolderSearchResult) -> dict:
+		return {
+			"dashboard": {"title": name},
+			"folderId": folder["id"],
+			"folderUid": folder["uid"],
+		}
+
+	def _forget_dashboards(self):
+		# we reset all enumerate search results rather than finding only those that apply
+		# since a search might have `(otherfolder, ourfolder)` as a key.
+		# sorting through that sounds difficult to get right
+		self._cache.unset_method("_enumerate_dashboards_in_folders")
+		self._cache.unset_method("list_dashboards")
+
+	@staticmethod
+	def _mk_null_alert(folder_uid: str, title: str) -> dict:
+		"""Fill in the minimum boilerplate for Grafana to let us create an alert."""
+		return {
+			"title": title,
+			"folderUID": folder_uid,
+			"condition": "A",
+			"ruleGroup": "grafanarmadillo_tmp",
+			"data": [
+				{
+					"refId": "A",
+					"relativeTimeRange": {
+						"from": 0,
+						"to": 0
+					},
+					"datasourceUid": "__expr__",
+					"model": {
+						"conditions": [
+							{
+								"evaluator": {
+									"params": [
+										0,
+										0
+									],
+									"type": "gt"
+								},
+								"operator": {
+									"type": "and"
+								},
+								"query": {
+									"params": []
+								},
+								"reducer": {
+									"params": [],
+									"type": "avg"
+								},
+								"type": "query"
+							}
+						],
+						"datasource": {
+							"name": "Expression",
+							"type": "__expr__",
+							"uid": "__expr__"
+						},
+						"expression": "0",
+						"intervalMs": 1000000,
+						"maxDataPoints": 43200,
+						"refId": "A",
+						"type": "math"
+					}
+				}
+			],
+			"noDataState": "NoData",
+			"execErrState": "Error",
+			"for": "5m",
+			"isPaused": False
+		}
+
+
+class Finder(FinderBase):
+	"""
+	Collection of methods for finding Grafana dashboards and folders.
+
+	If not using the latest Grafana version, set the `api_v` parameter to the major version.
+	Some APIs have changed.
+	"""
+
+	def __init__(self, api: GrafanaApi, api_v: GrafanaVersion = default_api_v, cache_mode: Union[CacheMode, Cache] = CacheMode.SESSION) -> None:
+		super().__init__(api, api_v, cache_mode)
+
+	def iter_dashboards(self, page_size: int = default_page_size, workers: int = 1) -> Iterator[DashboardSearchResult]:
+		"""
+		Iterate over all dashboards, a page of search results at a time.
+
+		Grafana returns at most `page_size` results from one search, so pages are fetched until one is not full.
+		Set `workers` to fetch that many pages concurrently, ahead of the consumer.
+		Each page is cached as it is fetched.
+		"""
+		def _page(page: int) -> List[DashboardSearchResult]:
+			return self._cache.getor(
+				("list_dashboards", page_size, page),
+				lambda: self.api.search.search_dashboards(type_="dash-db", limit=page_size, page=page),
+			)
+
+		for results in prefetch_map(_page, count(1), workers, lookahead=workers):
+			yield from results
+			if len(results) < page_size:
+				return
+
+	@instrumented
+	def list_dashboards(self, page_size: int = default_page_size, workers: int = 1) -> List[DashboardSearchResult]:
+		"""List all dashboards. See `iter_dashboards`."""
+		return list(self.iter_dashboards(page_size, workers))
+
+	@instrumented
 	def list_alerts(self) -> List[AlertSearchResult]:
 		"""List all alerts."""
 		return self._cache.getor("list_alerts", lambda: self.api.alertingprovisioning.get_alertrules_all())
 
+	@instrumented
 	def find_dashboards(self, name: str) -> List[DashboardSearchResult]:
 		"""Find all dashboards with a name. Returns exact matches only."""
-		return list(
-			filter(
-				lambda x: x["title"] == name,
-				self.api.search.search_dashboards(query=name, type_="dash-db"),
-			)
-		)
-
-	@property
-	def _folder_lookup_param(self) -> str:
-		return "uid" if self.api_v >= 10 else "id"
+		return [x for x in self.api.search.search_dashboards(query=name, type_="dash-db") if x["title"] == name]
 
-	def _enumerate_dashboards_in_folders(self, folder_uids: List[str]):
-		folder_uids = tuple(folder_uids)
-
-		def do_enumerate_dashboards():
-			if self.api_v >= 10:
-				folder_kwarg = {"folder_uids": folder_uids}
-			else:
-				folder_kwarg = {"folder_ids": folder_uids}
-			return self.api.search.search_dashboards(
-				query=None, type_="dash-db", **folder_kwarg
-			)
-		return self._cache.getor(("_enumerate_dashboards_in_folders", folder_uids), do_enumerate_dashboards)
+	def _enumerate_dashboards_in_folders(self, folder_ids: Tuple[str, ...]):
+		return self._cache.getor(
+			("_enumerate_dashboards_in_folders", folder_ids),
+			lambda: self.api.search.search_dashboards(query=None, type_="dash-db", **self._folder_search_kwargs(folder_ids)),
+		)
 
+	@instrumented
 	def get_dashboards_in_folders(self, folder_names: List[str]) -> List[DashboardSearchResult]:
 		"""Get all dashboards in folders."""
-		folder_objects = list(
-			map(lambda folder_name: self.get_folder(name=folder_name), folder_names)
-		)
-
-		return self._enumerate_dashboards_in_folders(
-			list(map(lambda f: str(f[self._folder_lookup_param]), folder_objects))
-		)
+		folder_objects = [self.get_folder(name=folder_name) for folder_name in folder_names]
+		return self._enumerate_dashboards_in_folders(self._folder_ids(folder_objects))
 
+	@instrumented
 	def get_alerts_in_folders(self, folder_names: List[str]) -> List[AlertSearchResult]:
 		"""Get all alerts in folders."""
-		folder_objects = list(
-			map(lambda folder_name: self.get_folder(name=folder_name), folder_names)
-		)
-		folder_uids = {e["uid"] for e in folder_objects}
-		all_alerts = self.list_alerts()
-		return [e for e in all_alerts if e.get("folderUID") in folder_uids]
+		folder_objects = [self.get_folder(name=folder_name) for folder_name in folder_names]
+		return self._alerts_in_folders(self.list_alerts(), folder_objects)
 
+	@instrumented
 	def get_folder(self, name) -> FolderSearchResult:
 		"""Get a folder by name. Folders don't nest, so this will return at most 1 folder."""
 		def _get_folder() -> FolderSearchResult:
 			if name == "General":
-				v = self.api.folder.get_folder_by_id(0)
-				if self.api_v >= 10:
-					# search API uses this for the folderUIDs parameter
-					v["uid"] = "general"
-				return v
+				return self._general_folder(self.api.folder.get_folder_by_id(0))
 			else:
 				search_result = self.api.search.search_dashboards(query=name, type_="dash-folder")
-				return exactly_one(
-					list(filter(
-						lambda x: x["title"] == name,
-						map(lambda sr: self.api.folder.get_folder(sr["uid"]), search_result),
-					)),
-					_query_message("folder", name),
-				)
+				return self._one_folder((self.api.folder.get_folder(sr["uid"]) for sr in search_result), name)
 		return self._cache.getor(("get_folder", name), _get_folder)
 
+	@instrumented
 	def create_or_get_folder(self, name: str) -> FolderSearchResult:
 		"""
 		Create a new folder if it does not exist.
@@ -124,6 +273,7 @@ class Finder:
 			folder = self.api.folder.create_folder(name)
 		return folder
 
+	@instrumented
 	def get_dashboard(self, folder_name: str, dashboard_name: str) -> DashboardSearchResult:
 		"""
 		Get a dashboard by its parent folder and dashboard name.
@@ -131,41 +281,54 @@ class Finder:
 		Dashboards without a parent are children of the "General" folder.
 		"""
 		folder_object = self.get_folder(folder_name)
-		dashboards = self._enumerate_dashboards_in_folders([str(folder_object[self._folder_lookup_param])])
-		return exactly_one(
-			list(filter(lambda d: d["title"] == dashboard_name, dashboards)),
-			_query_message("dashboard", f"/{folder_name}/{dashboard_name}"),
-		)
+		dashboards = self._enumerate_dashboards_in_folders(self._folder_ids([folder_object]))
+		return self._one_dashboard(dashboards, folder_name, dashboard_name)
 
+	@instrumented
+	def resolve_dashboard_uids(self, uids: Iterable[str], chunk_size: int = 100) -> Dict[str, GrafanaPath]:
+		"""
+		Get the paths of many dashboards by their uids.
+
+		Uids are looked up with one search for every `chunk_size` uids, rather than by fetching each dashboard.
+		Paths are cached. Dashboards which do not exist are left out.
+		"""
+		resolved, missing = self._cached_dashboard_paths(uids)
+		for i in range(0, len(missing), chunk_size):
+			chunk = missing[i:i + chunk_size]
+			self._remember_dashboard_paths(self.api.search.search_dashboards(type_="dash-db", dashboard_uids=chunk, limit=len(chunk)), resolved)
+		return resolved
+
+	@instrumented
 	def get_dashboard_by_uid(self, uid: str) -> GrafanaPath:
-		"""Get a dashboard by its uid."""
-		d = self.api.dashboard.get_dashboard(uid)
-		dashboard_title = d["dashboard"]["title"]
-		folder_title = d["meta"].get("folderTitle", None)
-		return GrafanaPath(folder=folder_title, name=dashboard_title)
+		"""
+		Get a dashboard by its uid.
+
+		The path is resolved with a search. If the search does not find it, the dashboard is fetched,
+		which raises a `GrafanaClientError` with status 404 if it does not exist.
+		"""
+		resolved = self.resolve_dashboard_uids([uid])
+		if uid in resolved:
+			return resolved[uid]
+		return self._dashboard_path(self.api.dashboard.get_dashboard(uid))
 
+	@instrumented
 	def get_alert(self, folder_name, alert_name) -> AlertSearchResult:
 		"""Get an alert by its parent folder and alert name."""
-		folder_uid = self.get_folder(folder_name)["uid"]
-
-		return exactly_one(
-			list(filter(
-				lambda a: a["title"] == alert_name and a["folderUID"] == folder_uid,
-				self.list_alerts()
-			)),
-			_query_message("alert", f"/{folder_name}/{alert_name}")
-		)
+		return self._one_alert(self.list_alerts(), self.get_folder(folder_name), folder_name, alert_name)
 
+	@instrumented
 	def get_from_path(self, path: PathLike) -> Union[DashboardSearchResult, AlertSearchResult]:
 		"""Get a dashboard from a string path like `/folder0/dashboard0`."""
 		address = PathCodec.try_parse(path)
 		return self.get_dashboard(address.folder, address.name)
 
+	@instrumented
 	def get_alert_from_path(self, path: PathLike) -> AlertSearchResult:
 		"""Get an alert from a string path like `/folder0/alert0`."""
 		address = PathCodec.try_parse(path)
 		return self.get_alert(address.folder, address.name)
 
+	@instrumented
 	def create_or_get_dashboard(self, path: PathLike) -> Tuple[DashboardSearchResult, Optional[FolderSearchResult]]:
 		"""
 		Create a new empty dashboard if it does not exist.
@@ -178,23 +341,14 @@ class Finder:
 		try:
 			dashboard = self.get_dashboard(address.folder, address.name)
 		except ValueError:
-			self.api.dashboard.update_dashboard(
-				{
-					"dashboard": {"title": address.name},
-					"folderId": folder["id"],
-					"folderUid": folder["uid"],
-				}
-			)
-			# we reset all enumerate search results rather than finding only those that apply
-			# since a search might have `(otherfolder, ourfolder)` as a key.
-			# sorting through that sounds difficult to get right
-			self._cache.unset_method("_enumerate_dashboards_in_folders")
-			self._cache.unset("list_dashboards")
+			self.api.dashboard.update_dashboard(self._new_dashboard(address.name, folder))
+			self._forget_dashboards()
 
 			dashboard = self.get_dashboard(address.folder, address.name)
 
 		return dashboard, folder
 
+	@instrumented
 	def create_or_get_alert(self, path: PathLike) -> Tuple[AlertSearchResult, FolderSearchResult]:
 		"""
 		Get the information about an alert or create a new "empty" alert if it does not exist.
@@ -217,60 +371,3 @@ class Finder:
 			alert = self.get_alert(address.folder, address.name)
 
 		return alert, folder
-
-	def _mk_null_alert(self, folder_uid: str, title: str) -> dict:
-		"""Fill in the minimum boilerplate for Grafana to let us create an alert."""
-		return {
-			"title": title,
-			"folderUID": folder_uid,
-			"condition": "A",
-			"ruleGroup": "grafanarmadillo_tmp",
-			"data": [
-				{
-					"refId": "A",
-					"relativeTimeRange": {
-						"from": 0,
-						"to": 0
-					},
-					"datasourceUid": "__expr__",
-					"model": {
-						"conditions": [
-							{
-								"evaluator": {
-									"params": [
-										0,
-										0
-									],
-									"type": "gt"
-								},
-								"operator": {
-									"type": "and"
-								},
-								"query": {
-									"params": []
-								},
-								"reducer": {
-									"params": [],
-									"type": "avg"
-								},
-								"type": "query"
-							}
-						],
-						"datasource": {
-							"name": "Expression",
-							"type": "__expr__",
-							"uid": "__expr__"
-						},
-						"expression": "0",
-						"intervalMs": 1000000,
-						"maxDataPoints": 43200,
-						"refId": "A",
-						"type": "math"
-					}
-				}
-			],
-			"noDataState": "NoData",
-			"execErrState": "Error",
-			"for": "5m",
-			"isPaused": False
-		}
@@ -15,7 +15,7 @@ from grafanarmadillo.dashboarder import Dashboarder
 from grafanarmadillo.find import Finder
 from grafanarmadillo.templator import Templator
 from grafanarmadillo.types import PathLike
-from grafanarmadillo.util import CacheMode, resolve_object_to_filepath
+from grafanarmadillo.util import CacheMode, read_from_file, resolve_object_to_filepath
 
 
 class Store(ABC):
@@ -49,6 +49,9 @@ class FileStore(Store):
 
 	You can customise the path these files will be stored under.
 	Override the method `resolve_object_to_filepath`.
+
+	For large dashboards, use `grafanarmadillo.util.FastJSONEncoder` and `grafanarmadillo.util.FastJSONDecoder`.
+	These use `orjson` if it is installed (`pip install grafanarmadillo[fast]`), and read files from a memory-mapped buffer.
 	"""
 
 	root: Path
@@ -60,8 +63,7 @@ class FileStore(Store):
 
 	@staticmethod
 	def _read(file: Path, codec: Type[json.JSONDecoder]) -> dict:
-		with file.with_suffix(".json").open(mode="r", encoding="utf-8") as f:
-			return json.load(f, cls=codec)
+		return read_from_file(file.with_suffix(".json"), codec)
 
 	@staticmethod
 	def _write(file: Path, content: dict, codec: Type[json.JSONEncoder]):
@@ -0,0 +1,358 @@
+"""
+Measure where time goes in Grafanarmadillo.
+
+Instrumentation is collected while a Metrics is active:
+	metrics = Metrics()
+	with collecting(metrics):
+		gfn = instrument_api(GrafanaApi(**cfg))
+		BulkExporter(cfg, root, templator).run()
+	print(metrics.format_report())
+
+It records:
+- http: requests to Grafana, by method, endpoint and status
+- operations: calls to Finder, Dashboarder, Alerter and Templator methods
+- phases: the phases of bulk operations, like reading, templating and writing
+- cache: hits and misses of Finder, Dashboarder and Alerter caches
+
+When no Metrics is active, the hooks do nothing.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import (
+	TYPE_CHECKING,
+	Callable,
+	Dict,
+	Iterable,
+	Iterator,
+	List,
+	Optional,
+	Tuple,
+	TypeVar,
+)
+from urllib.parse import urlsplit
+
+
+if TYPE_CHECKING:
+	from grafana_client import GrafanaApi
+
+
+T = TypeVar("T")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HTTP = "http_request_seconds"
+METRIC_OPERATION = "operation_seconds"
+METRIC_PHASE = "phase_seconds"
+METRIC_CACHE = "cache_requests"
+
+_id_after = {"uid", "folders", "alert-rules", "orgs", "name", "users", "teams", "datasources"}
+
+
+def normalise_endpoint(url: str) -> str:
+	"""
+	Replace identifiers in a URL with placeholders, so that requests to the same endpoint are grouped.
+
+	>>> normalise_endpoint("http://localhost:3000/api/dashboards/uid/abc123?x=1")
+	'/api/dashboards/uid/{}'
+	>>> normalise_endpoint("/api/orgs/2")
+	'/api/orgs/{}'
+	"""
+	segments = urlsplit(url).path.split("/")
+	out = []
+	for i, segment in enumerate(segments):
+		if segment.isdigit() or (i > 0 and segments[i - 1] in _id_after and segment):
+			out.append("{}")
+		else:
+			out.append(segment)
+	return "/".join(out)
+
+
+class Histogram:
+	"""Distribution of observed values, in buckets."""
+
+	def __init__(self, buckets: Tuple[float, ...] = default_buckets):
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets) + 1)
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def observe(self, value: float):
+		"""Add an observation."""
+		self.counts[bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.total += value
+		self.max = max(self.max, value)
+
+	def cumulative(self) -> List[Tuple[float, int]]:
+		"""Get the cumulative counts at each bucket bound."""
+		out, running = [], 0
+		for bound, n in zip((*self.buckets, float("inf")), self.counts):
+			running += n
+			out.append((bound, running))
+		return out
+
+	def summary(self) -> dict:
+		"""Summarise the observations."""
+		return {
+			"count": self.count,
+			"total": self.total,
+			"mean": self.total / self.count if self.count else 0.0,
+			"max": self.max,
+		}
+
+
+class Metrics:
+	"""Counters and histograms, with labels. Safe to use from multiple threads."""
+
+	def __init__(self, prefix: str = "grafanarmadillo", clock: Callable[[], float] = time.perf_counter):
+		self.prefix = prefix
+		self.clock = clock
+		self.counters: Dict[Tuple[str, Labels], float] = {}
+		self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+		self._lock = threading.Lock()
+
+	def inc(self, name: str, n: float = 1, **labels: str):
+		"""Increment a counter."""
+		k = (name, tuple(sorted(labels.items())))
+		with self._lock:
+			self.counters[k] = self.counters.get(k, 0) + n
+
+	def observe(self, name: str, value: float, **labels: str):
+		"""Add an observation to a histogram."""
+		k = (name, tuple(sorted(labels.items())))
+		with self._lock:
+			if k not in self.histograms:
+				self.histograms[k] = Histogram()
+			self.histograms[k].observe(value)
+
+	@contextmanager
+	def timer(self, name: str, **labels: str):
+		"""Time a block into a histogram."""
+		start = self.clock()
+		try:
+			yield
+		finally:
+			self.observe(name, self.clock() - start, **labels)
+
+	def _histogram_report(self, name: str) -> List[dict]:
+		return [{**dict(labels), **h.summary()} for (n, labels), h in sorted(self.histograms.items()) if n == name]
+
+	def _cache_report(self) -> List[dict]:
+		by_method: Dict[str, Dict[str, float]] = {}
+		for (n, labels), v in sorted(self.counters.items()):
+			if n != METRIC_CACHE:
+				continue
+			label_dict = dict(labels)
+			by_method.setdefault(label_dict["method"], {"hit": 0, "miss": 0})[label_dict["result"]] += v
+		return [
+			{"method": method, "hits": c["hit"], "misses": c["miss"], "hit_rate": c["hit"] / (c["hit"] + c["miss"])}
+			for method, c in by_method.items()
+		]
+
+	def report(self) -> dict:
+		"""Get a structured report of everything measured."""
+		with self._lock:
+			return {
+				"http": self._histogram_report(METRIC_HTTP),
+				"operations": self._histogram_report(METRIC_OPERATION),
+				"phases": self._histogram_report(METRIC_PHASE),
+				"cache": self._cache_report(),
+			}
+
+	def format_report(self) -> str:
+		"""Format the report as text tables."""
+		report = self.report()
+		lines = []
+
+		def table(title: str, rows: List[dict], key: Callable[[dict], str], fmt: Callable[[dict], str]):
+			if not rows:
+				return
+			lines.append(title)
+			width = max(len(key(r)) for r in rows)
+			for r in rows:
+				lines.append(f"  {key(r):<{width}}  {fmt(r)}")
+
+		def fmt_timing(r: dict) -> str:
+			return f"count={r['count']:<6} total={r['total']:.3f}s mean={r['mean'] * 1000:.1f}ms max={r['max'] * 1000:.1f}ms"
+
+		table("http", report["http"], lambda r: f"{r['method']} {r['endpoint']} {r['status']}", fmt_timing)
+		table("operations", report["operations"], lambda r: r["operation"], fmt_timing)
+		table("phases", report["phases"], lambda r: r["phase"], fmt_timing)
+		table(
+			"cache", report["cache"], lambda r: r["method"],
+			lambda r: f"hits={r['hits']:<6g} misses={r['misses']:<6g} hit_rate={r['hit_rate']:.1%}",
+		)
+		return "\n".join(lines)
+
+	def openmetrics(self) -> str:
+		"""Format all metrics in the OpenMetrics text format."""
+
+		def fmt_labels(labels: Iterable[Tuple[str, str]]) -> str:
+			if not labels:
+				return ""
+			escaped = (
+				'%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+				for k, v in labels
+			)
+			return "{" + ",".join(escaped) + "}"
+
+		lines = []
+		with self._lock:
+			for name in sorted({n for n, _ in self.counters}):
+				family = f"{self.prefix}_{name}"
+				lines.append(f"# TYPE {family} counter")
+				for (n, labels), v in sorted(self.counters.items()):
+					if n == name:
+						lines.append(f"{family}_total{fmt_labels(labels)} {v:g}")
+			for name in sorted({n for n, _ in self.histograms}):
+				family = f"{self.prefix}_{name}"
+				lines.append(f"# TYPE {family} histogram")
+				lines.append(f"# UNIT {family} seconds")
+				for (n, labels), h in sorted(self.histograms.items()):
+					if n != name:
+						continue
+					for bound, count in h.cumulative():
+						le = "+Inf" if bound == float("inf") else f"{bound:g}"
+						lines.append(f"{family}_bucket{fmt_labels((*labels, ('le', le)))} {count}")
+					lines.append(f"{family}_count{fmt_labels(labels)} {h.count}")
+					lines.append(f"{family}_sum{fmt_labels(labels)} {h.total:g}")
+		lines.append("# EOF")
+		return "\n".join(lines) + "\n"
+
+
+_active: Optional[Metrics] = None
+
+
+def active() -> Optional[Metrics]:
+	"""Get the Metrics being collected, if any."""
+	return _active
+
+
+@contextmanager
+def collecting(metrics: Optional[Metrics] = None) -> Iterator[Metrics]:
+	"""Collect instrumentation into a Metrics within this block."""
+	global _active
+	metrics = metrics or Metrics()
+	previous, _active = _active, metrics
+	try:
+		yield metrics
+	finally:
+		_active = previous
+
+
+def instrumented(f: Callable[..., T]) -> Callable[..., T]:
+	"""Time calls to a function as an operation. Coroutine functions are timed until they finish."""
+	operation = f.__qualname__
+
+	if inspect.iscoroutinefunction(f):
+		@functools.wraps(f)
+		async def async_wrapper(*args, **kwargs):
+			metrics = _active
+			if metrics is None:
+				return await f(*args, **kwargs)
+			with metrics.timer(METRIC_OPERATION, operation=operation):
+				return await f(*args, **kwargs)
+
+		return async_wrapper
+
+	@functools.wraps(f)
+	def wrapper(*args, **kwargs):
+		metrics = _active
+		if metrics is None:
+			return f(*args, **kwargs)
+		with metrics.timer(METRIC_OPERATION, operation=operation):
+			return f(*args, **kwargs)
+
+	return wrapper
+
+
+@contextmanager
+def phase(name: str):
+	"""Time a block as a phase."""
+	metrics = _active
+	if metrics is None:
+		yield
+		return
+	with metrics.timer(METRIC_PHASE, phase=name):
+		yield
+
+
+def timed_iter(name: str, it: Iterable[T]) -> Iterator[T]:
+	"""Time producing each item of an iterable as a phase."""
+	it = iter(it)
+	while True:
+		with phase(name):
+			try:
+				item = next(it)
+			except StopIteration:
+				return
+		yield item
+
+
+def record_cache(method: str, hit: bool):
+	"""Record a cache lookup."""
+	metrics = _active
+	if metrics is not None:
+		metrics.inc(METRIC_CACHE, method=method, result="hit" if hit else "miss")
+
+
+class InstrumentedSession:
+	"""Wrap an HTTP session so that all requests are measured."""
+
+	def __init__(self, session):
+		self._session = session
+
+	def request(self, method: str, url: str, **kwargs):
+		"""Make a request, and measure it if instrumentation is active."""
+		metrics = _active
+		if metrics is None:
+			return self._session.request(method, url, **kwargs)
+
+		start = metrics.clock()
+		status = "error"
+		try:
+			response = self._session.request(method, url, **kwargs)
+			status = str(response.status_code)
+			return response
+		finally:
+			metrics.observe(METRIC_HTTP, metrics.clock() - start, method=method.upper(), endpoint=normalise_endpoint(url), status=status)
+
+	def __getattr__(self, item):
+		return getattr(self._session, item)
+
+
+class AsyncInstrumentedSession(InstrumentedSession):
+	"""Wrap an asyncio HTTP session so that all requests are measured."""
+
+	async def request(self, method: str, url: str, **kwargs):
+		"""Make a request, and measure it if instrumentation is active."""
+		metrics = _active
+		if metrics is None:
+			return await self._session.request(method, url, **kwargs)
+
+		start = metrics.clock()
+		status = "error"
+		try:
+			response = await self._session.request(method, url, **kwargs)
+			status = str(response.status_code)
+			return response
+		finally:
+			metrics.observe(METRIC_HTTP, metrics.clock() - start, method=method.upper(), endpoint=normalise_endpoint(url), status=status)
+
+
+def instrument_api(api: GrafanaApi) -> GrafanaApi:
+	"""Measure all requests made by a GrafanaApi, or an AsyncGrafanaApi. Modifies the GrafanaApi in place."""
+	client = api.client
+	if not isinstance(client.s, InstrumentedSession):
+		session_type = AsyncInstrumentedSession if inspect.iscoroutinefunction(client.s.request) else InstrumentedSession
+		client.s = session_type(client.s)
+	return api
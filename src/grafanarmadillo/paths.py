@@ -1,44 +1,81 @@
-"""Tools for manipulating path-like objects into references to Grafana objects or file-safe paths."""
+"""
+Tools for manipulating path-like objects into references to Grafana objects or file-safe paths.
+
+Encoding and decoding are memoised, since the same segments, like folder and org names, recur across many objects.
+"""
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Sequence
+from typing import List, Sequence, Union
 from urllib.parse import quote_plus, unquote_plus
 
-from grafanarmadillo.types import GrafanaPath, PathLike
+from grafanarmadillo.types import GrafanaPath, GrafanaPathKey, PathLike
+
+
+memo_size = 1 << 16
+
+
+@lru_cache(maxsize=memo_size)
+def _encode_segment(segment: str) -> str:
+	return quote_plus(segment)
+
+
+@lru_cache(maxsize=memo_size)
+def _decode_segment(segment: str) -> str:
+	return unquote_plus(segment)
+
+
+@lru_cache(maxsize=memo_size)
+def _encode_key(key: GrafanaPathKey) -> Path:
+	if key.org:
+		return PathCodec.encode([key.org, key.folder, key.name])
+	else:
+		return PathCodec.encode([key.folder, key.name])
+
+
+@lru_cache(maxsize=memo_size)
+def _parse_key(o: Union[str, Path]) -> GrafanaPathKey:
+	path = Path(o)
+	parts = path.parts[1:] if path.is_absolute() else path.parts
+	return PathCodec.parse_grafana(parts).key()
 
 
 class PathCodec:
 	"""Safely encode paths which may contain invalid characters, such as forward slashes."""
 
 	@staticmethod
-	def encode_grafana(path: GrafanaPath) -> Path:
+	def encode_grafana(path: Union[GrafanaPath, GrafanaPathKey]) -> Path:
 		"""Encode a GrafanaPath."""
-		if path.org:
-			return PathCodec.encode([path.org, path.folder, path.name])
-		else:
-			return PathCodec.encode([path.folder, path.name])
+		return _encode_key(path if isinstance(path, GrafanaPathKey) else path.key())
 
 	@staticmethod
 	def encode(segments: List[str]) -> Path:
 		"""Encode segments to a path."""
-		encoded_segments = [quote_plus(segment) for segment in segments]
+		encoded_segments = [_encode_segment(segment) for segment in segments]
 		return Path(*encoded_segments)
 
 	@staticmethod
 	def encode_segment(segment: str) -> str:
 		"""Encode a single segment."""
-		return quote_plus(segment)
+		return _encode_segment(segment)
+
+	@staticmethod
+	def key(o: PathLike) -> GrafanaPathKey:
+		"""Get a hashable key for a pathlike object. Parsing strings and paths is memoised."""
+		if isinstance(o, GrafanaPathKey):
+			return o
+		elif isinstance(o, GrafanaPath):
+			return o.key()
+		elif isinstance(o, list):
+			return PathCodec.parse_grafana(o).key()
+		else:
+			return _parse_key(o)
 
 	@staticmethod
 	def try_parse(o: PathLike) -> GrafanaPath:
 		"""Try to decode a pathlike object."""
 		if isinstance(o, GrafanaPath):
 			return o
-		elif isinstance(o, list):
-			return PathCodec.parse_grafana(o)
-		else:
-			path = Path(o)
-			parts = path.parts[1:] if path.is_absolute() else path.parts
-			return PathCodec.parse_grafana(parts)
+		return PathCodec.key(o).path()
 
 	@staticmethod
 	def parse_grafana(parts: Sequence[str]) -> GrafanaPath:
@@ -57,10 +94,10 @@ class PathCodec:
 		"""Decode a path to segments."""
 		parts = path.parts[1:] if path.is_absolute() else path.parts
 
-		decoded_segments = [unquote_plus(segment) for segment in parts]
+		decoded_segments = [_decode_segment(segment) for segment in parts]
 		return decoded_segments
 
 	@staticmethod
 	def decode_segment(segment: str) -> str:
 		"""Decode a single segment."""
-		return unquote_plus(segment)
+		return _decode_segment(segment)
@@ -0,0 +1,305 @@
+"""
+Serve import and export requests from a long-running process.
+
+Each invocation of the CLI connects to Grafana, lists folders and dashboards, and compiles its templator before doing any work.
+When a pipeline imports hundreds of templates one at a time, that setup dominates.
+A server does it once and keeps it warm between requests:
+the connection pool, the Finder's indexes of folders, dashboards and alerts, and compiled templators.
+
+Start a server with the CLI:
+	grafanarmadillo --cfg file://grafana.json serve --socket /tmp/grafanarmadillo.sock
+
+and send it requests with a Client:
+	with Client("/tmp/grafanarmadillo.sock") as client:
+		client.import_dashboard("/folder/dashboard", template, templator={"mapping": "file://mapping.json", "env_grafana": "production"})
+
+The protocol is one JSON object per line in each direction.
+A request has an `op`, which is the name of a `Worker` operation, and its arguments.
+A response has `ok`, and either the `result` or the `error`.
+If the templator of a request has the `profile` option, the response also has the `profile` of the templator for that request.
+
+The caches are not refreshed by themselves. Send `reset` if Grafana has been changed by something else.
+Requests are handled one at a time, since the caches are shared. Unix sockets are not available on Windows.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from grafana_client import GrafanaApi
+
+from grafanarmadillo.alerter import Alerter
+from grafanarmadillo.dashboarder import Dashboarder
+from grafanarmadillo.find import Finder
+from grafanarmadillo.templator import Templator, TemplatorProfile
+from grafanarmadillo.types import DashboardContent, GrafanaVersion, default_api_v
+from grafanarmadillo.util import Cache, load_data
+
+
+l = logging.getLogger(__name__)
+
+
+class ServeError(Exception):
+	"""An error returned by the server for a request."""
+
+	def __init__(self, message: str, kind: str):
+		super().__init__(f"{kind}: {message}")
+		self.message = message
+		self.kind = kind
+
+
+def templator_key(spec: Optional[dict]) -> str:
+	"""
+	Key a templator spec, so that equal specs share a compiled templator.
+
+	>>> templator_key({"env_grafana": "production", "mapping": {"production": {}}}) == templator_key({"mapping": {"production": {}}, "env_grafana": "production"})
+	True
+	"""
+	return json.dumps(spec, sort_keys=True)
+
+
+class Worker:
+	"""
+	Run import and export operations against one Grafana, keeping state warm between them.
+
+	The Finder, Dashboarder and Alerter share one cache, so that changes made by one invalidate the entries of the others.
+	Templators are compiled once per spec. A spec has the same fields as the templator options of the CLI:
+	`mapping`, `env_grafana`, `env_template` and `templator_extra_opts`.
+	`mapping` and `templator_extra_opts` may be dicts or anything `load_data` accepts.
+	With the `profile` option, the templator is measured for each request, and the rows of the profile are returned with the response.
+	"""
+
+	ops = ("ping", "reset", "export_dashboard", "import_dashboard", "export_alert", "import_alert")
+
+	def __init__(self, gfn: GrafanaApi, api_v: GrafanaVersion = default_api_v):
+		self.gfn = gfn
+		self.api_v = api_v
+		self._templators: Dict[str, Templator] = {}
+		self._lock = threading.Lock()
+		# the profile of the request being handled, if its templator is profiled
+		self._profile: Optional[TemplatorProfile] = None
+		self.reset()
+
+	def reset(self):
+		"""Forget everything cached about Grafana and all compiled templators."""
+		self.cache = Cache()
+		self.finder = Finder(self.gfn, self.api_v, cache_mode=self.cache)
+		self.alerter = Alerter(self.gfn, cache_mode=self.cache)
+		self._templators.clear()
+
+	def ping(self) -> str:
+		"""Check that the server is responding."""
+		return "pong"
+
+	def dashboarder(self, skip_unchanged: bool = False) -> Dashboarder:
+		"""Get a Dashboarder which shares the cache."""
+		return Dashboarder(self.gfn, skip_unchanged=skip_unchanged, cache_mode=self.cache)
+
+	def templator(self, spec: Optional[dict]) -> Templator:
+		"""Get the compiled templator for a spec. Without a spec, templates are passed through unchanged."""
+		if spec is None:
+			return Templator()
+
+		extra_opts = spec.get("templator_extra_opts", {})
+		if isinstance(extra_opts, str):
+			extra_opts = load_data(extra_opts)
+		# the compiled templator is shared between requests, so it is profiled for each request instead
+		profile = extra_opts.get("profile", False)
+		extra_opts = {k: v for k, v in extra_opts.items() if k != "profile"}
+
+		k = templator_key({**spec, "templator_extra_opts": extra_opts})
+		if k not in self._templators:
+			# the CLI module imports click, so only import it when a templator is needed
+			from grafanarmadillo.cmd import make_templator
+
+			mapping = spec.get("mapping")
+			self._templators[k] = make_templator(
+				self.gfn,
+				mapping if isinstance(mapping, str) else json.dumps(mapping),
+				spec.get("env_grafana"),
+				spec.get("env_template"),
+				json.dumps(extra_opts),
+			)
+
+		if not profile:
+			return self._templators[k]
+		self._profile = TemplatorProfile()
+		return self._templators[k].profiled(self._profile)
+
+	def export_dashboard(self, src: str, templator: Optional[dict] = None) -> DashboardContent:
+		"""Capture a dashboard from Grafana."""
+		dashboard_info = self.finder.get_from_path(src)
+		dashboard_content, _ = self.dashboarder().export_dashboard(dashboard_info)
+		return self.templator(templator).make_template_from_dashboard(dashboard_content)
+
+	def import_dashboard(self, dst: str, template: DashboardContent, templator: Optional[dict] = None, skip_unchanged: bool = False) -> None:
+		"""Deploy a template to Grafana."""
+		dashboard_info, folder = self.finder.create_or_get_dashboard(dst)
+		dashboard = self.templator(templator).make_dashboard_from_template(dashboard_info, template)
+		self.dashboarder(skip_unchanged).import_dashboard(dashboard, folder)
+
+	def export_alert(self, src: str, templator: Optional[dict] = None) -> DashboardContent:
+		"""Capture an alert from Grafana."""
+		alert_info = self.finder.get_alert_from_path(src)
+		alert, _ = self.alerter.export_alert(alert_info)
+		return self.templator(templator).make_template_from_dashboard(alert)
+
+	def import_alert(self, dst: str, template: DashboardContent, templator: Optional[dict] = None) -> None:
+		"""Deploy an alert from a template."""
+		alert_info, folder_info = self.finder.create_or_get_alert(dst)
+		alert = self.templator(templator).make_dashboard_from_template(alert_info, template)
+		self.alerter.import_alert(alert, folder_info)
+
+	def handle(self, request: dict) -> dict:
+		"""Run a request and wrap its result or error in a response."""
+		op = request.get("op")
+		if op not in self.ops:
+			return {"ok": False, "error": f"unknown op {op!r}", "kind": "ValueError"}
+		args = {k: v for k, v in request.items() if k != "op"}
+		try:
+			with self._lock:
+				self._profile = None
+				result = getattr(self, op)(**args)
+				profile = self._profile
+		except Exception as e:
+			l.warning(f"request failed op={op} error={e!r}")
+			return {"ok": False, "error": str(e), "kind": type(e).__name__}
+		response = {"ok": True, "result": result}
+		if profile is not None:
+			response["profile"] = profile.rows()
+		return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+	server: "Server"
+
+	def handle(self):
+		for line in self.rfile:
+			if not line.strip():
+				continue
+			try:
+				request = json.loads(line)
+			except ValueError as e:
+				response = {"ok": False, "error": str(e), "kind": type(e).__name__}
+			else:
+				response = self.server.worker.handle(request)
+			self.wfile.write(json.dumps(response).encode() + b"\n")
+			self.wfile.flush()
+
+
+def _is_listening(socket_path: Path) -> bool:
+	"""Check whether a server is accepting connections on a socket, or whether the socket was left behind."""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		try:
+			sock.connect(str(socket_path))
+		except (ConnectionRefusedError, FileNotFoundError):
+			return False
+	return True
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""
+	Serve a Worker on a Unix socket. Each connection can send many requests.
+
+	Only the user running the server can connect to the socket.
+	A socket left behind by a server which exited is replaced, but not the socket of a server which is still running.
+
+	Use it as a context manager to remove the socket afterwards:
+		with Server(socket_path, Worker(gfn)) as server:
+			server.serve_forever()
+	"""
+
+	daemon_threads = True
+
+	def __init__(self, socket_path: Union[str, Path], worker: Worker):
+		self.socket_path = Path(socket_path)
+		if self.socket_path.is_socket():
+			if _is_listening(self.socket_path):
+				raise OSError(f"a server is already listening on the socket socket_path={self.socket_path}")
+			l.info(f"remove stale socket socket_path={self.socket_path}")
+			self.socket_path.unlink()
+		super().__init__(str(self.socket_path), _Handler, bind_and_activate=False)
+		try:
+			self.server_bind()
+		except BaseException:
+			# the socket file isn't ours, so don't remove it
+			self.socket.close()
+			raise
+		try:
+			# nobody can connect until the server listens, so restrict the socket before then
+			os.chmod(self.socket_path, 0o600)
+			self.server_activate()
+		except BaseException:
+			self.server_close()
+			raise
+		self.worker = worker
+
+	def server_close(self):
+		"""Close the server and remove its socket."""
+		super().server_close()
+		if self.socket_path.is_socket():
+			self.socket_path.unlink()
+
+
+class Client:
+	"""Send requests to a Server. Keeps one connection open for all requests."""
+
+	def __init__(self, socket_path: Union[str, Path], timeout: Optional[float] = None):
+		# the profile of the templator for the last request, if it was profiled
+		self.last_profile: Optional[List[dict]] = None
+		self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self._sock.settimeout(timeout)
+		self._sock.connect(str(socket_path))
+		self._file = self._sock.makefile("rwb")
+
+	def request(self, op: str, **kwargs) -> Any:
+		"""Send a request and return its result. Raises a ServeError if it fails."""
+		self._file.write(json.dumps({"op": op, **kwargs}).encode() + b"\n")
+		self._file.flush()
+		line = self._file.readline()
+		if not line:
+			raise ConnectionError("server closed the connection")
+		response = json.loads(line)
+		if not response["ok"]:
+			raise ServeError(response["error"], response["kind"])
+		self.last_profile = response.get("profile")
+		return response.get("result")
+
+	def ping(self) -> str:
+		"""Check that the server is responding."""
+		return self.request("ping")
+
+	def reset(self):
+		"""Make the server forget everything cached."""
+		self.request("reset")
+
+	def export_dashboard(self, src: str, templator: Optional[dict] = None) -> DashboardContent:
+		"""Capture a dashboard from Grafana."""
+		return self.request("export_dashboard", src=src, templator=templator)
+
+	def import_dashboard(self, dst: str, template: DashboardContent, templator: Optional[dict] = None, skip_unchanged: bool = False):
+		"""Deploy a template to Grafana."""
+		self.request("import_dashboard", dst=dst, template=template, templator=templator, skip_unchanged=skip_unchanged)
+
+	def export_alert(self, src: str, templator: Optional[dict] = None) -> DashboardContent:
+		"""Capture an alert from Grafana."""
+		return self.request("export_alert", src=src, templator=templator)
+
+	def import_alert(self, dst: str, template: DashboardContent, templator: Optional[dict] = None):
+		"""Deploy an alert from a template."""
+		self.request("import_alert", dst=dst, template=template, templator=templator)
+
+	def close(self):
+		"""Close the connection."""
+		self._file.close()
+		self._sock.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -0,0 +1,365 @@
+"""
+A lightweight in-process stand-in for Grafana, for load testing and benchmarks.
+
+It serves the endpoints Grafanarmadillo uses:
+orgs, search, folders, dashboards and alert provisioning.
+Objects are kept in memory, and each org is selected with the `X-Grafana-Org-Id` header like in Grafana.
+
+For example:
+	state = StubGrafanaState()
+	state.seed(n_orgs=3, n_folders=10, n_dashboards=20)
+	with StubGrafana(state, faults=Faults(latency=0.02, error_rate=0.01)) as grafana:
+		BulkExporter(grafana.cfg, root, templator).run()
+		print(grafana.state.requests)
+
+It is not a complete or exact model of Grafana. Use a real Grafana to test behaviour.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+GENERAL_FOLDER = {"id": 0, "uid": "", "title": "General"}
+
+
+@dataclass
+class Faults:
+	"""
+	Faults to inject into responses.
+
+	- latency: seconds to wait before each response
+	- latency_jitter: up to this many extra seconds to wait, chosen at random
+	- error_rate: fraction of requests which fail with `error_status`
+	- error_status: the status of failed requests, like 503 or 429
+	- retry_after: seconds to send in the `Retry-After` header of failed requests
+	- routes: only inject faults on these routes, like `get_dashboard`. All routes if empty
+	- seed: seed for the random choices, for repeatable runs
+	"""
+
+	latency: float = 0.0
+	latency_jitter: float = 0.0
+	error_rate: float = 0.0
+	error_status: int = 503
+	retry_after: Optional[float] = None
+	routes: FrozenSet[str] = frozenset()
+	seed: Optional[int] = None
+	_random: random.Random = field(init=False, repr=False, compare=False)
+
+	def __post_init__(self):
+		self._random = random.Random(self.seed)
+		self._lock = threading.Lock()
+
+	def applies(self, route: str) -> bool:
+		"""Whether faults are injected on a route."""
+		return not self.routes or route in self.routes
+
+	def delay(self) -> float:
+		"""Choose how long to delay a response."""
+		with self._lock:
+			return self.latency + self.latency_jitter * self._random.random()
+
+	def fail(self) -> bool:
+		"""Choose whether to fail a request."""
+		if not self.error_rate:
+			return False
+		with self._lock:
+			return self._random.random() < self.error_rate
+
+
+class StubOrg:
+	"""The resources in an org."""
+
+	def __init__(self, org_id: int, name: str):
+		self.id = org_id
+		self.name = name
+		self.folders: Dict[str, dict] = {}
+		self.dashboards: Dict[str, dict] = {}
+		self.alerts: Dict[str, dict] = {}
+
+
+class StubGrafanaState:
+	"""Orgs, folders, dashboards and alerts in the stub, and counts of requests to each route."""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.orgs: Dict[int, StubOrg] = {}
+		self.requests: Counter = Counter()
+		self._ids = count(1)
+		self.add_org("Main Org.")
+
+	def next_id(self) -> int:
+		"""Allocate an id."""
+		return next(self._ids)
+
+	def add_org(self, name: str) -> StubOrg:
+		"""Add an org."""
+		org = StubOrg(len(self.orgs) + 1, name)
+		self.orgs[org.id] = org
+		return org
+
+	def org_by_name(self, name: str) -> StubOrg:
+		"""Get an org by name."""
+		return next(o for o in self.orgs.values() if o.name == name)
+
+	def add_folder(self, org: StubOrg, title: str, uid: Optional[str] = None) -> dict:
+		"""Add a folder to an org."""
+		i = self.next_id()
+		folder = {"id": i, "uid": uid or f"f{i}", "title": title}
+		org.folders[folder["uid"]] = folder
+		return folder
+
+	def folder_of(self, org: StubOrg, folder_uid: Optional[str]) -> dict:
+		"""Get the folder with a uid. The General folder has no uid, or "general" in some APIs."""
+		if not folder_uid or folder_uid == "general":
+			return GENERAL_FOLDER
+		return org.folders[folder_uid]
+
+	def find_dashboard(self, org: StubOrg, title: str, folder_uid: str) -> Optional[str]:
+		"""Find the uid of a dashboard by its title and folder."""
+		return next(
+			(k for k, v in org.dashboards.items() if v["dashboard"]["title"] == title and v["folderUid"] == folder_uid),
+			None,
+		)
+
+	def save_dashboard(self, org: StubOrg, dashboard: dict, folder_uid: str) -> dict:
+		"""Create or update a dashboard, matching by uid or by title within the folder."""
+		uid = dashboard.get("uid") or self.find_dashboard(org, dashboard["title"], folder_uid)
+		existing = org.dashboards.get(uid) if uid else None
+		if existing:
+			i, version = existing["dashboard"]["id"], existing["dashboard"]["version"] + 1
+		else:
+			i, version = self.next_id(), 1
+			uid = uid or f"d{i}"
+		org.dashboards[uid] = {"dashboard": {**dashboard, "id": i, "uid": uid, "version": version}, "folderUid": folder_uid}
+		return {"id": i, "uid": uid, "version": version, "status": "success", "url": f"/d/{uid}"}
+
+	def save_alert(self, org: StubOrg, alert: dict, uid: Optional[str] = None) -> dict:
+		"""Create or update an alert rule."""
+		uid = uid or alert.get("uid") or f"a{self.next_id()}"
+		existing = org.alerts.get(uid, {})
+		org.alerts[uid] = {**alert, "id": existing.get("id") or self.next_id(), "uid": uid, "orgID": org.id}
+		return org.alerts[uid]
+
+	def search_result(self, org: StubOrg, uid: str) -> dict:
+		"""Format a dashboard as a search result."""
+		stored = org.dashboards[uid]
+		folder = self.folder_of(org, stored["folderUid"])
+		result = {"id": stored["dashboard"]["id"], "uid": uid, "title": stored["dashboard"]["title"], "type": "dash-db", "url": f"/d/{uid}"}
+		if folder["uid"]:
+			result.update({"folderId": folder["id"], "folderUid": folder["uid"], "folderTitle": folder["title"]})
+		return result
+
+	def seed(self, n_orgs: int, n_folders: int, n_dashboards: int, n_alerts: int = 0, panel: Optional[dict] = None, n_panels: int = 1):
+		"""
+		Seed orgs, each with folders, each with dashboards and alerts.
+
+		The first org is the default "Main Org.", and the others are named `org1`, `org2`, ...
+		Dashboards have `n_panels` copies of `panel`, to control their size.
+		"""
+		with self.lock:
+			for o in range(n_orgs):
+				org = self.orgs[1] if o == 0 else self.add_org(f"org{o}")
+				for f in range(n_folders):
+					folder = self.add_folder(org, f"folder{f}")
+					for d in range(n_dashboards):
+						panels = [{**(panel or {"type": "timeseries"}), "id": p, "title": f"panel{p}"} for p in range(n_panels)]
+						self.save_dashboard(org, {"title": f"dashboard{d}", "panels": panels}, folder["uid"])
+					for a in range(n_alerts):
+						self.save_alert(org, {"title": f"alert{a}", "folderUID": folder["uid"], "ruleGroup": "g", "condition": "A", "data": []})
+
+
+class _Handler(BaseHTTPRequestHandler):
+	server: "StubGrafana"
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+
+	routes: List[Tuple[str, "re.Pattern[str]", str]] = [
+		("GET", re.compile(r"/api/orgs"), "list_orgs"),
+		("GET", re.compile(r"/api/org"), "get_current_org"),
+		("GET", re.compile(r"/api/search"), "search"),
+		("GET", re.compile(r"/api/folders"), "list_folders"),
+		("POST", re.compile(r"/api/folders"), "create_folder"),
+		("GET", re.compile(r"/api/folders/id/(\d+)"), "get_folder_by_id"),
+		("GET", re.compile(r"/api/folders/([^/]+)"), "get_folder"),
+		("GET", re.compile(r"/api/dashboards/uid/([^/]+)"), "get_dashboard"),
+		("POST", re.compile(r"/api/dashboards/db"), "save_dashboard"),
+		("GET", re.compile(r"/api/v1/provisioning/alert-rules"), "list_alerts"),
+		("POST", re.compile(r"/api/v1/provisioning/alert-rules"), "create_alert"),
+		("GET", re.compile(r"/api/v1/provisioning/alert-rules/([^/]+)"), "get_alert"),
+		("PUT", re.compile(r"/api/v1/provisioning/alert-rules/([^/]+)"), "update_alert"),
+	]
+
+	def log_message(self, format, *args):
+		pass
+
+	def _send(self, status: int, body, headers: Optional[Dict[str, str]] = None):
+		data = json.dumps(body).encode()
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		for k, v in (headers or {}).items():
+			self.send_header(k, v)
+		self.end_headers()
+		self.wfile.write(data)
+
+	def _route(self, method: str, path: str):
+		for route_method, pattern, name in self.routes:
+			m = pattern.fullmatch(path)
+			if route_method == method and m:
+				return name, m.groups()
+		return None, ()
+
+	def _dispatch(self, method: str):
+		url = urlsplit(self.path)
+		self.query = parse_qs(url.query)
+		length = int(self.headers.get("Content-Length") or 0)
+		self.body = json.loads(self.rfile.read(length)) if length else None
+		state, faults = self.server.state, self.server.faults
+
+		name, args = self._route(method, url.path)
+		if name is None:
+			return self._send(404, {"message": "Not found"})
+
+		with state.lock:
+			state.requests[name] += 1
+		if faults.applies(name):
+			delay = faults.delay()
+			if delay:
+				time.sleep(delay)
+			if faults.fail():
+				headers = {"Retry-After": f"{faults.retry_after:g}"} if faults.retry_after is not None else None
+				return self._send(faults.error_status, {"message": "injected fault"}, headers)
+
+		with state.lock:
+			org = state.orgs.get(int(self.headers.get("X-Grafana-Org-Id") or 1))
+			if org is None:
+				return self._send(401, {"message": "Unauthorized"})
+			try:
+				status, body = getattr(self, name)(state, org, *args)
+			except (KeyError, StopIteration):
+				status, body = 404, {"message": "Not found"}
+		self._send(status, body)
+
+	def do_GET(self):  # noqa: D102
+		self._dispatch("GET")
+
+	def do_POST(self):  # noqa: D102
+		self._dispatch("POST")
+
+	def do_PUT(self):  # noqa: D102
+		self._dispatch("PUT")
+
+	def list_orgs(self, state: StubGrafanaState, org: StubOrg):
+		return 200, [{"id": o.id, "name": o.name} for o in state.orgs.values()]
+
+	def get_current_org(self, state: StubGrafanaState, org: StubOrg):
+		return 200, {"id": org.id, "name": org.name}
+
+	def search(self, state: StubGrafanaState, org: StubOrg):
+		query = self.query.get("query", [""])[0].lower()
+		if self.query.get("type", ["dash-db"])[0] == "dash-folder":
+			results = [{**f, "type": "dash-folder"} for f in org.folders.values() if query in f["title"].lower()]
+		else:
+			folder_uids = set(self.query.get("folderUIDs", []))
+			folder_ids = {int(i) for i in self.query.get("folderIds", [])}
+			dashboard_uids = set(self.query.get("dashboardUIDs", []))
+			results = []
+			for uid, stored in org.dashboards.items():
+				folder = state.folder_of(org, stored["folderUid"])
+				if query not in stored["dashboard"]["title"].lower():
+					continue
+				if folder_uids and (folder["uid"] or "general") not in folder_uids:
+					continue
+				if folder_ids and folder["id"] not in folder_ids:
+					continue
+				if dashboard_uids and uid not in dashboard_uids:
+					continue
+				results.append(state.search_result(org, uid))
+
+		limit = int(self.query.get("limit", [1000])[0])
+		page = int(self.query.get("page", [1])[0])
+		return 200, results[(page - 1) * limit:page * limit]
+
+	def list_folders(self, state: StubGrafanaState, org: StubOrg):
+		return 200, list(org.folders.values())
+
+	def create_folder(self, state: StubGrafanaState, org: StubOrg):
+		if any(f["title"] == self.body["title"] for f in org.folders.values()):
+			return 409, {"message": "a folder with the same name already exists"}
+		return 200, state.add_folder(org, self.body["title"], self.body.get("uid"))
+
+	def get_folder_by_id(self, state: StubGrafanaState, org: StubOrg, folder_id: str):
+		if int(folder_id) == 0:
+			return 200, dict(GENERAL_FOLDER)
+		return 200, next(f for f in org.folders.values() if f["id"] == int(folder_id))
+
+	def get_folder(self, state: StubGrafanaState, org: StubOrg, uid: str):
+		return 200, org.folders[uid]
+
+	def get_dashboard(self, state: StubGrafanaState, org: StubOrg, uid: str):
+		stored = org.dashboards[uid]
+		folder = state.folder_of(org, stored["folderUid"])
+		meta = {"folderId": folder["id"], "folderUid": folder["uid"], "folderTitle": folder["title"], "url": f"/d/{uid}"}
+		return 200, {"dashboard": stored["dashboard"], "meta": meta}
+
+	def save_dashboard(self, state: StubGrafanaState, org: StubOrg):
+		folder_uid = self.body.get("folderUid") or ""
+		if not folder_uid and self.body.get("folderId"):
+			folder_uid = next(f["uid"] for f in org.folders.values() if f["id"] == self.body["folderId"])
+		dashboard = self.body["dashboard"]
+		if not self.body.get("overwrite") and not dashboard.get("uid") and state.find_dashboard(org, dashboard["title"], folder_uid):
+			return 412, {"message": "A dashboard with the same name in the folder already exists", "status": "name-exists"}
+		return 200, state.save_dashboard(org, dashboard, folder_uid)
+
+	def list_alerts(self, state: StubGrafanaState, org: StubOrg):
+		return 200, list(org.alerts.values())
+
+	def create_alert(self, state: StubGrafanaState, org: StubOrg):
+		return 201, state.save_alert(org, self.body)
+
+	def get_alert(self, state: StubGrafanaState, org: StubOrg, uid: str):
+		return 200, org.alerts[uid]
+
+	def update_alert(self, state: StubGrafanaState, org: StubOrg, uid: str):
+		org.alerts[uid]
+		return 200, state.save_alert(org, self.body, uid)
+
+
+class StubGrafana(ThreadingHTTPServer):
+	"""
+	Serve a stub Grafana on a local port, in a background thread.
+
+	Use it as a context manager, and connect with `cfg`:
+		with StubGrafana() as grafana:
+			gfn = GrafanaApi(**grafana.cfg)
+	"""
+
+	daemon_threads = True
+
+	def __init__(self, state: Optional[StubGrafanaState] = None, faults: Optional[Faults] = None, host: str = "127.0.0.1", port: int = 0):
+		super().__init__((host, port), _Handler)
+		self.state = state or StubGrafanaState()
+		self.faults = faults or Faults()
+		self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+	@property
+	def cfg(self) -> dict:
+		"""Config for connecting a GrafanaApi to this stub."""
+		host, port = self.server_address[:2]
+		return {"host": host, "port": port, "protocol": "http", "auth": ("admin", "admin")}
+
+	def __enter__(self):
+		self._thread.start()
+		return self
+
+	def __exit__(self, *args):
+		self.shutdown()
+		self.server_close()
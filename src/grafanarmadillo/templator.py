@@ -1,20 +1,30 @@
 """Make and fill templates for dashboards."""
 from __future__ import annotations
 
+import json
 import logging
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Callable, Dict, NewType, Optional
+from typing import Any, Callable, Dict, Iterable, List, NewType, Optional, Tuple
 
 from grafana_client.client import GrafanaClientError
 
 from grafanarmadillo.find import Finder
+from grafanarmadillo.instrument import instrumented
 from grafanarmadillo.paths import PathCodec
 from grafanarmadillo.types import (
 	DashboardContent,
 	DashboardPanel,
 	DashboardSearchResult,
+	GrafanaPath,
+	GrafanaPathKey,
 )
 from grafanarmadillo.util import (
+	JSONSelector,
 	map_json_strings,
 	project_dashboard_identity,
 	project_dict,
@@ -32,17 +42,58 @@ def nop(d: DashboardContent) -> DashboardContent:
 	return d
 
 
-def findreplace(context: Dict[str, str]) -> DashboardTransformer:
-	"""Make DashboardTransformer to make replacements in strings in dashboards."""
+def _mk_candidate_check(keys: Iterable[str]) -> Optional[Callable[[str], bool]]:
+	"""
+	Make a check for whether a string contains any of the keys.
 
-	def replace_strings(s: str):
+	Most strings contain none of the keys, so we can reject them in a single pass.
+	Returns None if every string is a candidate.
+	"""
+	keys = list(keys)
+	if "" in keys:
+		# the empty string is in every string
+		return None
+	if not keys:
+		return lambda s: False
+	pattern = re.compile("|".join(re.escape(k) for k in keys))
+	return lambda s: pattern.search(s) is not None
+
+
+def findreplace(context: Dict[str, str], selector: Optional[JSONSelector] = None, memo_size: Optional[int] = None) -> DashboardTransformer:
+	"""
+	Make DashboardTransformer to make replacements in strings in dashboards.
+
+	Pass a `JSONSelector` to only make replacements in some keys of the dashboard,
+	for example `JSONSelector(include=["title", "**.datasource.uid", "**.expr"])`.
+	This skips large irrelevant values, like images embedded in text panels.
+
+	Pass a `memo_size` to remember the replacements for up to that many strings.
+	This helps when the same strings, like datasource names, appear in many dashboards.
+	The memo lives as long as the transformer, and its statistics are available from `cache_info`.
+	"""
+	is_candidate = _mk_candidate_check(context.keys())
+
+	def replace_candidate(s: str) -> str:
 		out = s
 		for k, v in context.items():
 			out = out.replace(k, v)
 		return out
 
+	if memo_size:
+		replace_candidate = lru_cache(maxsize=memo_size)(replace_candidate)
+
+	def replace_strings(s: str):
+		if is_candidate is not None and not is_candidate(s):
+			return s
+		return replace_candidate(s)
+
 	def _findreplace(d: DashboardContent) -> DashboardContent:
-		return map_json_strings(replace_strings, d)
+		if selector is None:
+			return map_json_strings(replace_strings, d)
+		return selector.map_strings(replace_strings, d)
+
+	if memo_size:
+		_findreplace.cache_info = replace_candidate.cache_info
 
 	return _findreplace
 
@@ -56,9 +107,120 @@ def combine_transformers(*transformers: DashboardTransformer) -> DashboardTransf
 			out = t(out)
 		return out
 
+	_chained.transformers = transformers
 	return _chained
 
 
+def _stages(transformer: DashboardTransformer) -> List[DashboardTransformer]:
+	"""Flatten chains of transformers into their stages, without `nop`s."""
+	inner = getattr(transformer, "transformers", None)
+	if inner is None:
+		return [] if transformer is nop else [transformer]
+	return [s for t in inner for s in _stages(t)]
+
+
+def _json_size(d: Any) -> int:
+	return len(json.dumps(d, default=str))
+
+
+@dataclass
+class StageStats:
+	"""Measurements of a stage of a templator."""
+
+	calls: int = 0
+	seconds: float = 0.0
+	bytes_in: int = 0
+	bytes_out: int = 0
+
+	def add(self, other: StageStats):
+		"""Accumulate another measurement."""
+		self.calls += other.calls
+		self.seconds += other.seconds
+		self.bytes_in += other.bytes_in
+		self.bytes_out += other.bytes_out
+
+
+class TemplatorProfile:
+	"""
+	Measure each stage of templators, for each dashboard.
+
+	Use it with `Templator.profiled`, then print `format_table()` after running.
+	Stages are named by their direction, position and function, like `make_template[0] _findreplace`.
+	Measuring sizes serialises the input and output of every stage, disable `measure_bytes` if that is too slow.
+	"""
+
+	def __init__(self, measure_bytes: bool = True, clock: Callable[[], float] = time.perf_counter):
+		self.measure_bytes = measure_bytes
+		self.clock = clock
+		self.stats: Dict[Tuple[str, str], StageStats] = {}
+		self._lock = threading.Lock()
+		self._local = threading.local()
+
+	def _record(self, stage: str, measurement: StageStats):
+		k = (stage, getattr(self._local, "dashboard", ""))
+		with self._lock:
+			self.stats.setdefault(k, StageStats()).add(measurement)
+
+	def _wrap_stage(self, stage: str, transformer: DashboardTransformer) -> DashboardTransformer:
+		def _profiled_stage(d: DashboardContent) -> DashboardContent:
+			bytes_in = _json_size(d) if self.measure_bytes else 0
+			start = self.clock()
+			out = transformer(d)
+			seconds = self.clock() - start
+			bytes_out = _json_size(out) if self.measure_bytes else 0
+			self._record(stage, StageStats(1, seconds, bytes_in, bytes_out))
+			return out
+
+		return _profiled_stage
+
+	def wrap(self, direction: str, transformer: DashboardTransformer) -> DashboardTransformer:
+		"""Wrap each stage of a transformer to measure it."""
+		wrapped = [
+			self._wrap_stage(f"{direction}[{i}] {getattr(t, '__name__', type(t).__name__)}", t)
+			for i, t in enumerate(_stages(transformer))
+		]
+
+		def _profiled(d: DashboardContent) -> DashboardContent:
+			self._local.dashboard = d.get("title", "") if isinstance(d, dict) else ""
+			out = d
+			for t in wrapped:
+				out = t(out)
+			return out
+
+		return _profiled
+
+	def rows(self, by_dashboard: bool = False) -> List[dict]:
+		"""Aggregate the measurements by stage, and optionally by dashboard."""
+		aggregated: Dict[Tuple[str, ...], StageStats] = {}
+		with self._lock:
+			for (stage, dashboard), stats in self.stats.items():
+				k = (stage, dashboard) if by_dashboard else (stage,)
+				aggregated.setdefault(k, StageStats()).add(stats)
+		return [
+			{"stage": k[0], **({"dashboard": k[1]} if by_dashboard else {}), **asdict(stats)}
+			for k, stats in sorted(aggregated.items())
+		]
+
+	def format_table(self, by_dashboard: bool = False) -> str:
+		"""Format the measurements as a table, slowest stages first."""
+		rows = sorted(self.rows(by_dashboard), key=lambda r: r["seconds"], reverse=True)
+		headers = ["stage", *(["dashboard"] if by_dashboard else []), "calls", "total_ms", "mean_ms", "bytes_in", "bytes_out"]
+		table = [
+			[
+				r["stage"],
+				*([r["dashboard"]] if by_dashboard else []),
+				str(r["calls"]),
+				f"{r['seconds'] * 1000:.1f}",
+				f"{r['seconds'] * 1000 / r['calls']:.3f}",
+				str(r["bytes_in"]),
+				str(r["bytes_out"]),
+			]
+			for r in rows
+		]
+		widths = [max(len(c) for c in col) for col in zip(headers, *table)]
+		return "\n".join("  ".join(c.ljust(w) for c, w in zip(line, widths)).rstrip() for line in [headers, *table])
+
+
 def panel_transformer(f: Callable[[DashboardPanel], DashboardPanel]) -> DashboardTransformer:
 	"""
 	Make DashboardTransformer which processes all panels in a dashboard.
@@ -86,17 +248,25 @@ def remove_edit_metadata_transformer(d: DashboardContent) -> DashboardContent:
 
 
 class Templator:
-	"""Collection of methods for filling and making templates."""
+	"""
+	Collection of methods for filling and making templates.
+
+	Templators which resolve references to dashboards have `dashboard_refs`,
+	so that dashboards can be remembered as they are imported.
+	"""
 
 	def __init__(
 		self,
 		make_template: DashboardTransformer = nop,
 		fill_template: DashboardTransformer = nop,
+		dashboard_refs: Optional[DashboardRefMemo] = None,
 	) -> None:
 		super().__init__()
 		self.make_template = make_template
 		self.fill_template = fill_template
+		self.dashboard_refs = dashboard_refs
 
+	@instrumented
 	def make_template_from_dashboard(
 		self, dashboard: DashboardContent
 	) -> DashboardContent:
@@ -108,6 +278,7 @@ class Templator:
 
 		return self.make_template(DashboardContent(new))
 
+	@instrumented
 	def make_dashboard_from_template(
 		self, dashboard_info: DashboardSearchResult, template: DashboardContent
 	) -> DashboardContent:
@@ -117,11 +288,20 @@ class Templator:
 
 		return self.fill_template(DashboardContent(new))
 
+	def profiled(self, profile: TemplatorProfile) -> Templator:
+		"""Measure each stage of this templator into the profile."""
+		return Templator(
+			make_template=profile.wrap("make_template", self.make_template),
+			fill_template=profile.wrap("fill_template", self.fill_template),
+			dashboard_refs=self.dashboard_refs,
+		)
+
 	def chain(self, other) -> Templator:
 		"""Chain two templators."""
 		return Templator(
 			make_template=combine_transformers(self.make_template, other.make_template),
-			fill_template=combine_transformers(self.fill_template, other.fill_template)
+			fill_template=combine_transformers(self.fill_template, other.fill_template),
+			dashboard_refs=self.dashboard_refs or other.dashboard_refs,
 		)
 
 
@@ -129,8 +309,15 @@ EnvMapping = NewType("EnvMapping", Dict[str, Dict[str, str]])
 TOK_AUTO_MAPPING = "$auto"
 
 
-def make_mapping_templator(mapping: EnvMapping, env_grafana: str, env_template: str) -> Templator:
-	"""Assemble the templator from the environment mapping."""
+def make_mapping_templator(
+	mapping: EnvMapping, env_grafana: str, env_template: str, selector: Optional[JSONSelector] = None, memo_size: Optional[int] = None
+) -> Templator:
+	"""
+	Assemble the templator from the environment mapping.
+
+	Pass a `JSONSelector` to restrict which keys are templated.
+	Pass a `memo_size` to remember replacements for the life of the Templator, see `findreplace`.
+	"""
 	mapping_grafana = mapping[env_grafana]
 	if env_template == TOK_AUTO_MAPPING:
 		mapping_template = {k: "${%s}" % k for k in mapping_grafana.keys()}
@@ -145,7 +332,10 @@ def make_mapping_templator(mapping: EnvMapping, env_grafana: str, env_template:
 	grafana_to_template = {v: mapping_template[k] for k, v in mapping_grafana.items()}
 	template_to_grafana = {v: k for k, v in grafana_to_template.items()}
 
-	return Templator(make_template=findreplace(grafana_to_template), fill_template=findreplace(template_to_grafana))
+	return Templator(
+		make_template=findreplace(grafana_to_template, selector, memo_size),
+		fill_template=findreplace(template_to_grafana, selector, memo_size),
+	)
 
 
 def fill_grafana_templating_options(options: dict[str, Any]) -> DashboardTransformer:
@@ -160,8 +350,98 @@ def fill_grafana_templating_options(options: dict[str, Any]) -> DashboardTransfo
 	return _fill_remote_options
 
 
-def alert_dashboarduid_templator(finder: Finder) -> Templator:
-	"""Resolve the dashboard uid associated with an alert."""
+class DashboardRefMemo:
+	"""
+	Remember the uid and path of dashboards, both ways.
+
+	With `warm`, the memo is filled from a single listing of all dashboards the first time it is used,
+	so resolving references for many alerts doesn't need requests for each.
+	That only pays off for bulk operations, since it lists every dashboard.
+	Dashboards which are not remembered, like those created since, are looked up and remembered.
+	Importers should `remember` the dashboards they import, since the listing may be older than them.
+
+	References are resolved in the org of the Finder, which is called `org`.
+	Paths are remembered with their org, so that an importer into many orgs can share the memo.
+	Paths without an org are in the org of the Finder. If `org` is not given, it is looked up the first time a path with an org is remembered.
+	The memo can be shared between threads; the Finder is only used by one at a time.
+	"""
+
+	def __init__(self, finder: Finder, warm: bool = False, org: Optional[str] = None):
+		self.finder = finder
+		self.warm_on_use = warm
+		self.org = org
+		self._path_by_uid: Dict[Tuple[Optional[str], str], GrafanaPath] = {}
+		self._uid_by_path: Dict[GrafanaPathKey, str] = {}
+		self._warm = False
+		self._lock = threading.Lock()
+		self._finder_lock = threading.Lock()
+		self._org_lock = threading.Lock()
+
+	def _other_org(self, path: GrafanaPath) -> Optional[str]:
+		"""Get the org of a path if it is not the org of the Finder, or None if it is."""
+		if path.org is None:
+			return None
+		if self.org is None:
+			with self._org_lock:
+				if self.org is None:
+					self.org = self.finder.api.organization.get_current_organization()["name"]
+		return None if path.org == self.org else path.org
+
+	def remember(self, uid: str, path: GrafanaPath):
+		"""Remember the uid and path of a dashboard."""
+		org = self._other_org(path)
+		with self._lock:
+			self._path_by_uid[(org, uid)] = GrafanaPath(path.name, path.folder, org)
+			self._uid_by_path[GrafanaPathKey(path.name, path.folder, org)] = uid
+
+	def warm(self):
+		"""
+		Fill the memo from a listing of all dashboards, if it hasn't been already.
+
+		Other threads wait for the listing to finish. If it fails, the next call lists the dashboards again.
+		"""
+		if self._warm:
+			return
+		with self._finder_lock:
+			if self._warm:
+				return
+			for result in self.finder.list_dashboards():
+				self.remember(result["uid"], Finder.search_result_path(result))
+			self._warm = True
+
+	def path_of(self, uid: str) -> GrafanaPath:
+		"""Get the path of a dashboard in the org of the Finder by its uid."""
+		if self.warm_on_use:
+			self.warm()
+		k = (None, uid)
+		if k not in self._path_by_uid:
+			with self._finder_lock:
+				if k not in self._path_by_uid:
+					path = self.finder.get_dashboard_by_uid(uid)
+					self.remember(uid, GrafanaPath(path.name, path.folder))
+		return self._path_by_uid[k]
+
+	def uid_of(self, path: GrafanaPath) -> str:
+		"""Get the uid of a dashboard in the org of the Finder by its path, creating the dashboard if it does not exist."""
+		if self.warm_on_use:
+			self.warm()
+		key = GrafanaPathKey(path.name, path.folder)
+		if key not in self._uid_by_path:
+			with self._finder_lock:
+				if key not in self._uid_by_path:
+					dashboard, _ = self.finder.create_or_get_dashboard(path)
+					self.remember(dashboard["uid"], key.path())
+		return self._uid_by_path[key]
+
+
+def alert_dashboarduid_templator(finder: Finder, memo: Optional[DashboardRefMemo] = None, warm: bool = False) -> Templator:
+	"""
+	Resolve the dashboard uid associated with an alert.
+
+	Dashboards are resolved through a `DashboardRefMemo`, which can be shared between templators.
+	Set `warm` to list all dashboards into the memo when it is first used, which helps when templating many alerts.
+	"""
+	memo = memo or DashboardRefMemo(finder, warm=warm)
 
 	def uid2ref(d: DashboardContent) -> DashboardContent:
 		dashboard_uid = d.get("annotations", {}).get("__dashboardUid__", None)
@@ -169,7 +449,7 @@ def alert_dashboarduid_templator(finder: Finder) -> Templator:
 			return d
 
 		try:
-			address = finder.get_dashboard_by_uid(dashboard_uid)
+			address = memo.path_of(dashboard_uid)
 		except GrafanaClientError as e:
 			if e.status_code == 404:
 				l.error(f"Could not find dashboard with uid uid={dashboard_uid}")
@@ -187,11 +467,11 @@ def alert_dashboarduid_templator(finder: Finder) -> Templator:
 
 		dashboard_ref = PathCodec.try_parse(PathCodec.decode(Path(dashboard_ref_raw[2:])))
 
-		dashboard, folder = finder.create_or_get_dashboard(dashboard_ref)
-		d["annotations"]["__dashboardUid__"] = dashboard["uid"]
+		d["annotations"]["__dashboardUid__"] = memo.uid_of(dashboard_ref)
 		return d
 
 	return Templator(
 		make_template=uid2ref,
 		fill_template=ref2uid,
+		dashboard_refs=memo,
 	)
@@ -0,0 +1,311 @@
+"""
+Limit the rate of requests to Grafana, and retry requests which fail transiently.
+
+A Throttle is shared between all the GrafanaApi clients it wraps.
+Each Grafana host gets its own token bucket, so the limit applies per host across all orgs and components.
+The rate adapts: it is cut when Grafana responds with 429 or 503, or when latency rises above a target,
+and recovers gradually as requests succeed.
+
+For example:
+	throttle = Throttle(rate=20, max_retries=5)
+	gfn = throttle.wrap(GrafanaApi(**cfg))
+	Finder(gfn).list_dashboards()
+	print(throttle.metrics.as_dict())
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from itertools import count
+from typing import Awaitable, Callable, Dict, Optional
+
+import niquests
+from grafana_client import GrafanaApi
+
+
+l = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {"get", "head", "options", "put", "delete"}
+RETRY_ALWAYS_STATUSES = {429, 503}
+RETRY_IDEMPOTENT_STATUSES = {500, 502, 504}
+CONNECTION_ERRORS = (niquests.exceptions.ConnectionError, niquests.exceptions.Timeout)
+
+
+class TokenBucket:
+	"""
+	Allow requests at a rate, with bursts.
+
+	The rate can be adjusted between `min_rate` and the configured `max_rate`.
+	"""
+
+	def __init__(
+		self,
+		rate: float,
+		burst: Optional[float] = None,
+		min_rate: Optional[float] = None,
+		clock: Callable[[], float] = time.monotonic,
+		sleep: Callable[[float], None] = time.sleep,
+	):
+		self.max_rate = rate
+		self.rate = rate
+		self.min_rate = min_rate if min_rate is not None else rate / 16
+		self.burst = burst if burst is not None else max(rate, 1)
+		self.clock = clock
+		self.sleep = sleep
+		self._tokens = self.burst
+		self._last = clock()
+		self._lock = threading.Lock()
+
+	def _refill(self):
+		now = self.clock()
+		self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+		self._last = now
+
+	def reserve(self) -> float:
+		"""Take a token. Returns the time to wait before using it."""
+		with self._lock:
+			self._refill()
+			self._tokens -= 1
+			return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+	def acquire(self) -> float:
+		"""Wait for a token. Returns the time waited."""
+		wait = self.reserve()
+		if wait > 0:
+			self.sleep(wait)
+		return wait
+
+	def slow_down(self):
+		"""Halve the rate."""
+		with self._lock:
+			self._refill()
+			self.rate = max(self.min_rate, self.rate / 2)
+
+	def speed_up(self):
+		"""Increase the rate a little, up to the configured rate."""
+		with self._lock:
+			self._refill()
+			self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+@dataclass
+class ThrottleMetrics:
+	"""Counters for requests made through a Throttle."""
+
+	requests: int = 0
+	retries: int = 0
+	throttled: int = 0
+	server_errors: int = 0
+	connection_errors: int = 0
+	slowdowns: int = 0
+	waited_seconds: float = 0.0
+
+	def as_dict(self) -> Dict:
+		"""Get the metrics as a dict."""
+		return asdict(self)
+
+
+class Throttle:
+	"""
+	Rate limits and retries for requests to Grafana.
+
+	- rate: requests per second to each host. `None` does not limit the rate
+	- burst: requests which can be made at once before the rate applies
+	- max_retries: how many times to retry a request which failed transiently
+	- backoff_base, backoff_cap: retries wait a random time up to `backoff_base * 2**attempt`, capped at `backoff_cap` seconds
+	- max_backoff: the longest `Retry-After` to obey, in seconds. Longer ones are ignored in favour of the random backoff
+	- latency_target: slow down if requests take longer than this many seconds
+
+	Requests are retried if Grafana responds with 429 or 503, which means the request was not processed.
+	Idempotent requests, like GET and PUT, are also retried on other server errors and connection errors.
+	"""
+
+	def __init__(
+		self,
+		rate: Optional[float] = None,
+		burst: Optional[float] = None,
+		max_retries: int = 3,
+		backoff_base: float = 0.5,
+		backoff_cap: float = 30.0,
+		max_backoff: float = 60.0,
+		latency_target: Optional[float] = None,
+		clock: Callable[[], float] = time.monotonic,
+		sleep: Callable[[float], None] = time.sleep,
+		jitter: Callable[[], float] = random.random,
+		asleep: Callable[[float], Awaitable] = asyncio.sleep,
+	):
+		self.rate = rate
+		self.burst = burst
+		self.max_retries = max_retries
+		self.backoff_base = backoff_base
+		self.backoff_cap = backoff_cap
+		self.max_backoff = max_backoff
+		self.latency_target = latency_target
+		self.clock = clock
+		self.sleep = sleep
+		self.jitter = jitter
+		self.asleep = asleep
+		self.metrics = ThrottleMetrics()
+		self._buckets: Dict[str, TokenBucket] = {}
+		self._lock = threading.Lock()
+
+	def bucket(self, host: str) -> Optional[TokenBucket]:
+		"""Get the token bucket for a host."""
+		if self.rate is None:
+			return None
+		with self._lock:
+			if host not in self._buckets:
+				self._buckets[host] = TokenBucket(self.rate, self.burst, clock=self.clock, sleep=self.sleep)
+			return self._buckets[host]
+
+	def wrap(self, api: GrafanaApi) -> GrafanaApi:
+		"""
+		Send all requests from a GrafanaApi through this Throttle. Modifies the GrafanaApi in place.
+
+		An AsyncGrafanaApi can be wrapped too, and waits with asyncio.
+		"""
+		client = api.client
+		if not isinstance(client.s, ThrottledSession):
+			host = f"{client.url_host}:{client.url_port}" if client.url_port else client.url_host
+			session_type = AsyncThrottledSession if inspect.iscoroutinefunction(client.s.request) else ThrottledSession
+			client.s = session_type(client.s, self, host)
+		return api
+
+	def _count(self, **increments):
+		with self._lock:
+			for k, v in increments.items():
+				setattr(self.metrics, k, getattr(self.metrics, k) + v)
+
+	def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+		"""Compute how long to wait before a retry, with full jitter."""
+		delay = self.jitter() * min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+		if retry_after is not None:
+			if 0 <= retry_after <= self.max_backoff:
+				delay = max(delay, retry_after)
+			else:
+				l.warning(f"ignoring Retry-After longer than max_backoff {retry_after=} max_backoff={self.max_backoff}")
+		return min(delay, self.max_backoff)
+
+	@staticmethod
+	def _retry_after(response) -> Optional[float]:
+		try:
+			return float(response.headers.get("Retry-After"))
+		except (TypeError, ValueError):
+			return None
+
+	def _reserve(self, bucket: Optional[TokenBucket]) -> float:
+		"""Count a request, and take a token for it. Returns the time to wait before making it."""
+		self._count(requests=1)
+		if not bucket:
+			return 0.0
+		wait = bucket.reserve()
+		if wait:
+			self._count(waited_seconds=wait)
+		return wait
+
+	def _after_error(self, e: Exception, method: str, url: str, idempotent: bool, attempt: int) -> Optional[float]:
+		"""Handle a connection error. Returns the time to wait before retrying, or None if the error should be raised."""
+		self._count(connection_errors=1)
+		if not idempotent or attempt >= self.max_retries:
+			return None
+		l.warning(f"retrying request after error {method=} {url=} {attempt=} error={e}")
+		return self._retry(attempt)
+
+	def _after_response(self, bucket: Optional[TokenBucket], response, latency: float, method: str, url: str, idempotent: bool, attempt: int) -> Optional[float]:
+		"""Handle a response. Returns the time to wait before retrying, or None if the response should be returned."""
+		status = response.status_code
+		retryable = status in RETRY_ALWAYS_STATUSES or (idempotent and status in RETRY_IDEMPOTENT_STATUSES)
+		if status == 429:
+			self._count(throttled=1)
+		elif status >= 500:
+			self._count(server_errors=1)
+
+		if bucket:
+			if status in RETRY_ALWAYS_STATUSES or (self.latency_target is not None and latency > self.latency_target):
+				bucket.slow_down()
+				self._count(slowdowns=1)
+			elif status < 400:
+				bucket.speed_up()
+
+		if not retryable or attempt >= self.max_retries:
+			return None
+
+		l.warning(f"retrying request after response {method=} {url=} {attempt=} {status=}")
+		return self._retry(attempt, self._retry_after(response))
+
+	def _retry(self, attempt: int, retry_after: Optional[float] = None) -> float:
+		self._count(retries=1)
+		return self._backoff(attempt, retry_after)
+
+	def request(self, session, host: str, method: str, url: str, **kwargs):
+		"""Make a request with the session, respecting rate limits and retrying transient failures."""
+		idempotent = method.lower() in IDEMPOTENT_METHODS
+		bucket = self.bucket(host)
+		for attempt in count():
+			wait = self._reserve(bucket)
+			if wait:
+				self.sleep(wait)
+
+			start = self.clock()
+			try:
+				response = session.request(method, url, **kwargs)
+			except CONNECTION_ERRORS as e:
+				delay = self._after_error(e, method, url, idempotent, attempt)
+				if delay is None:
+					raise
+			else:
+				delay = self._after_response(bucket, response, self.clock() - start, method, url, idempotent, attempt)
+				if delay is None:
+					return response
+			self.sleep(delay)
+
+	async def arequest(self, session, host: str, method: str, url: str, **kwargs):
+		"""Make a request with an asyncio session, respecting rate limits and retrying transient failures. See `request`."""
+		idempotent = method.lower() in IDEMPOTENT_METHODS
+		bucket = self.bucket(host)
+		for attempt in count():
+			wait = self._reserve(bucket)
+			if wait:
+				await self.asleep(wait)
+
+			start = self.clock()
+			try:
+				response = await session.request(method, url, **kwargs)
+			except CONNECTION_ERRORS as e:
+				delay = self._after_error(e, method, url, idempotent, attempt)
+				if delay is None:
+					raise
+			else:
+				delay = self._after_response(bucket, response, self.clock() - start, method, url, idempotent, attempt)
+				if delay is None:
+					return response
+			await self.asleep(delay)
+
+
+class ThrottledSession:
+	"""Wrap an HTTP session so that all requests go through a Throttle."""
+
+	def __init__(self, session, throttle: Throttle, host: str):
+		self._session = session
+		self._throttle = throttle
+		self._host = host
+
+	def request(self, method: str, url: str, **kwargs):
+		"""Make a request through the Throttle."""
+		return self._throttle.request(self._session, self._host, method, url, **kwargs)
+
+	def __getattr__(self, item):
+		return getattr(self._session, item)
+
+
+class AsyncThrottledSession(ThrottledSession):
+	"""Wrap an asyncio HTTP session so that all requests go through a Throttle."""
+
+	async def request(self, method: str, url: str, **kwargs):
+		"""Make a request through the Throttle."""
+		return await self._throttle.arequest(self._session, self._host, method, url, **kwargs)
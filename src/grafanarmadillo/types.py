@@ -7,6 +7,8 @@ from typing import List, NewType, Optional, TypedDict, Union
 GrafanaVersion = NewType("UID", int)
 UID = NewType("UID", str)
 
+default_api_v = GrafanaVersion(11)
+
 
 class AnySearchResult(TypedDict):
 	"""Metadata for both Grafana dashboards and alerts."""
@@ -66,5 +68,26 @@ class GrafanaPath:
 	folder: str
 	org: Optional[str] = None
 
+	def key(self) -> "GrafanaPathKey":
+		"""Get an immutable and hashable key for this path."""
+		return GrafanaPathKey(self.name, self.folder, self.org)
+
+
+@dataclass(frozen=True, slots=True)
+class GrafanaPathKey:
+	"""
+	Path of an object in Grafana, which is immutable and hashable.
+
+	Use it as a key of dicts and caches.
+	"""
+
+	name: str
+	folder: str
+	org: Optional[str] = None
+
+	def path(self) -> GrafanaPath:
+		"""Get a GrafanaPath for this key."""
+		return GrafanaPath(self.name, self.folder, self.org)
+
 
-PathLike = Union[GrafanaPath, str, Path, List[str]]
+PathLike = Union[GrafanaPath, GrafanaPathKey, str, Path, List[str]]
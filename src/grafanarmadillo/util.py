@@ -1,12 +1,33 @@
 """Helpers and generic functions."""
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
+import math
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from fnmatch import fnmatchcase
 from pathlib import Path
-from typing import Callable, Dict, List, TypeVar, Union
+from typing import (
+	Any,
+	Awaitable,
+	Callable,
+	Dict,
+	FrozenSet,
+	Generator,
+	Iterable,
+	List,
+	Optional,
+	Tuple,
+	Type,
+	TypeVar,
+	Union,
+)
 
+from grafanarmadillo.instrument import record_cache
 from grafanarmadillo.paths import PathCodec
 from grafanarmadillo.types import (
 	DashboardContent,
@@ -16,6 +37,13 @@ from grafanarmadillo.types import (
 )
 
 
+# orjson is the optional `fast` extra
+try:
+	import orjson
+except ImportError:  # pragma: no cover
+	orjson = None
+
+
 T = TypeVar("T")
 A = TypeVar("A")
 JSON = TypeVar("JSON", bound=Union[dict, list, str, int, float, bool, None])
@@ -65,6 +93,38 @@ def exactly_one(items: List[A], message: str = None) -> A:
 		raise ValueError(f"expected exactly 1 item, found={len(items)} {message=}")
 
 
+def prefetch_map(f: Callable[[A], T], xs: Iterable[A], workers: int, lookahead: Optional[int] = None) -> Generator[T, None, None]:
+	"""
+	Map a function over items in a pool of threads, yielding results in order.
+
+	At most `lookahead` items are in flight ahead of the consumer (defaults to 4 per worker),
+	so memory stays bounded even for many items.
+
+	>>> list(prefetch_map(lambda x: x * 2, range(5), workers=2, lookahead=2))
+	[0, 2, 4, 6, 8]
+
+	>>> list(prefetch_map(lambda x: x * 2, range(5), workers=1))
+	[0, 2, 4, 6, 8]
+	"""
+	if workers <= 1:
+		yield from map(f, xs)
+		return
+
+	lookahead = max(lookahead or workers * 4, 1)
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		pending = deque()
+		try:
+			for x in xs:
+				pending.append(pool.submit(f, x))
+				if len(pending) >= lookahead:
+					yield pending.popleft().result()
+			while pending:
+				yield pending.popleft().result()
+		finally:
+			for future in pending:
+				future.cancel()
+
+
 def project_dict(d: Dict, keys: set, inverse: bool = False) -> Dict:
 	"""
 	Select the given fields from a dictionary.
@@ -103,6 +163,29 @@ def erase_alert_rule_identity(
 	return project_dict(alertlike, alert_rule_meta_fields, inverse=True)
 
 
+dashboard_volatile_fields = {"id", "uid", "version", "iteration"}
+alert_rule_volatile_fields = {"id", "uid", "orgID", "folderUID", "updated", "provenance"}
+
+
+def content_hash(content: Dict, ignore: Iterable[str] = frozenset()) -> str:
+	"""
+	Hash the content of an object, ignoring some top-level fields.
+
+	The hash is stable across key order, so it can be used to detect changes.
+
+	>>> content_hash({'a': 1, 'b': [1, 2]}) == content_hash({'b': [1, 2], 'a': 1})
+	True
+	>>> content_hash({'a': 1, 'version': 2}, ignore={'version'}) == content_hash({'a': 1, 'version': 3}, ignore={'version'})
+	True
+	>>> content_hash({'a': 1}) == content_hash({'a': 2})
+	False
+	"""
+	canonical = json.dumps(
+		project_dict(content, set(ignore), inverse=True), sort_keys=True, separators=(",", ":"), ensure_ascii=False
+	)
+	return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 def map_json_strings(f: Callable[[str], str], obj: JSON) -> JSON:
 	"""
 	Transform all strings in an object made of JSON primitives.
@@ -131,9 +214,126 @@ def map_json_strings(f: Callable[[str], str], obj: JSON) -> JSON:
 		return obj
 
 
+_SelectorState = FrozenSet[Tuple[int, int]]
+
+
+class JSONSelector:
+	"""
+	Select parts of a JSON document by the keys leading to them.
+
+	Selectors are dotted paths of keys. List items are addressed by their index.
+	Each segment may be a glob (`*`, `?`), and the segment `**` matches any number of keys.
+	Selecting a key selects everything beneath it.
+
+	- include: only strings under these paths are visited. `None` visits everything
+	- exclude: strings under these paths are never visited, even if they are included
+
+	Subtrees which are not visited are passed through as-is rather than copied.
+
+	>>> f = lambda s: s.upper()
+	>>> d = {'title': 't', 'panels': [{'title': 'p', 'gridPos': {'x': 'x'}}]}
+	>>> JSONSelector(include=['title']).map_strings(f, d)
+	{'title': 'T', 'panels': [{'title': 'p', 'gridPos': {'x': 'x'}}]}
+	>>> JSONSelector(include=['**.title']).map_strings(f, d)
+	{'title': 'T', 'panels': [{'title': 'P', 'gridPos': {'x': 'x'}}]}
+	>>> JSONSelector(exclude=['panels.*.gridPos']).map_strings(f, d)
+	{'title': 'T', 'panels': [{'title': 'P', 'gridPos': {'x': 'x'}}]}
+	>>> JSONSelector(include=['panels.0'], exclude=['**.gridPos']).map_strings(f, d)
+	{'title': 't', 'panels': [{'title': 'P', 'gridPos': {'x': 'x'}}]}
+	"""
+
+	def __init__(self, include: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()):
+		self.include = None if include is None else [self._compile(s) for s in include]
+		self.exclude = [self._compile(s) for s in exclude]
+
+	@staticmethod
+	def _compile(selector: Union[str, Iterable[str]]) -> Tuple[str, ...]:
+		if isinstance(selector, str):
+			return tuple(selector.split("."))
+		return tuple(selector)
+
+	@staticmethod
+	def _closure(patterns: List[Tuple[str, ...]], states: Iterable[Tuple[int, int]]) -> _SelectorState:
+		"""Expand states past `**`, which may match zero keys."""
+		out = set()
+		for i, pos in states:
+			out.add((i, pos))
+			while pos < len(patterns[i]) and patterns[i][pos] == "**":
+				pos += 1
+				out.add((i, pos))
+		return frozenset(out)
+
+	def _start(self, patterns: List[Tuple[str, ...]]) -> _SelectorState:
+		return self._closure(patterns, ((i, 0) for i in range(len(patterns))))
+
+	def _advance(self, patterns: List[Tuple[str, ...]], states: _SelectorState, key: str) -> _SelectorState:
+		if not states:
+			return states
+		advanced = []
+		for i, pos in states:
+			if pos == len(patterns[i]):
+				continue
+			segment = patterns[i][pos]
+			if segment == "**":
+				advanced.append((i, pos))
+			elif segment == "*" or segment == key or fnmatchcase(key, segment):
+				advanced.append((i, pos + 1))
+		return self._closure(patterns, advanced)
+
+	@staticmethod
+	def _matched(patterns: List[Tuple[str, ...]], states: _SelectorState) -> bool:
+		return any(pos == len(patterns[i]) for i, pos in states)
+
+	def map_strings(self, f: Callable[[str], str], obj: JSON) -> JSON:
+		"""Transform the selected strings in an object made of JSON primitives."""
+		if self.include is None and not self.exclude:
+			return map_json_strings(f, obj)
+		include_states = None if self.include is None else self._start(self.include)
+		if include_states is not None and self._matched(self.include, include_states):
+			include_states = None
+		return self._map(f, obj, include_states, self._start(self.exclude))
+
+	def _map(self, f: Callable[[str], str], obj: JSON, include_states: Optional[_SelectorState], exclude_states: _SelectorState) -> JSON:
+		"""
+		Recursively transform strings.
+
+		`include_states` is None once an include selector has matched, which selects the whole subtree.
+		"""
+		if isinstance(obj, str):
+			return f(obj) if include_states is None else obj
+		elif isinstance(obj, dict):
+			items = obj.items()
+		elif isinstance(obj, list):
+			items = enumerate(obj)
+		else:
+			return obj
+
+		out = {}
+		for k, v in items:
+			key = str(k)
+			child_exclude = self._advance(self.exclude, exclude_states, key)
+			if self._matched(self.exclude, child_exclude):
+				out[k] = v
+				continue
+
+			if include_states is None:
+				child_include = None
+			else:
+				child_include = self._advance(self.include, include_states, key)
+				if not child_include:
+					out[k] = v
+					continue
+				if self._matched(self.include, child_include):
+					child_include = None
+
+			out[k] = self._map(f, v, child_include, child_exclude)
+
+		return list(out.values()) if isinstance(obj, list) else out
+
+
 def resolve_object_to_filepath(base_path: Path, name: PathLike):
 	"""Transform the "/folder/object" format to the path on disk that contains the template."""
-	path = PathCodec.encode_grafana(PathCodec.try_parse(name))
+	path = PathCodec.encode_grafana(PathCodec.key(name))
 	template_path = (base_path / path).with_suffix(".json")
 	return template_path
 
@@ -163,10 +363,129 @@ def write_to_file(out_path: Path, obj: dict):
 		json.dump(obj, f, ensure_ascii=False, indent="\t")
 
 
-def read_from_file(file_path: Path) -> dict:
-	"""Read JSON from a file."""
+def read_from_file(file_path: Path, decoder: Type[json.JSONDecoder] = json.JSONDecoder) -> dict:
+	"""
+	Read JSON from a file.
+
+	A `FastJSONDecoder` reads the file from a memory-mapped buffer.
+	"""
+	if issubclass(decoder, FastJSONDecoder):
+		return decoder().decode_file(file_path)
 	with file_path.open(mode="r", encoding="utf-8") as f:
-		return json.load(f)
+		return json.load(f, cls=decoder)
+
+
+def _all_floats_finite(o) -> bool:
+	"""Check that there are no NaN or infinite floats in a JSON-like object, which orjson would write as null."""
+	if type(o) is dict:
+		o = o.values()
+	for v in o:
+		t = type(v)
+		if t is dict or t is list or t is tuple:
+			if not _all_floats_finite(v):
+				return False
+		elif t is float and not math.isfinite(v):
+			return False
+	return True
+
+
+class FastJSONEncoder(json.JSONEncoder):
+	"""
+	JSONEncoder which uses `orjson` if it is installed.
+
+	All the options of `json.JSONEncoder` are honoured: `orjson` is only used when it can honour them.
+	The output decodes to the same data, although numbers like `1e-07` may be written differently.
+	Unlike `json.JSONEncoder`, the separators default to the compact ones which `orjson` writes: `(",", ":")`, or `(",", ": ")` with an indent.
+	Falls back to the standard library for:
+	- indents other than 2, `skipkeys`, and other separators, which `orjson` does not support
+	- output with non-ASCII characters when `ensure_ascii` is set, since `orjson` never escapes them
+	- NaN and infinite floats, which `orjson` writes as null instead of following `allow_nan`
+	- objects which `orjson` can't encode, like integers larger than 64 bits
+	"""
+
+	item_separator = ","
+	key_separator = ":"
+
+	def __init__(self, *, indent=None, separators=None, **kwargs):
+		if separators is None and indent is not None:
+			separators = (",", ": ")
+		super().__init__(indent=indent, separators=separators, **kwargs)
+
+	@property
+	def _fast(self) -> bool:
+		return (
+			orjson is not None
+			and self.indent in (None, 2)
+			and not self.skipkeys
+			and (self.item_separator, self.key_separator) == ((",", ":") if self.indent is None else (",", ": "))
+		)
+
+	def _encode_fast(self, o) -> Optional[str]:
+		"""Encode with `orjson`, or return None if the output would differ from the standard library's."""
+		if not (self._fast and _all_floats_finite((o,))):
+			return None
+
+		option = orjson.OPT_NON_STR_KEYS
+		if self.indent:
+			option |= orjson.OPT_INDENT_2
+		if self.sort_keys:
+			option |= orjson.OPT_SORT_KEYS
+		try:
+			encoded = orjson.dumps(o, default=self.default, option=option).decode("utf-8")
+		except orjson.JSONEncodeError:
+			return None
+		if self.ensure_ascii and not encoded.isascii():
+			return None
+		return encoded
+
+	def encode(self, o) -> str:
+		"""Encode an object to a JSON string."""
+		encoded = self._encode_fast(o)
+		if encoded is None:
+			return super().encode(o)
+		return encoded
+
+	def iterencode(self, o, _one_shot=False):
+		"""Encode an object to JSON in chunks. `orjson` produces only 1 chunk."""
+		encoded = self._encode_fast(o)
+		if encoded is None:
+			return super().iterencode(o, _one_shot)
+		return iter((encoded,))
+
+
+class FastJSONDecoder(json.JSONDecoder):
+	"""
+	JSONDecoder which uses `orjson` if it is installed.
+
+	Falls back to the standard library if hooks like `object_hook` are set, since `orjson` does not support them.
+	"""
+
+	@property
+	def _fast(self) -> bool:
+		return orjson is not None and self.object_hook is None and self.object_pairs_hook is None
+
+	def decode(self, s, *args, **kwargs):
+		"""Decode a JSON string."""
+		if not self._fast:
+			return super().decode(s, *args, **kwargs)
+		return orjson.loads(s)
+
+	def decode_buffer(self, buf) -> Any:
+		"""Decode UTF-8 encoded JSON from a bytes-like object."""
+		if not self._fast:
+			return super().decode(bytes(buf).decode("utf-8"))
+		return orjson.loads(buf)
+
+	def decode_file(self, file_path: Path) -> Any:
+		"""Decode a file, reading it from a memory-mapped buffer to avoid copying it."""
+		with file_path.open(mode="rb") as f:
+			try:
+				buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				# empty files cannot be mapped
+				return self.decode_buffer(f.read())
+			with buf, memoryview(buf) as view:
+				return self.decode_buffer(view)
 
 
 class CacheMode(Enum):
@@ -200,6 +519,9 @@ class CacheMode(Enum):
 
 l_c = logging.getLogger(f"{__name__}.cache")
 
+# distinguishes a cached falsy value from a missing one
+_missing = object()
+
 
 class Cache:
 	"""Cache values."""
@@ -223,20 +545,44 @@ class Cache:
 		"""Unset all keys whose first subkey (the method name) matches."""
 		cull = set()
 
-		for k in self.cache.keys():
+		# copy the keys, since other threads may be changing the cache
+		for k in list(self.cache):
 			if k[0] == k_start:
 				cull.add(k)
 		for k in cull:
 			self.unset(k)
 
-	def getor(self, k, f: Callable[[], T]) -> T:
-		"""Get a cached item or generate it."""
-		if v := self.get(k):
+	def getor(self, k, f: Callable[[], T], cache_falsy: bool = False) -> T:
+		"""
+		Get a cached item or generate it.
+
+		Falsy values like `None` and `[]` are only cached with `cache_falsy`,
+		so that an empty result, which is likely to be filled in, is fetched again.
+		"""
+		method = k[0] if isinstance(k, tuple) else k
+		if (v := self.cache.get(k, _missing)) is not _missing:
 			l_c.debug(f"cache hit {k}")
+			record_cache(method, True)
 			return v
 		l_c.debug(f"cache miss {k}")
+		record_cache(method, False)
 		v = f()
-		self.set(k, v)
+		if v or cache_falsy:
+			self.set(k, v)
+		return v
+
+	async def agetor(self, k, f: Callable[[], Awaitable[T]], cache_falsy: bool = False) -> T:
+		"""Get a cached item or generate it with a coroutine. See `getor`."""
+		method = k[0] if isinstance(k, tuple) else k
+		if (v := self.cache.get(k, _missing)) is not _missing:
+			l_c.debug(f"cache hit {k}")
+			record_cache(method, True)
+			return v
+		l_c.debug(f"cache miss {k}")
+		record_cache(method, False)
+		v = await f()
+		if v or cache_falsy:
+			self.set(k, v)
 		return v
 
 
@@ -258,6 +604,10 @@ class NoneCache(Cache):
 		"""No keys are ever set."""
 		return
 
-	def getor(self, k, f: Callable[[], T]) -> T:
+	def getor(self, k, f: Callable[[], T], cache_falsy: bool = False) -> T:
 		"""Always generate the cached item."""
 		return f()
+
+	async def agetor(self, k, f: Callable[[], Awaitable[T]], cache_falsy: bool = False) -> T:
+		"""Always generate the cached item."""
+		return await f()
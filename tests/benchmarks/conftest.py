@@ -0,0 +1,54 @@
+"""
+Record benchmark results, and compare them to a baseline.
+
+Benchmarks are deselected by default. Run them with `pytest -m benchmark tests/benchmarks`.
+
+Set `GRAFANARMADILLO_BENCH_RESULTS` to a path to save the results of a run as JSON.
+Set `GRAFANARMADILLO_BENCH_BASELINE` to the results of a previous run to compare against them.
+Benchmarks which are slower than the baseline by more than `GRAFANARMADILLO_BENCH_TOLERANCE` (default 1.5x) fail.
+"""
+import os
+from pathlib import Path
+
+import pytest
+
+from tests.benchmarks.harness import BenchmarkResults
+
+
+@pytest.fixture(scope="session")
+def bench_results():
+	results_path = os.environ.get("GRAFANARMADILLO_BENCH_RESULTS")
+	baseline_path = os.environ.get("GRAFANARMADILLO_BENCH_BASELINE")
+	tolerance = float(os.environ.get("GRAFANARMADILLO_BENCH_TOLERANCE", "1.5"))
+
+	results = BenchmarkResults(
+		baseline=BenchmarkResults.load(Path(baseline_path)) if baseline_path else None,
+		tolerance=tolerance,
+	)
+	yield results
+	if results_path:
+		results.save(Path(results_path))
+
+
+@pytest.fixture
+def bench(bench_results, request):
+	"""Time a function and record the result, named after the test and the passed labels."""
+
+	def _bench(label: str, f, repeat: int = 3) -> float:
+		name = f"{request.node.name}::{label}"
+		seconds = bench_results.record(name, f, repeat)
+		regression = bench_results.regression(name)
+		assert regression is None, regression
+		return seconds
+
+	return _bench
+
+
+@pytest.fixture
+def bench_value(bench_results, request):
+	"""Record a measurement other than a timing, named after the test and the passed labels."""
+
+	def _bench_value(label: str, value: float):
+		bench_results.note(f"{request.node.name}::{label}", value)
+
+	return _bench_value
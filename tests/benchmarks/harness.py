@@ -0,0 +1,98 @@
+"""Helpers for benchmarks."""
+import copy
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from grafanarmadillo.types import DashboardContent
+from tests.conftest import read_json_file
+
+
+def scaled_dashboard(n_panels: int) -> DashboardContent:
+	"""Scale up the test dashboard by repeating its panels."""
+	d = read_json_file("dashboard.json")
+	panel = d["panels"][0]
+	d["panels"] = [copy.deepcopy(panel) for _ in range(n_panels)]
+	return d
+
+
+def dashboard_of_size(n_bytes: int) -> DashboardContent:
+	"""Scale up the test dashboard to approximately a size when serialised."""
+	d = read_json_file("dashboard.json")
+	panel_size = len(json.dumps(d["panels"][0]))
+	empty_size = len(json.dumps(d)) - panel_size
+	return scaled_dashboard(max(0, round((n_bytes - empty_size) / panel_size)))
+
+
+def best_of(f, repeat=3) -> float:
+	"""Time the fastest of several runs of a function."""
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		f()
+		timings.append(time.perf_counter() - start)
+	return min(timings)
+
+
+class BenchmarkResults:
+	"""
+	Timings of benchmarks, which can be saved and compared to a baseline.
+
+	Other measurements, like speedups and cache hits, are saved alongside as `values`. They are not compared.
+	"""
+
+	def __init__(self, baseline: Optional[Dict[str, float]] = None, tolerance: float = 1.5):
+		self.timings: Dict[str, float] = {}
+		self.values: Dict[str, float] = {}
+		self.baseline = baseline or {}
+		self.tolerance = tolerance
+
+	def record(self, name: str, f: Callable[[], object], repeat: int = 3) -> float:
+		"""Time a function and record the timing."""
+		self.timings[name] = best_of(f, repeat)
+		return self.timings[name]
+
+	def note(self, name: str, value: float):
+		"""Record a measurement other than a timing."""
+		self.values[name] = value
+
+	def regression(self, name: str) -> Optional[str]:
+		"""Describe how a benchmark regressed from the baseline, if it did."""
+		baseline = self.baseline.get(name)
+		if baseline is None or self.timings[name] <= baseline * self.tolerance:
+			return None
+		return f"{name} took {self.timings[name]:.4f}s, baseline {baseline:.4f}s ({self.timings[name] / baseline:.2f}x)"
+
+	def save(self, path: Path):
+		"""Save the timings, with information about the platform they were measured on."""
+		path.write_text(json.dumps(
+			{
+				"python": sys.version,
+				"platform": platform.platform(),
+				"timings": self.timings,
+				"values": self.values,
+			},
+			indent=2,
+			sort_keys=True,
+		))
+
+	@staticmethod
+	def load(path: Path) -> Dict[str, float]:
+		"""Load timings from a saved run."""
+		return json.loads(path.read_text())["timings"]
+
+
+def import_times(statement: str) -> Dict[str, float]:
+	"""Run a statement in a new interpreter with `-X importtime`, and get the cumulative seconds taken to import each module."""
+	result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True)
+	times = {}
+	for line in result.stderr.splitlines():
+		if not line.startswith("import time:") or "cumulative" in line:
+			continue
+		_, cumulative, module = line[len("import time:"):].split("|")
+		times[module.strip()] = int(cumulative) / 1_000_000
+	return times
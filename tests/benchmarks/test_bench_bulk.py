@@ -0,0 +1,42 @@
+"""Benchmarks for bulk operations, end-to-end against a stub Grafana."""
+import pytest
+
+from grafanarmadillo.bulk import BulkExporter, BulkImporter, PlanAction, layouts
+from grafanarmadillo.stubgrafana import StubGrafana, StubGrafanaState
+from grafanarmadillo.templator import Templator, findreplace
+from tests.conftest import read_json_file
+
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.fixture
+def stub_grafana():
+	state = StubGrafanaState()
+	state.seed(n_orgs=3, n_folders=4, n_dashboards=10, n_alerts=2, panel=read_json_file("dashboard.json")["panels"][0], n_panels=10)
+	with StubGrafana(state) as grafana:
+		yield grafana
+
+
+@pytest.mark.parametrize("layout", ["tree", "jsonl"])
+def test_bench_bulk__roundtrip(bench, stub_grafana, tmp_path, layout):
+	cfg = stub_grafana.cfg
+	templator = Templator(
+		make_template=findreplace({"cdgngjl71kao0d": "${datasource}"}),
+		fill_template=findreplace({"${datasource}": "cdgngjl71kao0d"}),
+	)
+
+	def export():
+		BulkExporter(cfg, tmp_path, templator, layout=layouts[layout](tmp_path)).run()
+
+	bench("export", export, repeat=1)
+
+	def import_(**kwargs):
+		importer = BulkImporter(cfg, tmp_path, templator, layout=layouts[layout](tmp_path), **kwargs)
+		importer.run()
+		return importer
+
+	bench("import", import_, repeat=1)
+	bench("import-skip-unchanged", lambda: import_(skip_unchanged=True), repeat=1)
+
+	assert import_(dry_run=True).plan.counts() == {PlanAction.NOOP: 3 * 4 * (10 + 2)}
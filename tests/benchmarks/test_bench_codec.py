@@ -0,0 +1,26 @@
+"""Benchmarks for reading and writing objects on the filesystem."""
+import json
+
+import pytest
+
+from grafanarmadillo.flow import FileStore
+from grafanarmadillo.util import FastJSONDecoder, FastJSONEncoder
+from tests.benchmarks.harness import scaled_dashboard
+
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.parametrize("n_panels", [100, 2000])
+def test_bench_filestore__codecs(bench, tmp_path, n_panels):
+	dashboard = scaled_dashboard(n_panels)
+	stores = {
+		"json": FileStore(tmp_path / "json", json_encoder=json.JSONEncoder, json_decoder=json.JSONDecoder),
+		"fast": FileStore(tmp_path / "fast", json_encoder=FastJSONEncoder, json_decoder=FastJSONDecoder),
+	}
+
+	for name, store in stores.items():
+		store.root.mkdir()
+		bench(f"{name}-write", lambda: store.write_dashboard("/f0/d0", dashboard))
+		bench(f"{name}-read", lambda: store.read_dashboard("/f0/d0"))
+		assert store.read_dashboard("/f0/d0") == dashboard
@@ -0,0 +1,63 @@
+"""Benchmarks for finding objects in Grafana, against a mocked GrafanaApi."""
+from unittest import mock
+
+import pytest
+
+from grafanarmadillo.find import Finder
+from grafanarmadillo.util import CacheMode
+
+
+pytestmark = pytest.mark.benchmark
+
+
+def mock_grafana(n_folders: int, n_dashboards: int) -> mock.Mock:
+	"""Mock a GrafanaApi with folders, each with dashboards."""
+	folders = [{"id": i + 1, "uid": f"f{i}", "title": f"folder{i}"} for i in range(n_folders)]
+	dashboards = [
+		{"uid": f"f{f}-d{d}", "title": f"dashboard{d}", "folderUid": f"f{f}", "folderTitle": f"folder{f}", "type": "dash-db"}
+		for f in range(n_folders) for d in range(n_dashboards)
+	]
+	folders_by_uid = {f["uid"]: f for f in folders}
+	dashboards_by_uid = {d["uid"]: d for d in dashboards}
+
+	def search_dashboards(query=None, type_=None, folder_uids=None, **kwargs):
+		if type_ == "dash-folder":
+			return [f for f in folders if query in f["title"]]
+		return [
+			d for d in dashboards
+			if (not query or query in d["title"]) and (not folder_uids or d["folderUid"] in folder_uids)
+		]
+
+	def get_dashboard(uid):
+		d = dashboards_by_uid[uid]
+		return {"dashboard": {"uid": uid, "title": d["title"]}, "meta": {"folderUid": d["folderUid"], "folderTitle": d["folderTitle"]}}
+
+	api = mock.Mock()
+	api.search.search_dashboards.side_effect = search_dashboards
+	api.folder.get_folder.side_effect = folders_by_uid.__getitem__
+	api.dashboard.get_dashboard.side_effect = get_dashboard
+	return api
+
+
+@pytest.mark.parametrize("cache_mode", [CacheMode.SESSION, CacheMode.NONE], ids=["session", "none"])
+@pytest.mark.parametrize("n_folders,n_dashboards", [(10, 10), (50, 20)])
+def test_bench_finder__get_dashboard(bench, cache_mode, n_folders, n_dashboards):
+	api = mock_grafana(n_folders, n_dashboards)
+	paths = [(f"folder{f}", f"dashboard{d}") for f in range(n_folders) for d in range(n_dashboards)]
+
+	def lookup_all():
+		finder = Finder(api, cache_mode=cache_mode)
+		for folder, name in paths:
+			finder.get_dashboard(folder, name)
+
+	bench("get_dashboard", lookup_all, repeat=1)
+
+
+@pytest.mark.parametrize("n_folders,n_dashboards", [(10, 10), (50, 20)])
+def test_bench_finder__by_uid(bench, n_folders, n_dashboards):
+	api = mock_grafana(n_folders, n_dashboards)
+	uids = [f"f{f}-d{d}" for f in range(n_folders) for d in range(n_dashboards)]
+	finder = Finder(api)
+
+	bench("get_dashboard_by_uid", lambda: [finder.get_dashboard_by_uid(uid) for uid in uids])
+	bench("list_dashboards", lambda: Finder(api).list_dashboards())
@@ -0,0 +1,68 @@
+"""Benchmarks for the findreplace templator."""
+import pytest
+
+from grafanarmadillo.templator import findreplace
+from grafanarmadillo.util import map_json_strings
+from tests.benchmarks.harness import dashboard_of_size, scaled_dashboard
+
+
+pytestmark = pytest.mark.benchmark
+
+
+def naive_findreplace(context):
+	"""Make replacements by trying every key on every string."""
+
+	def replace_strings(s: str):
+		out = s
+		for k, v in context.items():
+			out = out.replace(k, v)
+		return out
+
+	return lambda d: map_json_strings(replace_strings, d)
+
+
+def realistic_context():
+	"""A mapping with many keys, as from a large mapping file."""
+	context = {f"$key{i}": f"value{i}" for i in range(50)}
+	context["cdgngjl71kao0d"] = "${datasource}"
+	return context
+
+
+@pytest.mark.parametrize("n_bytes", [1_000, 100_000, 1_000_000, 10_000_000], ids=["1KB", "100KB", "1MB", "10MB"])
+def test_bench_findreplace__size(bench, n_bytes):
+	dashboard = dashboard_of_size(n_bytes)
+	templator = findreplace(realistic_context())
+	repeat = 1 if n_bytes >= 10_000_000 else 3
+
+	bench("map_json_strings", lambda: map_json_strings(lambda s: s, dashboard), repeat)
+	bench("findreplace", lambda: templator(dashboard), repeat)
+
+
+@pytest.mark.parametrize("n_panels", [10, 100, 1000])
+def test_bench_findreplace__prefilter(bench, bench_value, n_panels):
+	dashboard = scaled_dashboard(n_panels)
+	context = realistic_context()
+
+	naive, prefiltered = naive_findreplace(context), findreplace(context)
+
+	assert prefiltered(dashboard) == naive(dashboard)
+
+	t_naive = bench("naive", lambda: naive(dashboard))
+	t_prefiltered = bench("prefiltered", lambda: prefiltered(dashboard))
+	bench_value("speedup", t_naive / t_prefiltered)
+
+
+@pytest.mark.parametrize("n_dashboards", [10, 100])
+def test_bench_findreplace__memo(bench, bench_value, n_dashboards):
+	dashboards = [scaled_dashboard(10) for _ in range(n_dashboards)]
+	context = realistic_context()
+
+	plain, memoised = findreplace(context), findreplace(context, memo_size=1024)
+
+	assert [memoised(d) for d in dashboards] == [plain(d) for d in dashboards]
+
+	bench("plain", lambda: [plain(d) for d in dashboards])
+	bench("memoised", lambda: [memoised(d) for d in dashboards])
+	hits = memoised.cache_info().hits
+	assert hits > 0, "dashboards sharing strings should hit the memo"
+	bench_value("hits", hits)
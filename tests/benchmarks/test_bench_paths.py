@@ -0,0 +1,22 @@
+"""Benchmarks for encoding and decoding paths."""
+import pytest
+
+from grafanarmadillo.paths import PathCodec
+from grafanarmadillo.types import GrafanaPath
+
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.parametrize("n_paths", [1_000, 20_000])
+def test_bench_pathcodec(bench, n_paths):
+	paths = [GrafanaPath(name=f"dashboard {i} / latency", folder=f"folder {i % 50}", org=f"org {i % 5}") for i in range(n_paths)]
+	encoded = [PathCodec.encode_grafana(p) for p in paths]
+	strings = ["/" + str(p) for p in encoded]
+
+	assert PathCodec.try_parse(PathCodec.decode(encoded[1])) == paths[1]
+
+	bench("encode", lambda: [PathCodec.encode_grafana(p) for p in paths])
+	bench("decode", lambda: [PathCodec.decode(p) for p in encoded])
+	bench("try_parse", lambda: [PathCodec.try_parse(s) for s in strings])
+	bench("key", lambda: {PathCodec.key(s): None for s in strings})
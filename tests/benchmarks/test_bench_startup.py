@@ -0,0 +1,20 @@
+"""Benchmarks for starting the CLI."""
+import subprocess
+import sys
+
+import pytest
+
+from tests.benchmarks.harness import import_times
+
+
+pytestmark = pytest.mark.benchmark
+
+
+def test_bench_startup(bench, bench_value):
+	times = import_times("import grafanarmadillo.cmd")
+	assert "grafana_client" not in times, "the CLI should not import the Grafana client until a command needs it"
+	for module, seconds in sorted(times.items(), key=lambda kv: kv[1], reverse=True)[:10]:
+		bench_value(f"import_{module}", seconds)
+
+	bench("import", lambda: import_times("import grafanarmadillo.cmd"), repeat=3)
+	bench("help", lambda: subprocess.run([sys.executable, "-m", "grafanarmadillo.cmd", "--help"], capture_output=True, check=True), repeat=3)
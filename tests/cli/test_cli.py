@@ -85,6 +85,40 @@ def test_cli__export_dashboard(cli_config, rw_shared_grafana, tmp_path):
 	assert "$tag1" in template["tags"], "templating didn't replace the tag"
 
 
+def test_cli__report(cli_config, rw_shared_grafana, tmp_path):
+	runner = CliRunner()
+	metrics_path = tmp_path / "metrics.txt"
+	result = runner.invoke(
+		grafanarmadillo,
+		[
+			"--cfg",
+			json.dumps(cli_config),
+			"--report",
+			"json",
+			"--metrics-file",
+			metrics_path,
+			"dashboard",
+			"export",
+			"--src",
+			"/f0/f0-0",
+			"--dst",
+			tmp_path / "dashboard.json",
+			"--env-grafana",
+			"stg",
+			"--env-template",
+			"template",
+			"--mapping",
+			"file://tests/cli/mapping.json",
+		]
+	)
+	assert result.exit_code == 0
+
+	report = json.loads(result.stderr)
+	assert any(r["endpoint"] == "/api/search" for r in report["http"])
+	assert any(r["operation"] == "Finder.get_dashboard" for r in report["operations"])
+	assert metrics_path.read_text().endswith("# EOF\n")
+
+
 def test_cli__import_alert(cli_config, rw_shared_grafana):
 	requires_alerting(rw_shared_grafana)
 
@@ -1,8 +1,18 @@
 """Tests for helpers of the CLI which can be tested in isolation."""
+import subprocess
+import sys
 from pathlib import Path
+from unittest import mock
 
 import pytest
 
+from grafanarmadillo.bulk import layouts
+from grafanarmadillo.cmd import (
+	TemplatorOpts,
+	layout_names,
+	make_checkpoint,
+	make_templator,
+)
 from grafanarmadillo.templator import (
 	TOK_AUTO_MAPPING,
 	EnvMapping,
@@ -57,6 +67,47 @@ class TestMakeMappingTemplator:
 
 		make_mapping_templator(mapping, "g", "t")
 
+	def test_selector(self):
+		"""Test that only selected keys are templated."""
+		mapping = EnvMapping({
+			"g": {"k0": "v0"},
+			"t": {"k0": "t0"},
+		})
+		opts = TemplatorOpts(include_keys=["title"])
+		templator = make_mapping_templator(mapping, "g", "t", opts.selector)
+
+		r = templator.make_template({"title": "v0", "description": "v0"})
+		assert r == {"title": "t0", "description": "v0"}
+
+	def test_no_selector(self):
+		"""Test that by default all keys are templated."""
+		assert TemplatorOpts().selector is None
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_make_templator__warm_dashboard_refs_only_in_bulk(bulk):
+	mapping = '{"g": {}, "t": {}}'
+	templator = make_templator(mock.Mock(), mapping, "g", "t", '{"resolve_alert_dashboarduid": true}', bulk=bulk)
+
+	assert templator.dashboard_refs.warm_on_use == bulk
+
+
+def test_make_checkpoint(tmp_path):
+	journal = tmp_path / "checkpoint.jsonl"
+	cfg = {"host": "grafana", "auth": ["admin", "admin"]}
+	mapping = '{"production": {"folder": "f0"}, "template": {"folder": "FOLDER"}}'
+
+	assert make_checkpoint(None, cfg, mapping, "production", "template", "{}") is None
+	checkpoint = make_checkpoint(journal, cfg, mapping, "production", "template", "{}")
+	checkpoint.record("o0", "dashboards")
+	checkpoint.close()
+
+	assert make_checkpoint(journal, {**cfg, "auth": ["other", "password"]}, mapping, "production", "template", "{}").is_done("o0", "dashboards")
+	with pytest.raises(ValueError):
+		make_checkpoint(journal, cfg, mapping, "staging", "template", "{}")
+	with pytest.raises(ValueError):
+		make_checkpoint(journal, {**cfg, "organization_id": 2}, mapping, "production", "template", "{}")
+
 
 class TestResolveObjectToFilepath:
 	"""Test resolving object paths to their files on disk."""
@@ -74,3 +125,22 @@ class TestResolveObjectToFilepath:
 	def test_cwd_base(self):
 		r = resolve_object_to_filepath(Path("."), "f0/a0")
 		assert r == Path("f0/a0.json")
+
+
+class TestStartup:
+	"""Test that the CLI only imports what each command needs."""
+
+	def test_help_is_lazy(self):
+		statement = (
+			"import sys\n"
+			"from click.testing import CliRunner\n"
+			"from grafanarmadillo.cmd import grafanarmadillo\n"
+			"for args in (['--help'], ['resources', 'import', '--help'], ['dashboard', 'export', '--help']):\n"
+			"    assert CliRunner().invoke(grafanarmadillo, args).exit_code == 0\n"
+			"print(' '.join(m for m in ('grafana_client', 'niquests', 'grafanarmadillo.bulk', 'grafanarmadillo.templator') if m in sys.modules))\n"
+		)
+		result = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, check=True)
+		assert result.stdout.strip() == "", "--help should not import Grafana clients or heavy modules"
+
+	def test_layout_names(self):
+		assert layout_names == list(layouts.keys())
@@ -0,0 +1,79 @@
+"""Tests for storing objects on the filesystem."""
+import json
+
+import pytest
+
+from grafanarmadillo.flow import FileStore
+from grafanarmadillo.util import FastJSONDecoder, FastJSONEncoder, read_from_file
+from tests.conftest import read_json_file
+
+
+codecs = [
+	(json.JSONEncoder, json.JSONDecoder),
+	(FastJSONEncoder, FastJSONDecoder),
+	(json.JSONEncoder, FastJSONDecoder),
+	(FastJSONEncoder, json.JSONDecoder),
+]
+
+
+@pytest.mark.parametrize("encoder,decoder", codecs)
+def test_filestore__roundtrip(tmp_path, encoder, decoder):
+	store = FileStore(tmp_path, json_encoder=encoder, json_decoder=decoder)
+	dashboard = read_json_file("dashboard.json")
+	dashboard["title"] = "unicode 😀"
+
+	store.write_dashboard("/f0/d0", dashboard)
+
+	assert (tmp_path / "f0" / "d0.json").exists()
+	assert store.read_dashboard("/f0/d0") == dashboard
+
+
+def test_fast_decoder__empty_file(tmp_path):
+	f = tmp_path / "empty.json"
+	f.touch()
+
+	with pytest.raises(ValueError):
+		read_from_file(f, FastJSONDecoder)
+
+
+def test_fast_decoder__hooks_fall_back():
+	class HookedDecoder(FastJSONDecoder):
+		def __init__(self, **kwargs):
+			super().__init__(object_hook=lambda d: {**d, "hooked": True}, **kwargs)
+
+	assert json.loads('{"a": 1}', cls=HookedDecoder) == {"a": 1, "hooked": True}
+
+
+def test_fast_encoder__indent_falls_back():
+	assert json.dumps({"a": 1}, cls=FastJSONEncoder, indent="\t") == '{\n\t"a": 1\n}'
+
+
+@pytest.mark.parametrize("o,options", [
+	({"a": float("nan"), "b": [float("inf")]}, {}),
+	({"a": "unicode 😀"}, {"ensure_ascii": True}),
+	({"a": "unicode 😀"}, {"ensure_ascii": False}),
+	({"a": [1, 2]}, {"separators": (", ", ": ")}),
+	({"a": [1, 2]}, {"indent": 2}),
+	({"a": 2 ** 70}, {}),
+])
+def test_fast_encoder__same_as_stdlib(o, options):
+	separators = (",", ":") if options.get("indent") is None else (",", ": ")
+	assert json.dumps(o, cls=FastJSONEncoder, **options) == json.dumps(o, **{"separators": separators, **options})
+
+
+def test_fast_encoder__allow_nan():
+	with pytest.raises(ValueError):
+		json.dumps({"a": float("nan")}, cls=FastJSONEncoder, allow_nan=False)
+
+
+def test_fast_encoder__default():
+	class SetEncoder(FastJSONEncoder):
+		def default(self, o):
+			if isinstance(o, set):
+				return sorted(o)
+			return super().default(o)
+
+	assert json.loads(json.dumps({"a": {2, 1}}, cls=SetEncoder)) == {"a": [1, 2]}
+
+	with pytest.raises(TypeError):
+		json.dumps({"a": object()}, cls=FastJSONEncoder)
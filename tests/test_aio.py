@@ -0,0 +1,161 @@
+"""Test the asyncio Finder, Dashboarder, Alerter and bulk operations against the stub Grafana."""
+import asyncio
+
+import pytest
+from grafana_client import AsyncGrafanaApi
+from grafana_client.client import GrafanaClientError
+
+from grafanarmadillo.aio import (
+	AsyncAlerter,
+	AsyncDashboarder,
+	AsyncFinder,
+	async_prefetch_map,
+)
+from grafanarmadillo.bulk import (
+	AsyncBulkExporter,
+	AsyncBulkImporter,
+	BulkImporter,
+	PlanAction,
+	TreeLayout,
+	layouts,
+)
+from grafanarmadillo.instrument import collecting
+from grafanarmadillo.stubgrafana import Faults, StubGrafana, StubGrafanaState
+from grafanarmadillo.templator import Templator
+from grafanarmadillo.throttle import Throttle
+
+
+@pytest.fixture
+def stub_grafana():
+	state = StubGrafanaState()
+	state.seed(n_orgs=2, n_folders=2, n_dashboards=3, n_alerts=1)
+	with StubGrafana(state) as grafana:
+		yield grafana
+
+
+def test_async_prefetch_map():
+	async def double(x):
+		await asyncio.sleep(0.001 * (5 - x))
+		return x * 2
+
+	async def collect():
+		return [x async for x in async_prefetch_map(double, range(5), concurrency=3)]
+
+	assert asyncio.run(collect()) == [0, 2, 4, 6, 8]
+
+
+def test_finder(stub_grafana):
+	async def go():
+		finder = AsyncFinder(AsyncGrafanaApi(**stub_grafana.cfg))
+		dashboards = await finder.list_dashboards(page_size=4)
+		dashboard = await finder.get_dashboard("folder1", "dashboard2")
+		path = await finder.get_dashboard_by_uid(dashboard["uid"])
+		alert = await finder.get_alert_from_path("/folder0/alert0")
+		general = await finder.get_folder("General")
+		return dashboards, path, alert, general
+
+	dashboards, path, alert, general = asyncio.run(go())
+	assert len(dashboards) == 3 * 2
+	assert path.folder == "folder1"
+	assert alert["title"] == "alert0"
+	assert general["id"] == 0
+
+
+def test_finder__not_found(stub_grafana):
+	async def go():
+		await AsyncFinder(AsyncGrafanaApi(**stub_grafana.cfg)).get_dashboard("folder0", "missing")
+
+	with pytest.raises(ValueError):
+		asyncio.run(go())
+
+
+def test_create_and_export(stub_grafana):
+	async def go():
+		gfn = AsyncGrafanaApi(**stub_grafana.cfg)
+		finder, dashboarder, alerter = AsyncFinder(gfn), AsyncDashboarder(gfn), AsyncAlerter(gfn)
+
+		created = await asyncio.gather(*(finder.create_or_get_dashboard("/new folder/new dashboard") for _ in range(5)))
+		dashboard, _ = created[0]
+		await dashboarder.set_dashboard_content(dashboard, {"title": "new dashboard", "panels": [{"id": 1}]})
+		exported = await dashboarder.export_dashboard(dashboard)
+
+		alert, alert_folder = await finder.create_or_get_alert("/new folder/new alert")
+		await alerter.import_alert({**alert, "condition": "B"}, alert_folder)
+		exported_alert, _ = await alerter.export_alert(alert)
+		return created, exported, exported_alert
+
+	created, (content, folder), exported_alert = asyncio.run(go())
+	assert len({d["uid"] for d, _ in created}) == 1
+	assert stub_grafana.state.requests["create_folder"] == 1
+	assert content["panels"] == [{"id": 1}]
+	assert folder["title"] == "new folder"
+	assert exported_alert["condition"] == "B"
+
+
+@pytest.mark.parametrize("layout", ["tree", "jsonl"])
+def test_bulk_roundtrip(stub_grafana, tmp_path, layout):
+	AsyncBulkExporter(stub_grafana.cfg, tmp_path, Templator(), layout=layouts[layout](tmp_path), concurrency=4).run()
+	AsyncBulkImporter(stub_grafana.cfg, tmp_path, Templator(), layout=layouts[layout](tmp_path), concurrency=4).run()
+
+	importer = BulkImporter(stub_grafana.cfg, tmp_path, Templator(), layout=layouts[layout](tmp_path), dry_run=True)
+	importer.run()
+	assert importer.plan.counts() == {PlanAction.NOOP: 2 * 2 * (3 + 1)}
+
+
+def test_bulk_import__new_grafana(stub_grafana, tmp_path):
+	AsyncBulkExporter(stub_grafana.cfg, tmp_path, Templator()).run()
+
+	state = StubGrafanaState()
+	state.add_org("org1")
+	with StubGrafana(state) as target:
+		AsyncBulkImporter(target.cfg, tmp_path, Templator(), concurrency=8).run()
+
+	assert state.requests["create_folder"] == 2 * 2
+	for org in state.orgs.values():
+		assert len(org.dashboards) == 2 * 3
+		assert len(org.alerts) == 2
+
+
+def test_bulk_import__error(stub_grafana, tmp_path):
+	AsyncBulkExporter(stub_grafana.cfg, tmp_path, Templator()).run()
+
+	faults = Faults(error_rate=1, error_status=400, routes=frozenset({"save_dashboard"}))
+	with StubGrafana(stub_grafana.state, faults) as target:
+		with pytest.raises(GrafanaClientError):
+			AsyncBulkImporter(target.cfg, tmp_path, Templator(), concurrency=4).run()
+
+
+def test_bulk_import__templates_off_the_loop(stub_grafana, tmp_path):
+	AsyncBulkExporter(stub_grafana.cfg, tmp_path, Templator()).run()
+
+	class LoopCheckingTemplator(Templator):
+		def make_dashboard_from_template(self, dashboard_info, template):
+			with pytest.raises(RuntimeError):
+				asyncio.get_running_loop()
+			return super().make_dashboard_from_template(dashboard_info, template)
+
+	AsyncBulkImporter(stub_grafana.cfg, tmp_path, LoopCheckingTemplator(), concurrency=4).run()
+
+
+def test_bulk_import__reads_off_the_loop(stub_grafana, tmp_path):
+	AsyncBulkExporter(stub_grafana.cfg, tmp_path, Templator()).run()
+
+	class LoopCheckingLayout(TreeLayout):
+		def read(self, kind, org_name):
+			for item in super().read(kind, org_name):
+				with pytest.raises(RuntimeError):
+					asyncio.get_running_loop()
+				yield item
+
+	AsyncBulkImporter(stub_grafana.cfg, tmp_path, Templator(), layout=LoopCheckingLayout(tmp_path), concurrency=4).run()
+
+
+def test_bulk__throttled_and_instrumented(stub_grafana, tmp_path):
+	throttle = Throttle()
+	with collecting() as metrics:
+		AsyncBulkExporter(stub_grafana.cfg, tmp_path, Templator(), throttle=throttle).run()
+		AsyncBulkImporter(stub_grafana.cfg, tmp_path, Templator(), concurrency=4, throttle=throttle).run()
+
+	http_requests = sum(http["count"] for http in metrics.report()["http"])
+	assert throttle.metrics.requests == http_requests
+	assert {http["method"] for http in metrics.report()["http"]} >= {"GET", "POST"}
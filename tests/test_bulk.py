@@ -0,0 +1,369 @@
+"""Tests for bulk operations which can be tested in isolation."""
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from unittest import mock
+
+import pytest
+
+from grafanarmadillo.bulk import (
+	TOK_ALERTS,
+	TOK_DASHBOARDS,
+	BulkFileOperation,
+	BulkImporter,
+	Checkpoint,
+	JSONLinesLayout,
+	OrgRegistry,
+	PlanAction,
+	TreeLayout,
+	submit_after,
+)
+from grafanarmadillo.dashboarder import Dashboarder
+from grafanarmadillo.find import Finder
+from grafanarmadillo.templator import Templator, findreplace
+from grafanarmadillo.types import GrafanaPath
+from tests.conftest import read_json_file
+
+
+@pytest.fixture(params=[TreeLayout, lambda root: TreeLayout(root, workers=1), JSONLinesLayout], ids=["tree", "tree-serial", "jsonl"])
+def layout_cls(request):
+	return request.param
+
+
+class TestLayouts:
+	"""Test arranging resources on disk."""
+
+	def test_roundtrip(self, tmp_path, layout_cls):
+		dashboard = read_json_file("dashboard.json")
+		alert = read_json_file("alert_rule.json")
+		objects = {
+			(TOK_DASHBOARDS, "o0", "f0", "d0"): dashboard,
+			(TOK_DASHBOARDS, "o0", "f 1", "d/1"): dashboard,
+			(TOK_ALERTS, "o0", "f0", "a0"): alert,
+			(TOK_DASHBOARDS, "o/1", "f0", "d0"): dashboard,
+		}
+
+		writer = layout_cls(tmp_path)
+		for (kind, org, folder, name), content in objects.items():
+			writer.write(kind, GrafanaPath(name, folder, org), content)
+		writer.close()
+
+		reader = layout_cls(tmp_path)
+		assert reader.list_orgs() == {"o0", "o/1"}
+		read = {
+			(kind, path.org, path.folder, path.name): content
+			for org in reader.list_orgs()
+			for kind in [TOK_DASHBOARDS, TOK_ALERTS]
+			for path, content in reader.read(kind, org)
+		}
+		assert read == objects
+
+	def test_read_missing(self, tmp_path, layout_cls):
+		assert list(layout_cls(tmp_path).read(TOK_ALERTS, "o0")) == []
+
+
+class TestTreeLayout:
+	"""Test writing one file per resource."""
+
+	def test_ignores_other_files(self, tmp_path):
+		layout = TreeLayout(tmp_path)
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o0"), {"title": "d0"})
+		(tmp_path / TOK_DASHBOARDS / "o0" / "README.md").touch()
+		(tmp_path / TOK_DASHBOARDS / "o0" / "f0" / "notes.txt").touch()
+
+		read = list(layout.read(TOK_DASHBOARDS, "o0"))
+		assert [(p.folder, p.name) for p, _ in read] == [("f0", "d0")]
+
+
+class TestJSONLinesLayout:
+	"""Test packing resources into JSON Lines files."""
+
+	def test_one_file_per_org(self, tmp_path):
+		layout = JSONLinesLayout(tmp_path)
+		for i in range(3):
+			layout.write(TOK_DASHBOARDS, GrafanaPath(f"d{i}", "f0", "o0"), {"title": f"d{i}"})
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o1"), {"title": "d0"})
+		layout.close()
+
+		assert sorted(p.name for p in (tmp_path / TOK_DASHBOARDS).iterdir()) == ["o0.jsonl", "o1.jsonl"]
+		assert len((tmp_path / TOK_DASHBOARDS / "o0.jsonl").read_text().splitlines()) == 3
+
+	def test_canonical(self, tmp_path):
+		a, b = JSONLinesLayout(tmp_path / "a"), JSONLinesLayout(tmp_path / "b")
+		a.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o0"), {"x": 1, "y": 2})
+		b.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o0"), {"y": 2, "x": 1})
+		a.close()
+		b.close()
+
+		assert (tmp_path / "a" / TOK_DASHBOARDS / "o0.jsonl").read_bytes() == (tmp_path / "b" / TOK_DASHBOARDS / "o0.jsonl").read_bytes()
+
+	def test_overwrites_previous_export(self, tmp_path):
+		for _ in range(2):
+			layout = JSONLinesLayout(tmp_path)
+			layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o0"), {"title": "d0"})
+			layout.close()
+
+		assert len(list(JSONLinesLayout(tmp_path).read(TOK_DASHBOARDS, "o0"))) == 1
+
+	def test_returning_to_org_appends(self, tmp_path):
+		layout = JSONLinesLayout(tmp_path)
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o0"), {"title": "d0"})
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o1"), {"title": "d0"})
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d1", "f0", "o0"), {"title": "d1"})
+		layout.close()
+
+		assert len(list(JSONLinesLayout(tmp_path).read(TOK_DASHBOARDS, "o0"))) == 2
+
+
+class RecordingFileOperation(BulkFileOperation):
+	"""Record the resources read from files."""
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.seen = []
+
+	def each_dashboard(self, path, dashboard):
+		self.seen.append((TOK_DASHBOARDS, path.org, self.get_org(path.org)["id"]))
+
+	def each_alert(self, path, alert):
+		self.seen.append((TOK_ALERTS, path.org, self.get_org(path.org)["id"]))
+
+
+class TestOrgDiscovery:
+	"""Test finding the orgs for resources on disk."""
+
+	@pytest.fixture
+	def mock_grafana(self):
+		with mock.patch("grafanarmadillo.bulk.GrafanaApi") as m:
+			m.return_value.organizations.list_organization.return_value = [
+				{"id": 1, "name": "o0"},
+				{"id": 2, "name": "o/1"},
+				{"id": 3, "name": "unused"},
+			]
+			yield m
+
+	def test_orgs_listed_once(self, tmp_path, mock_grafana):
+		layout = TreeLayout(tmp_path)
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o0"), {"title": "d0"})
+		layout.write(TOK_ALERTS, GrafanaPath("a0", "f0", "o0"), {"title": "a0"})
+		layout.write(TOK_DASHBOARDS, GrafanaPath("d0", "f0", "o/1"), {"title": "d0"})
+
+		op = RecordingFileOperation({}, tmp_path, layout)
+		op.run()
+
+		assert sorted(op.seen) == [(TOK_ALERTS, "o0", 1), (TOK_DASHBOARDS, "o/1", 2), (TOK_DASHBOARDS, "o0", 1)]
+		assert mock_grafana.return_value.organizations.list_organization.call_count == 1
+		mock_grafana.return_value.organization.find_organization.assert_not_called()
+
+	def test_org_clients_reused(self, tmp_path, mock_grafana):
+		op = RecordingFileOperation({}, tmp_path)
+		org = op.get_org("o0")
+
+		assert op.org_client(org) is op.org_client(org)
+		mock_grafana.assert_any_call(organization_id=1)
+
+	def test_missing_org(self, tmp_path, mock_grafana):
+		op = RecordingFileOperation({}, tmp_path)
+
+		with pytest.raises(ValueError):
+			op.get_org("missing")
+
+
+class TestOrgRegistry:
+	"""Test the index of orgs."""
+
+	@pytest.fixture
+	def gfn(self):
+		gfn = mock.MagicMock()
+		gfn.organizations.list_organization.return_value = [{"id": 1, "name": "o0"}, {"id": 2, "name": "o1"}]
+		return gfn
+
+	def test_lookups(self, gfn):
+		orgs = OrgRegistry(gfn)
+
+		assert orgs.by_name("o1")["id"] == 2
+		assert orgs.by_id(1)["name"] == "o0"
+		assert len(orgs.all()) == 2
+		assert gfn.organizations.list_organization.call_count == 1
+
+	def test_ttl(self, gfn):
+		now = [0.0]
+		orgs = OrgRegistry(gfn, ttl=10, clock=lambda: now[0])
+
+		orgs.by_name("o0")
+		now[0] = 5
+		orgs.by_name("o0")
+		assert gfn.organizations.list_organization.call_count == 1
+
+		now[0] = 11
+		orgs.by_name("o0")
+		assert gfn.organizations.list_organization.call_count == 2
+
+	def test_invalidate(self, gfn):
+		orgs = OrgRegistry(gfn)
+		orgs.all()
+
+		orgs.invalidate()
+		orgs.all()
+
+		assert gfn.organizations.list_organization.call_count == 2
+
+	def test_new_org_found(self, gfn):
+		orgs = OrgRegistry(gfn)
+		orgs.all()
+
+		gfn.organizations.list_organization.return_value = [{"id": 1, "name": "o0"}, {"id": 3, "name": "new"}]
+
+		assert orgs.by_name("new")["id"] == 3
+
+	def test_missing(self, gfn):
+		orgs = OrgRegistry(gfn)
+
+		with pytest.raises(ValueError):
+			orgs.by_name("missing")
+		assert gfn.organizations.list_organization.call_count == 1, "should not list again immediately after listing"
+
+
+def test_submit_after():
+	order = []
+	with ThreadPoolExecutor(1) as pool:
+		gate = threading.Event()
+		dependency = pool.submit(gate.wait)
+		after = submit_after(pool, [dependency], order.append, "after")
+		pool.submit(order.append, "other")
+		failed = submit_after(pool, [pool.submit(operator.truediv, 1, 0)], order.append, "never")
+		gate.set()
+		wait([after, failed])
+
+	assert order == ["other", "after"], "the task should not take a worker until its dependency is done"
+	assert isinstance(failed.exception(), ValueError)
+
+
+class TestImportPlan:
+	"""Test planning imports by comparing to the current state of Grafana."""
+
+	@pytest.fixture
+	def mock_grafana(self):
+		with mock.patch("grafanarmadillo.bulk.GrafanaApi") as m:
+			gfn = m.return_value
+			gfn.organizations.list_organization.return_value = [{"id": 1, "name": "o0"}]
+			gfn.search.search_dashboards.return_value = [
+				{"uid": "u-same", "title": "same", "folderTitle": "f0"},
+				{"uid": "u-changed", "title": "changed", "folderTitle": "f0"},
+				{"uid": "u-general", "title": "general"},
+			]
+			live = {
+				"u-same": {"id": 1, "uid": "u-same", "version": 3, "title": "same", "panels": ["prd"]},
+				"u-changed": {"id": 2, "uid": "u-changed", "version": 1, "title": "changed", "panels": ["old"]},
+				"u-general": {"id": 3, "uid": "u-general", "version": 1, "title": "general", "panels": []},
+			}
+			gfn.dashboard.get_dashboard.side_effect = lambda uid: {"dashboard": live[uid], "meta": {}}
+			gfn.folder.get_all_folders.return_value = [{"uid": "f0-uid", "title": "f0"}]
+			gfn.alertingprovisioning.get_alertrules_all.return_value = [
+				{"id": 1, "uid": "a-same", "folderUID": "f0-uid", "title": "a-same", "orgID": 1, "data": ["prd"]},
+				{"id": 2, "uid": "a-changed", "folderUID": "f0-uid", "title": "a-changed", "orgID": 1, "data": ["old"]},
+			]
+			yield m
+
+	@pytest.fixture
+	def resources(self, tmp_path):
+		layout = TreeLayout(tmp_path)
+		for folder, title, panels in [("f0", "same", ["$env"]), ("f0", "changed", ["new"]), ("f0", "new", []), ("General", "general", [])]:
+			layout.write(TOK_DASHBOARDS, GrafanaPath(title, folder, "o0"), {"title": title, "panels": panels})
+		layout.write(TOK_ALERTS, GrafanaPath("a-same", "f0", "o0"), {"title": "a-same", "data": ["$env"]})
+		layout.write(TOK_ALERTS, GrafanaPath("a-changed", "f0", "o0"), {"title": "a-changed", "data": ["new"]})
+		layout.write(TOK_ALERTS, GrafanaPath("a-new", "f0", "o0"), {"title": "a-new", "data": []})
+		return tmp_path
+
+	@pytest.fixture
+	def templator(self):
+		return Templator(fill_template=findreplace({"$env": "prd"}))
+
+	def _actions(self, plan):
+		return {(c.kind, c.path.folder, c.path.name): c.action for c in plan.changes}
+
+	def test_dry_run(self, mock_grafana, resources, templator):
+		op = BulkImporter({}, resources, templator, dry_run=True)
+		op.run()
+
+		assert self._actions(op.plan) == {
+			(TOK_DASHBOARDS, "f0", "same"): PlanAction.NOOP,
+			(TOK_DASHBOARDS, "f0", "changed"): PlanAction.UPDATE,
+			(TOK_DASHBOARDS, "f0", "new"): PlanAction.CREATE,
+			(TOK_DASHBOARDS, "General", "general"): PlanAction.NOOP,
+			(TOK_ALERTS, "f0", "a-same"): PlanAction.NOOP,
+			(TOK_ALERTS, "f0", "a-changed"): PlanAction.UPDATE,
+			(TOK_ALERTS, "f0", "a-new"): PlanAction.CREATE,
+		}
+		assert op.plan.summary().splitlines()[0] == "create=2 update=2 noop=3"
+		gfn = mock_grafana.return_value
+		gfn.dashboard.update_dashboard.assert_not_called()
+		gfn.alertingprovisioning.create_alertrule.assert_not_called()
+		gfn.alertingprovisioning.update_alertrule.assert_not_called()
+		assert gfn.search.search_dashboards.call_count == 1, "should list dashboards once per org"
+		assert gfn.dashboard.get_dashboard.call_count == 3, "should fetch each live dashboard to compare once"
+
+	def test_dry_run__matched_by_uid(self, mock_grafana, tmp_path, templator):
+		layout = TreeLayout(tmp_path)
+		layout.write(TOK_DASHBOARDS, GrafanaPath("$env board", "f0", "o0"), {"uid": "u-same", "title": "same", "panels": ["$env"]})
+		layout.write(TOK_DASHBOARDS, GrafanaPath("renamed", "f0", "o0"), {"uid": "u-changed", "title": "renamed", "panels": ["old"]})
+
+		op = BulkImporter({}, tmp_path, templator, dry_run=True)
+		op.run()
+
+		assert self._actions(op.plan) == {
+			(TOK_DASHBOARDS, "f0", "$env board"): PlanAction.NOOP,
+			(TOK_DASHBOARDS, "f0", "renamed"): PlanAction.UPDATE,
+		}
+
+	def test_skip_unchanged(self, mock_grafana, resources, templator):
+		op = BulkImporter({}, resources, templator, skip_unchanged=True)
+		with mock.patch.object(Dashboarder, "import_dashboard") as import_dashboard, \
+			mock.patch.object(Finder, "create_or_get_folder"), \
+			mock.patch.object(BulkImporter, "each_alert"):
+			op.run()
+
+		imported = sorted(c.args[0]["title"] for c in import_dashboard.call_args_list)
+		assert imported == ["changed", "new"]
+
+
+class TestCheckpoint:
+	"""Test the journal of completed work."""
+
+	def test_roundtrip(self, tmp_path):
+		journal = tmp_path / "checkpoint.jsonl"
+		path = GrafanaPath("d/0", "f0", "o0")
+		checkpoint = Checkpoint(journal)
+		checkpoint.record("o0", TOK_DASHBOARDS, path, "h0")
+		checkpoint.record("o1", Checkpoint.TOK_ORG)
+		checkpoint.close()
+
+		with journal.open("a") as f:
+			f.write('{"org": "o0", "kind": "dash')  # interrupted write
+
+		reloaded = Checkpoint(journal)
+		assert reloaded.is_done("o0", TOK_DASHBOARDS, path, "h0")
+		assert not reloaded.is_done("o0", TOK_DASHBOARDS, path, "changed"), "objects whose content changed should be done again"
+		assert not reloaded.is_done("o0", TOK_ALERTS, path, "h0")
+		assert reloaded.is_done("o1", Checkpoint.TOK_ORG)
+		assert not reloaded.is_done("o0", Checkpoint.TOK_ORG)
+
+	def test_header(self, tmp_path):
+		journal = tmp_path / "checkpoint.jsonl"
+		header = Checkpoint.header_for({"host": "grafana", "port": 3000}, {"mapping": {"production": {"folder": "f0"}}, "env_grafana": "production"})
+		checkpoint = Checkpoint(journal, header)
+		checkpoint.record("o0", Checkpoint.TOK_ORG)
+		checkpoint.close()
+
+		assert Checkpoint(journal, header).is_done("o0", Checkpoint.TOK_ORG)
+		other_target = Checkpoint.header_for({"host": "other", "port": 3000}, {"mapping": {"production": {"folder": "f0"}}, "env_grafana": "production"})
+		with pytest.raises(ValueError):
+			Checkpoint(journal, other_target)
+		other_templator = Checkpoint.header_for({"host": "grafana", "port": 3000}, {"mapping": {"production": {"folder": "f1"}}, "env_grafana": "production"})
+		with pytest.raises(ValueError):
+			Checkpoint(journal, other_templator)
+
+	def test_header__empty_journal(self, tmp_path):
+		journal = tmp_path / "checkpoint.jsonl"
+		Checkpoint(journal, {"target": "a"}).close()
+		assert Checkpoint(journal, {"target": "b"}).header == {"target": "b"}, "a journal with no records can be used for anything"
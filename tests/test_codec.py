@@ -3,7 +3,7 @@ from pathlib import Path
 import pytest
 
 from grafanarmadillo.paths import PathCodec
-from grafanarmadillo.types import GrafanaPath
+from grafanarmadillo.types import GrafanaPath, GrafanaPathKey
 
 
 def test_encode_decode():
@@ -75,3 +75,23 @@ def test_resolve_path__too_many_parts():
 
 def test_resolve_path__with_org():
 	assert PathCodec.try_parse(Path("/org/folder/name")) == GrafanaPath(org="org", folder="folder", name="name")
+
+
+def test_key():
+	path = GrafanaPath(org="org", folder="fol/der", name="name")
+	key = PathCodec.key(path)
+
+	assert {key: 1}[GrafanaPathKey("name", "fol/der", "org")] == 1
+	assert key.path() == path
+	assert PathCodec.key(["org", "fol/der", "name"]) == key
+	assert PathCodec.key(key) is key
+	assert PathCodec.encode_grafana(key) == PathCodec.encode_grafana(path) == Path("org/fol%2Fder/name")
+	with pytest.raises(AttributeError):
+		key.name = "other"
+
+
+def test_try_parse__not_shared():
+	"""Parsing is memoised, but callers get their own GrafanaPath."""
+	path = PathCodec.try_parse("/folder/name")
+	path.name = "changed"
+	assert PathCodec.try_parse("/folder/name").name == "name"
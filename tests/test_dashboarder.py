@@ -1,5 +1,8 @@
 """Performs integration tests for dashboarder."""
+from unittest import mock
+
 import pytest
+from grafana_client.client import GrafanaClientError
 
 from grafanarmadillo.dashboarder import Dashboarder
 from grafanarmadillo.find import Finder
@@ -131,3 +134,103 @@ def test_importexport__roundtrip_subfolder(rw_shared_grafana, unique):
 	assert exported_dashboard == new_dashboard
 
 	assert target_folder["uid"] == exported_folder["uid"]
+
+
+def test_import__skip_unchanged(rw_shared_grafana, unique):
+	finder, dashboarder = (Finder(rw_shared_grafana[1]), Dashboarder(rw_shared_grafana[1], skip_unchanged=True))
+	folder = finder.get_folder("f0")
+
+	new_dashboard = read_json_file("dashboard.json")
+	new_dashboard["uid"] = unique
+	new_dashboard["title"] = unique
+
+	dashboarder.import_dashboard(new_dashboard.copy(), folder)
+	version = dashboarder.api.dashboard.get_dashboard(unique)["dashboard"]["version"]
+
+	r = Dashboarder(rw_shared_grafana[1], skip_unchanged=True).import_dashboard(new_dashboard.copy(), folder)
+
+	assert r["status"] == "unchanged"
+	assert dashboarder.api.dashboard.get_dashboard(unique)["dashboard"]["version"] == version
+
+
+class TestSkipUnchanged:
+	"""Test that unchanged dashboards are not saved again."""
+
+	@pytest.fixture
+	def api(self):
+		api = mock.MagicMock()
+		api.dashboard.get_dashboard.return_value = {
+			"dashboard": {"id": 1, "uid": "u0", "version": 4, "title": "d0", "panels": []},
+			"meta": {"folderUid": "f0"},
+		}
+		api.dashboard.update_dashboard.return_value = {"id": 1, "uid": "u0", "version": 5, "status": "success"}
+		return api
+
+	def test_unchanged(self, api):
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		r = dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": []}, {"uid": "f0", "id": 7})
+
+		api.dashboard.update_dashboard.assert_not_called()
+		assert r == {"id": 1, "uid": "u0", "version": 4, "status": "unchanged"}
+
+	def test_changed(self, api):
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": [{}]}, {"uid": "f0", "id": 7})
+
+		api.dashboard.update_dashboard.assert_called_once()
+
+	def test_moved(self, api):
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": []}, {"uid": "f1", "id": 8})
+
+		api.dashboard.update_dashboard.assert_called_once()
+
+	def test_moved_to_general(self, api):
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": []}, None)
+
+		api.dashboard.update_dashboard.assert_called_once()
+
+	def test_repeated_import_is_cached(self, api):
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		for _ in range(3):
+			dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": [{}]}, {"uid": "f0", "id": 7})
+
+		assert api.dashboard.update_dashboard.call_count == 1
+		assert api.dashboard.get_dashboard.call_count == 1
+
+	def test_new(self, api):
+		api.dashboard.get_dashboard.side_effect = GrafanaClientError(404, None, "not found")
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": []})
+
+		api.dashboard.update_dashboard.assert_called_once()
+
+	def test_missing_is_cached(self, api):
+		api.dashboard.get_dashboard.side_effect = GrafanaClientError(404, None, "not found")
+		dashboarder = Dashboarder(api)
+
+		assert dashboarder.live_state("u0") is None
+		assert dashboarder.live_state("u0") is None
+		assert api.dashboard.get_dashboard.call_count == 1
+
+	def test_no_uid(self, api):
+		dashboarder = Dashboarder(api, skip_unchanged=True)
+
+		dashboarder.import_dashboard({"title": "d0", "panels": []})
+
+		api.dashboard.get_dashboard.assert_not_called()
+		api.dashboard.update_dashboard.assert_called_once()
+
+	def test_disabled(self, api):
+		dashboarder = Dashboarder(api)
+
+		dashboarder.import_dashboard({"uid": "u0", "title": "d0", "panels": []}, {"uid": "f0", "id": 7})
+
+		api.dashboard.update_dashboard.assert_called_once()
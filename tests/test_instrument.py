@@ -0,0 +1,152 @@
+"""Test instrumentation."""
+import asyncio
+import json
+from unittest import mock
+
+import niquests
+
+from grafanarmadillo.instrument import (
+	Histogram,
+	Metrics,
+	active,
+	collecting,
+	instrument_api,
+	instrumented,
+	phase,
+	timed_iter,
+)
+from grafanarmadillo.util import Cache
+
+
+class FakeClock:
+	"""A clock which advances by a fixed step each time it is read."""
+
+	def __init__(self, step: float = 0.5):
+		self.now = 0.0
+		self.step = step
+
+	def __call__(self) -> float:
+		self.now += self.step
+		return self.now
+
+
+def test_histogram_buckets():
+	h = Histogram(buckets=(1.0, 2.0))
+	for v in (0.5, 1.0, 1.5, 3.0):
+		h.observe(v)
+
+	assert h.cumulative() == [(1.0, 2), (2.0, 3), (float("inf"), 4)]
+	assert h.summary() == {"count": 4, "total": 6.0, "mean": 1.5, "max": 3.0}
+
+
+def test_inactive_hooks_do_nothing():
+	assert active() is None
+
+	@instrumented
+	def f(x):
+		return x + 1
+
+	with phase("p"):
+		assert f(1) == 2
+	assert list(timed_iter("p", [1, 2])) == [1, 2]
+
+
+def test_operations_and_phases():
+	metrics = Metrics(clock=FakeClock())
+
+	class Thing:
+		@instrumented
+		def op(self, x):
+			return x
+
+	with collecting(metrics):
+		with phase("outer"):
+			Thing().op(1)
+			Thing().op(2)
+		assert list(timed_iter("read", "ab")) == ["a", "b"]
+	assert active() is None
+
+	report = metrics.report()
+	assert report["operations"] == [{"operation": "test_operations_and_phases.<locals>.Thing.op", "count": 2, "total": 1.0, "mean": 0.5, "max": 0.5}]
+	phases = {r["phase"]: r["count"] for r in report["phases"]}
+	assert phases == {"outer": 1, "read": 3}
+
+
+def test_cache_hit_rate():
+	cache = Cache()
+	with collecting() as metrics:
+		for _ in range(4):
+			cache.getor(("get_folder", "f0"), lambda: {"uid": "f0"})
+		cache.getor("list_dashboards", lambda: [1])
+
+	assert metrics.report()["cache"] == [
+		{"method": "get_folder", "hits": 3, "misses": 1, "hit_rate": 0.75},
+		{"method": "list_dashboards", "hits": 0, "misses": 1, "hit_rate": 0.0},
+	]
+
+
+def test_http_requests():
+	from grafana_client import GrafanaApi
+
+	r = niquests.Response()
+	r.status_code = 200
+	r._content = json.dumps({"dashboard": {}}).encode()
+	r.headers["Content-Type"] = "application/json"
+
+	gfn = GrafanaApi.from_url("http://localhost:3000")
+	gfn.client.s = mock.Mock()
+	gfn.client.s.request.return_value = r
+	instrument_api(gfn)
+	instrument_api(gfn)
+
+	with collecting() as metrics:
+		gfn.dashboard.get_dashboard("abc")
+		gfn.dashboard.get_dashboard("def")
+
+	(http,) = metrics.report()["http"]
+	assert (http["method"], http["endpoint"], http["status"], http["count"]) == ("GET", "/api/dashboards/uid/{}", "200", 2)
+
+
+def test_http_requests__async():
+	from grafana_client import AsyncGrafanaApi
+
+	r = niquests.Response()
+	r.status_code = 200
+	r._content = json.dumps({"dashboard": {}}).encode()
+	r.headers["Content-Type"] = "application/json"
+
+	gfn = AsyncGrafanaApi.from_url("http://localhost:3000")
+	gfn.client.s = mock.AsyncMock()
+	gfn.client.s.request.return_value = r
+	instrument_api(gfn)
+
+	with collecting() as metrics:
+		asyncio.run(gfn.dashboard.get_dashboard("abc"))
+
+	(http,) = metrics.report()["http"]
+	assert (http["method"], http["endpoint"], http["status"], http["count"]) == ("GET", "/api/dashboards/uid/{}", "200", 1)
+
+
+def test_openmetrics():
+	metrics = Metrics()
+	metrics.inc("cache_requests", method="get_folder", result="hit")
+	metrics.observe("phase_seconds", 0.2, phase='say "hi"')
+
+	text = metrics.openmetrics()
+
+	assert 'grafanarmadillo_cache_requests_total{method="get_folder",result="hit"} 1' in text
+	assert 'grafanarmadillo_phase_seconds_bucket{phase="say \\"hi\\"",le="0.25"} 1' in text
+	assert 'grafanarmadillo_phase_seconds_bucket{phase="say \\"hi\\"",le="0.1"} 0' in text
+	assert 'grafanarmadillo_phase_seconds_count{phase="say \\"hi\\""} 1' in text
+	assert text.endswith("# EOF\n")
+
+
+def test_format_report():
+	metrics = Metrics()
+	metrics.observe("http_request_seconds", 0.1, method="GET", endpoint="/api/search", status="200")
+	metrics.inc("cache_requests", method="get_folder", result="hit")
+
+	text = metrics.format_report()
+
+	assert "GET /api/search 200" in text
+	assert "hit_rate=100.0%" in text
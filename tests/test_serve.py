@@ -0,0 +1,130 @@
+"""Test the server against the stub Grafana."""
+import socket
+import stat
+import subprocess
+import sys
+import threading
+
+import pytest
+from grafana_client import GrafanaApi
+
+from grafanarmadillo.stubgrafana import StubGrafana, StubGrafanaState
+
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+
+mapping = {"template": {"folder": "FOLDER"}, "production": {"folder": "folder0"}}
+templator = {"mapping": mapping, "env_grafana": "production", "env_template": "template"}
+
+
+@pytest.fixture
+def stub_grafana():
+	state = StubGrafanaState()
+	state.seed(n_orgs=1, n_folders=2, n_dashboards=3, n_alerts=1)
+	with StubGrafana(state) as grafana:
+		yield grafana
+
+
+@pytest.fixture
+def client(stub_grafana, tmp_path):
+	from grafanarmadillo.serve import Client, Server, Worker
+
+	with Server(tmp_path / "s.sock", Worker(GrafanaApi(**stub_grafana.cfg))) as server:
+		thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+		thread.start()
+		with Client(server.socket_path, timeout=10) as client:
+			yield client
+		server.shutdown()
+	assert not (tmp_path / "s.sock").exists()
+
+
+def test_roundtrip(client, stub_grafana):
+	assert client.ping() == "pong"
+
+	template = client.export_dashboard("/folder0/dashboard0", templator=templator)
+	assert template["title"] == "dashboard0"
+
+	def import_some(prefix, reset):
+		before = sum(stub_grafana.state.requests.values())
+		for i in range(5):
+			if reset:
+				client.reset()
+			client.import_dashboard(f"/folder0/{prefix}{i}", {**template, "title": f"{prefix}{i}", "description": "FOLDER"}, templator=templator)
+		return sum(stub_grafana.state.requests.values()) - before
+
+	cold, warm = import_some("cold", reset=True), import_some("warm", reset=False)
+	assert warm < cold, "lookups should be cached between requests"
+	assert client.export_dashboard("/folder0/warm4")["description"] == "folder0"
+
+	client.import_alert("/folder1/new alert", {**client.export_alert("/folder1/alert0"), "title": "new alert"})
+	assert client.export_alert("/folder1/new alert")["title"] == "new alert"
+
+
+def test_profile(client):
+	profiled = {**templator, "templator_extra_opts": {"profile": True}}
+
+	client.export_dashboard("/folder0/dashboard0", templator=profiled)
+	assert {row["stage"] for row in client.last_profile} >= {"make_template[0] _findreplace"}
+	assert all(row["calls"] == 1 for row in client.last_profile), "each request should have its own profile"
+
+	client.export_dashboard("/folder0/dashboard0", templator=profiled)
+	assert all(row["calls"] == 1 for row in client.last_profile)
+
+	client.export_dashboard("/folder0/dashboard0", templator=templator)
+	assert client.last_profile is None
+
+
+def test_errors(client):
+	from grafanarmadillo.serve import ServeError
+
+	with pytest.raises(ServeError) as e:
+		client.export_dashboard("/folder0/missing")
+	assert e.value.kind == "ValueError"
+
+	with pytest.raises(ServeError):
+		client.request("delete_everything")
+
+	client.reset()
+	assert client.ping() == "pong", "the connection should survive errors"
+
+
+def test_socket(client, tmp_path, stub_grafana):
+	from grafanarmadillo.serve import Server, Worker
+
+	socket_path = tmp_path / "s.sock"
+	assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600, "only the user should be able to connect"
+	with pytest.raises(OSError):
+		Server(socket_path, Worker(GrafanaApi(**stub_grafana.cfg)))
+	assert client.ping() == "pong", "the running server's socket should not be replaced"
+
+
+def test_socket__stale(tmp_path, stub_grafana):
+	from grafanarmadillo.serve import Server, Worker
+
+	socket_path = tmp_path / "s.sock"
+	stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	stale.bind(str(socket_path))
+	stale.close()
+
+	with Server(socket_path, Worker(GrafanaApi(**stub_grafana.cfg))) as server:
+		assert server.socket_path.is_socket()
+
+
+def test_writes_invalidate_searches(stub_grafana):
+	from grafanarmadillo.serve import Worker
+
+	worker = Worker(GrafanaApi(**stub_grafana.cfg))
+	dashboard = worker.finder.get_dashboard("folder0", "dashboard0")
+	content, _ = worker.dashboarder().export_dashboard(dashboard)
+	assert dashboard in worker.finder.get_dashboards_in_folders(["folder0"])
+
+	worker.dashboarder().import_dashboard({**content, "title": "moved"}, worker.finder.get_folder("folder1"))
+
+	assert dashboard["uid"] not in {d["uid"] for d in worker.finder.get_dashboards_in_folders(["folder0"])}
+	assert "moved" in {d["title"] for d in worker.finder.list_dashboards()}
+
+
+def test_import_does_not_need_click():
+	statement = "import sys\nimport grafanarmadillo.serve\nprint('click' in sys.modules)\n"
+	result = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, check=True)
+	assert result.stdout.strip() == "False", "clients should not import the CLI"
@@ -0,0 +1,244 @@
+"""Test the stub Grafana, and that it works with the rest of Grafanarmadillo."""
+import pytest
+from grafana_client import GrafanaApi
+from grafana_client.client import GrafanaClientError, GrafanaServerError
+
+from grafanarmadillo.alerter import Alerter
+from grafanarmadillo.bulk import (
+	TOK_ALERTS,
+	TOK_DASHBOARDS,
+	BulkExporter,
+	BulkImporter,
+	BulkImportError,
+	Checkpoint,
+	JSONLinesLayout,
+	TreeLayout,
+)
+from grafanarmadillo.dashboarder import Dashboarder
+from grafanarmadillo.find import Finder
+from grafanarmadillo.stubgrafana import Faults, StubGrafana, StubGrafanaState
+from grafanarmadillo.templator import Templator, alert_dashboarduid_templator
+from grafanarmadillo.throttle import Throttle
+from grafanarmadillo.types import GrafanaPath
+
+
+@pytest.fixture
+def stub_grafana():
+	state = StubGrafanaState()
+	state.seed(n_orgs=2, n_folders=2, n_dashboards=3, n_alerts=1)
+	with StubGrafana(state) as grafana:
+		yield grafana
+
+
+def test_finder(stub_grafana):
+	gfn = GrafanaApi(**stub_grafana.cfg)
+	finder = Finder(gfn)
+
+	assert len(finder.list_dashboards()) == 2 * 3
+	dashboard = finder.get_dashboard("folder1", "dashboard2")
+	assert finder.get_dashboard_by_uid(dashboard["uid"]).folder == "folder1"
+	assert finder.get_alert("folder0", "alert0")["title"] == "alert0"
+	assert finder.get_folder("General")["id"] == 0
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_finder__pages(workers):
+	state = StubGrafanaState()
+	state.seed(n_orgs=1, n_folders=1, n_dashboards=25)
+	with StubGrafana(state) as grafana:
+		finder = Finder(GrafanaApi(**grafana.cfg))
+
+		dashboards = finder.list_dashboards(page_size=10, workers=workers)
+		assert len({d["uid"] for d in dashboards}) == 25
+		searches = state.requests["search"]
+		assert finder.list_dashboards(page_size=10, workers=workers) == dashboards
+		assert state.requests["search"] == searches, "pages should be cached"
+
+		finder.create_or_get_dashboard("/folder0/new")
+		assert len(finder.list_dashboards(page_size=10, workers=workers)) == 26
+
+
+def test_create_and_export(stub_grafana):
+	gfn = GrafanaApi(**stub_grafana.cfg)
+	finder, dashboarder, alerter = Finder(gfn), Dashboarder(gfn), Alerter(gfn)
+
+	dashboard, folder = finder.create_or_get_dashboard("/new folder/new dashboard")
+	dashboarder.set_dashboard_content(dashboard, {"title": "new dashboard", "panels": [{"id": 1}]})
+	content, exported_folder = dashboarder.export_dashboard(dashboard)
+	assert content["panels"] == [{"id": 1}]
+	assert content["version"] == 2
+	assert exported_folder["title"] == "new folder"
+
+	alert, alert_folder = finder.create_or_get_alert("/new folder/new alert")
+	alerter.import_alert({**alert, "condition": "B"}, alert_folder)
+	assert alerter.export_alert(alert)[0]["condition"] == "B"
+
+
+def test_orgs(stub_grafana):
+	org = stub_grafana.state.org_by_name("org1")
+	gfn = GrafanaApi(**stub_grafana.cfg, organization_id=org.id)
+
+	assert len(gfn.organizations.list_organization()) == 2
+	assert {d["uid"] for d in Finder(gfn).list_dashboards()} == set(org.dashboards)
+
+
+def test_not_found(stub_grafana):
+	gfn = GrafanaApi(**stub_grafana.cfg)
+
+	with pytest.raises(GrafanaClientError) as e:
+		gfn.dashboard.get_dashboard("missing")
+	assert e.value.status_code == 404
+
+
+def test_bulk_roundtrip(stub_grafana, tmp_path):
+	BulkExporter(stub_grafana.cfg, tmp_path, Templator()).run()
+	importer = BulkImporter(stub_grafana.cfg, tmp_path, Templator(), dry_run=True)
+	importer.run()
+
+	assert importer.plan.summary().splitlines()[0] == "create=0 update=0 noop=16"
+
+
+def test_faults():
+	faults = Faults(error_rate=1, error_status=503, retry_after=0, routes=frozenset({"list_orgs"}))
+	with StubGrafana(faults=faults) as grafana:
+		gfn = GrafanaApi(**grafana.cfg)
+		with pytest.raises(GrafanaServerError):
+			gfn.organizations.list_organization()
+		Finder(gfn).list_dashboards()
+
+		assert grafana.state.requests["list_orgs"] == 1
+		assert grafana.state.requests["search"] == 1
+
+
+def test_faults__retried():
+	faults = Faults(error_rate=0.5, error_status=429, retry_after=0, seed=1)
+	with StubGrafana(faults=faults) as grafana:
+		throttle = Throttle(max_retries=20, backoff_base=0)
+		gfn = throttle.wrap(GrafanaApi(**grafana.cfg))
+
+		for _ in range(10):
+			gfn.organizations.list_organization()
+
+		assert throttle.metrics.throttled > 0
+		assert grafana.state.requests["list_orgs"] == 10 + throttle.metrics.retries
+
+
+def test_latency():
+	with StubGrafana(faults=Faults(latency=0.05)) as grafana:
+		throttle = Throttle(latency_target=0.01, rate=100)
+		gfn = throttle.wrap(GrafanaApi(**grafana.cfg))
+		gfn.organizations.list_organization()
+
+		assert throttle.metrics.slowdowns == 1
+
+
+def test_bulk_export__prefetch(stub_grafana, tmp_path):
+	serial, prefetched = tmp_path / "serial", tmp_path / "prefetched"
+	BulkExporter(stub_grafana.cfg, serial, Templator(), layout=JSONLinesLayout(serial), prefetch=1).run()
+	BulkExporter(stub_grafana.cfg, prefetched, Templator(), layout=JSONLinesLayout(prefetched), prefetch=4, prefetch_buffer=2).run()
+
+	files = list(serial.glob("*/*.jsonl"))
+	assert files
+	for f in files:
+		assert f.read_text() == (prefetched / f.relative_to(serial)).read_text()
+
+
+def test_finder__resolve_dashboard_uids(stub_grafana):
+	gfn = GrafanaApi(**stub_grafana.cfg)
+	finder = Finder(gfn)
+	uids = [d["uid"] for d in finder.list_dashboards()]
+
+	searches = stub_grafana.state.requests["search"]
+	resolved = finder.resolve_dashboard_uids([*uids, "missing"], chunk_size=4)
+	assert stub_grafana.state.requests["search"] == searches + 2
+	assert set(resolved) == set(uids)
+	assert {p.folder for p in resolved.values()} == {"folder0", "folder1"}
+
+	assert finder.get_dashboard_by_uid(uids[0]) == resolved[uids[0]]
+	assert stub_grafana.state.requests["search"] == searches + 2, "resolved paths should be cached"
+	assert stub_grafana.state.requests["get_dashboard"] == 0
+	with pytest.raises(GrafanaClientError):
+		finder.get_dashboard_by_uid("missing")
+
+
+def _write_referencing_alerts(root, n):
+	layout = TreeLayout(root)
+	for i in range(n):
+		layout.write(TOK_DASHBOARDS, GrafanaPath(f"d{i}", "f", "Main Org."), {"title": f"d{i}", "panels": []})
+		alert = {"title": f"a{i}", "ruleGroup": "g", "condition": "A", "data": [], "annotations": {"__dashboardUid__": f"$$f/d{i}"}}
+		layout.write(TOK_ALERTS, GrafanaPath(f"a{i}", "f", "Main Org."), alert)
+	layout.write(TOK_ALERTS, GrafanaPath("unrelated", "f", "Main Org."), {"title": "unrelated", "ruleGroup": "g", "condition": "A", "data": []})
+
+
+def test_bulk_import__workers(tmp_path):
+	_write_referencing_alerts(tmp_path, 10)
+	state = StubGrafanaState()
+	with StubGrafana(state) as grafana:
+		templator = alert_dashboarduid_templator(Finder(GrafanaApi(**grafana.cfg)))
+		BulkImporter(grafana.cfg, tmp_path, templator, workers=4).run()
+
+	org = state.orgs[1]
+	assert state.requests["create_folder"] == 1
+	uids = {stored["dashboard"]["title"]: uid for uid, stored in org.dashboards.items()}
+	for alert in org.alerts.values():
+		if alert["title"] != "unrelated":
+			assert alert["annotations"]["__dashboardUid__"] == uids["d" + alert["title"][1:]]
+
+
+def test_bulk_import__workers_with_latency(tmp_path):
+	_write_referencing_alerts(tmp_path, 40)
+	state = StubGrafanaState()
+	faults = Faults(latency=0.01, latency_jitter=0.02, routes=frozenset({"save_dashboard"}), seed=0)
+	with StubGrafana(state, faults) as grafana:
+		templator = alert_dashboarduid_templator(Finder(GrafanaApi(**grafana.cfg)))
+		BulkImporter(grafana.cfg, tmp_path, templator, workers=16).run()
+
+	org = state.orgs[1]
+	assert len(org.dashboards) == 40, "alerts should not create the dashboards they reference"
+	assert state.requests["save_dashboard"] == 40
+	uids = {stored["dashboard"]["title"]: uid for uid, stored in org.dashboards.items()}
+	for alert in org.alerts.values():
+		if alert["title"] != "unrelated":
+			assert alert["annotations"]["__dashboardUid__"] == uids["d" + alert["title"][1:]]
+
+
+def test_bulk_import__workers_errors(tmp_path):
+	_write_referencing_alerts(tmp_path, 3)
+	state = StubGrafanaState()
+	with StubGrafana(state, Faults(error_rate=1, error_status=400, routes=frozenset({"save_dashboard"}))) as grafana:
+		templator = alert_dashboarduid_templator(Finder(GrafanaApi(**grafana.cfg)))
+		with pytest.raises(BulkImportError) as e:
+			BulkImporter(grafana.cfg, tmp_path, templator, workers=4).run()
+
+	assert sorted((kind, path.name) for kind, path, _ in e.value.errors) == [
+		(TOK_ALERTS, "a0"), (TOK_ALERTS, "a1"), (TOK_ALERTS, "a2"),
+		(TOK_DASHBOARDS, "d0"), (TOK_DASHBOARDS, "d1"), (TOK_DASHBOARDS, "d2"),
+	]
+	assert [a["title"] for a in state.orgs[1].alerts.values()] == ["unrelated"], "alerts should wait for the dashboards they reference"
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_bulk_import__checkpoint(stub_grafana, tmp_path, workers):
+	BulkExporter(stub_grafana.cfg, tmp_path / "resources", Templator()).run()
+	journal = tmp_path / "checkpoint.jsonl"
+
+	state = StubGrafanaState()
+	state.add_org("org1")
+	with StubGrafana(state, Faults(error_rate=1, error_status=400, routes=frozenset({"create_alert"}))) as target:
+		with pytest.raises(Exception):
+			BulkImporter(target.cfg, tmp_path / "resources", Templator(), workers=workers, checkpoint=Checkpoint(journal)).run()
+	saved = state.requests["save_dashboard"]
+	assert saved > 0
+
+	with StubGrafana(state) as target:
+		BulkImporter(target.cfg, tmp_path / "resources", Templator(), workers=workers, checkpoint=Checkpoint(journal)).run()
+		assert state.requests["save_dashboard"] == 2 * 2 * 3, "completed dashboards should be skipped"
+		assert all(len(org.alerts) == 2 for org in state.orgs.values())
+
+		BulkImporter(target.cfg, tmp_path / "resources", Templator(), workers=workers, checkpoint=Checkpoint(journal)).run()
+		assert state.requests["save_dashboard"] == 2 * 2 * 3, "completed objects should be skipped"
+
+		changed = next((tmp_path / "resources").rglob("dashboard0.json"))
+		changed.write_text(changed.read_text().replace('"dashboard0"', '"changed"'))
+		BulkImporter(target.cfg, tmp_path / "resources", Templator(), workers=workers, checkpoint=Checkpoint(journal)).run()
+		assert state.requests["save_dashboard"] == 2 * 2 * 3 + 1, "objects which changed should be imported again, even in completed orgs"
@@ -3,12 +3,13 @@ import pytest
 from grafanarmadillo.templator import (
 	DashboardTransformer,
 	Templator,
+	TemplatorProfile,
 	combine_transformers,
 	findreplace,
 	panel_transformer,
 )
 from grafanarmadillo.types import DashboardContent
-from grafanarmadillo.util import project_dashboard_identity
+from grafanarmadillo.util import JSONSelector, project_dashboard_identity
 from tests.conftest import read_json_file
 
 
@@ -76,6 +77,59 @@ def test_findreplace(in_, out_):
 	assert out_ == r
 
 
+@pytest.mark.parametrize(
+	"selector,out_",
+	[
+		(JSONSelector(include=["t"]), {"t": "A", "p": [{"t": "a", "q": {"e": "a"}}]}),
+		(JSONSelector(include=["**.t"]), {"t": "A", "p": [{"t": "A", "q": {"e": "a"}}]}),
+		(JSONSelector(include=["p.*.q"]), {"t": "a", "p": [{"t": "a", "q": {"e": "A"}}]}),
+		(JSONSelector(include=["p.0"]), {"t": "a", "p": [{"t": "A", "q": {"e": "A"}}]}),
+		(JSONSelector(include=["p.1"]), {"t": "a", "p": [{"t": "a", "q": {"e": "a"}}]}),
+		(JSONSelector(exclude=["p"]), {"t": "A", "p": [{"t": "a", "q": {"e": "a"}}]}),
+		(JSONSelector(exclude=["**.q"]), {"t": "A", "p": [{"t": "A", "q": {"e": "a"}}]}),
+		(JSONSelector(include=["p"], exclude=["**.e"]), {"t": "a", "p": [{"t": "A", "q": {"e": "a"}}]}),
+		(JSONSelector(include=["p.*.?"]), {"t": "a", "p": [{"t": "A", "q": {"e": "A"}}]}),
+		(JSONSelector(include=[]), {"t": "a", "p": [{"t": "a", "q": {"e": "a"}}]}),
+	],
+)
+def test_findreplace__selector(selector, out_):
+	fr = findreplace({"a": "A"}, selector)
+
+	r = fr(DashboardContent({"t": "a", "p": [{"t": "a", "q": {"e": "a"}}]}))
+	assert out_ == r
+
+
+def test_findreplace__selector_realistic():
+	original = read_json_file("dashboard.json")
+	fr = findreplace({"cdgngjl71kao0d": "${ds}", "ddgngrxsn670gf": "${uid}"}, JSONSelector(include=["**.datasource.uid"]))
+
+	r = fr(original)
+
+	assert r["panels"][0]["datasource"]["uid"] == "${ds}"
+	assert r["panels"][0]["targets"][0]["datasource"]["uid"] == "${ds}"
+	assert r["uid"] == original["uid"]
+
+
+def test_findreplace__memo():
+	fr = findreplace({"a": "A"}, memo_size=16)
+
+	r = fr(DashboardContent({"x": ["a0", "a0", "b0"], "y": "a0"}))
+
+	assert r == {"x": ["A0", "A0", "b0"], "y": "A0"}
+	info = fr.cache_info()
+	assert info.misses == 1, "only candidate strings should be memoised"
+	assert info.hits == 2
+
+
+def test_findreplace__memo_bounded():
+	fr = findreplace({"a": "A"}, memo_size=2)
+
+	r = fr(DashboardContent([f"a{i}" for i in range(10)]))
+
+	assert r == [f"A{i}" for i in range(10)]
+	assert fr.cache_info().currsize == 2
+
+
 def make_test_transformer(k, v) -> DashboardTransformer:
 	def _transformer(dashboard: DashboardContent) -> DashboardContent:
 		d = dashboard.copy()
@@ -120,3 +174,36 @@ def test_panel_transformer(unique):
 
 	assert r["panels"][0]["title"] == unique
 	assert all(map(lambda x: x["title"] == unique, r["panels"]))
+
+
+def test_profile():
+	"""Test that each stage of a chained templator is measured for each dashboard."""
+	profile = TemplatorProfile()
+	grow = make_test_transformer("big", "x" * 100)
+	templator = Templator(make_template=findreplace({"a": "b"})).chain(Templator(make_template=grow)).profiled(profile)
+
+	for title in ["d0", "d1", "d1"]:
+		templator.make_template_from_dashboard(DashboardContent({"title": title, "k": "a"}))
+
+	rows = {r["stage"]: r for r in profile.rows()}
+	assert set(rows) == {"make_template[0] _findreplace", "make_template[1] _transformer"}
+	assert rows["make_template[0] _findreplace"]["calls"] == 3
+	grow_row = rows["make_template[1] _transformer"]
+	assert grow_row["bytes_out"] - grow_row["bytes_in"] > 300
+
+	by_dashboard = {(r["stage"], r["dashboard"]): r["calls"] for r in profile.rows(by_dashboard=True)}
+	assert by_dashboard[("make_template[0] _findreplace", "d1")] == 2
+
+	table = profile.format_table()
+	assert table.splitlines()[0].split() == ["stage", "calls", "total_ms", "mean_ms", "bytes_in", "bytes_out"]
+	assert len(table.splitlines()) == 3
+
+
+def test_profile__preserves_results():
+	d = read_json_file("dashboard.json")
+	templator = Templator(make_template=findreplace({"stg": "$env"}))
+
+	expected = templator.make_template_from_dashboard(d)
+	profiled = templator.profiled(TemplatorProfile(measure_bytes=False)).make_template_from_dashboard(d)
+
+	assert profiled == expected
@@ -1,10 +1,14 @@
 """Tests for templators that require integration."""
-from dataclasses import dataclass
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, List
+from unittest import mock
 
+import pytest
 from grafana_client.client import GrafanaClientError
 
-from grafanarmadillo.templator import alert_dashboarduid_templator
+from grafanarmadillo.templator import DashboardRefMemo, alert_dashboarduid_templator
 from grafanarmadillo.types import GrafanaPath
 from tests.conftest import read_json_file
 
@@ -15,6 +19,8 @@ class MockFinder:
 
 	result: Any
 	args: Any = None
+	dashboards: List[dict] = field(default_factory=list)
+	listings: int = 0
 
 	def val(self, *args):
 		self.args = args
@@ -26,6 +32,10 @@ class MockFinder:
 	def get_dashboard_by_uid(self, uid):
 		return self.val()
 
+	def list_dashboards(self):
+		self.listings += 1
+		return self.dashboards
+
 	def create_or_get_dashboard(self, path):
 		return self.val()
 
@@ -49,6 +59,78 @@ class TestAlertDashboardUid:
 
 		assert template["annotations"]["__dashboardUid__"] == "$$test%2Bfolder/test%2Fname", "when dashboard uid was found it was not replaced by the corresponding reference"
 
+	def test_memo(self):
+		dashboards = [{"uid": "uid0", "title": "name", "folderTitle": "folder"}, {"uid": "uid1", "title": "other"}]
+		finder = MockFinder(RuntimeError("should have been found in the listing"), dashboards=dashboards)
+		t = alert_dashboarduid_templator(finder, warm=True)
+
+		alert = read_json_file("alert_rule.json")
+		alert["annotations"]["__dashboardUid__"] = "uid0"
+		assert t.make_template(alert)["annotations"]["__dashboardUid__"] == "$$folder/name"
+		alert["annotations"]["__dashboardUid__"] = "$$General/other"
+		assert t.fill_template(alert)["annotations"]["__dashboardUid__"] == "uid1"
+		assert finder.listings == 1, "dashboards should be listed once"
+
+	def test_memo__concurrent_warm(self):
+		class SlowFinder(MockFinder):
+			def list_dashboards(self):
+				time.sleep(0.05)
+				return super().list_dashboards()
+
+		finder = SlowFinder(RuntimeError("should have been found in the listing"), dashboards=[{"uid": "uid0", "title": "name", "folderTitle": "folder"}])
+		memo = DashboardRefMemo(finder, warm=True)
+		with ThreadPoolExecutor(8) as pool:
+			paths = list(pool.map(lambda _: memo.path_of("uid0"), range(8)))
+
+		assert paths == [GrafanaPath("name", "folder")] * 8, "callers should wait for the listing instead of looking dashboards up"
+		assert finder.listings == 1
+
+	def test_memo__failed_warm(self):
+		class FlakyFinder(MockFinder):
+			def list_dashboards(self):
+				if self.listings == 0:
+					self.listings += 1
+					raise GrafanaClientError(503, "", "")
+				return super().list_dashboards()
+
+		finder = FlakyFinder(RuntimeError("should have been found in the listing"), dashboards=[{"uid": "uid0", "title": "name"}])
+		memo = DashboardRefMemo(finder, warm=True)
+		with pytest.raises(GrafanaClientError):
+			memo.warm()
+
+		assert memo.path_of("uid0") == GrafanaPath("name", "General"), "a failed listing should be retried"
+
+	def test_memo__not_warm_by_default(self):
+		finder = MockFinder(GrafanaPath("name", "folder"), dashboards=[{"uid": "uid0", "title": "name", "folderTitle": "folder"}])
+		memo = DashboardRefMemo(finder)
+
+		assert memo.path_of("uid0") == GrafanaPath("name", "folder")
+		assert memo.path_of("uid0") == GrafanaPath("name", "folder")
+		assert finder.listings == 0, "a single lookup should not list all dashboards"
+
+	def test_memo__orgs(self):
+		finder = MockFinder(({"uid": "looked-up"}, {}))
+		memo = DashboardRefMemo(finder, org="org1")
+		memo.remember("uid2", GrafanaPath("name", "folder", "org2"))
+		memo.remember("uid1", GrafanaPath("name", "folder", "org1"))
+		memo.remember("uid2-other", GrafanaPath("other", "folder", "org2"))
+
+		assert memo.uid_of(GrafanaPath("name", "folder")) == "uid1"
+		assert memo.path_of("uid1") == GrafanaPath("name", "folder")
+		assert memo.uid_of(GrafanaPath("other", "folder")) == "looked-up", "dashboards in other orgs should not be used"
+
+	def test_memo__org_is_looked_up(self):
+		finder = MockFinder(RuntimeError("should have been remembered"))
+		finder.api = mock.Mock()
+		finder.api.organization.get_current_organization.return_value = {"id": 1, "name": "org1"}
+		memo = DashboardRefMemo(finder)
+		memo.remember("uid1", GrafanaPath("name", "folder", "org1"))
+		memo.remember("uid0", GrafanaPath("name", "folder"))
+
+		assert memo.org == "org1"
+		assert memo.uid_of(GrafanaPath("name", "folder")) == "uid0"
+		assert finder.api.organization.get_current_organization.call_count == 1
+
 	def test_ref2uid__nonmangled(self):
 		t = alert_dashboarduid_templator(MockFinder(RuntimeError("should not have been invoked")))
 
@@ -0,0 +1,213 @@
+"""Test rate limits and retries."""
+import asyncio
+import json
+from unittest import mock
+
+import niquests
+import pytest
+from grafana_client import AsyncGrafanaApi, GrafanaApi
+from grafana_client.client import GrafanaServerError
+
+from grafanarmadillo.throttle import (
+	AsyncThrottledSession,
+	Throttle,
+	ThrottledSession,
+	TokenBucket,
+)
+
+
+class FakeClock:
+	"""A clock which only advances when something sleeps."""
+
+	def __init__(self):
+		self.now = 0.0
+		self.sleeps = []
+
+	def __call__(self) -> float:
+		return self.now
+
+	def sleep(self, t: float):
+		self.sleeps.append(t)
+		self.now += t
+
+	async def asleep(self, t: float):
+		self.sleep(t)
+
+
+def response(status: int, body=None, headers=None) -> niquests.Response:
+	r = niquests.Response()
+	r.status_code = status
+	r._content = json.dumps(body if body is not None else {}).encode()
+	r.headers.update({"Content-Type": "application/json", **(headers or {})})
+	return r
+
+
+def make_throttle(clock: FakeClock, **kwargs) -> Throttle:
+	return Throttle(clock=clock, sleep=clock.sleep, asleep=clock.asleep, jitter=lambda: 1.0, **kwargs)
+
+
+def make_session(*outcomes):
+	session = mock.Mock()
+	session.request.side_effect = list(outcomes)
+	return session
+
+
+class TestTokenBucket:
+	def test_burst_then_rate(self):
+		clock = FakeClock()
+		bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+
+		waits = [bucket.acquire() for _ in range(4)]
+
+		assert waits == [0, 0, 0.5, 0.5]
+		assert clock.sleeps == [0.5, 0.5]
+
+	def test_reserve_does_not_sleep(self):
+		clock = FakeClock()
+		bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep=clock.sleep)
+
+		assert [bucket.reserve() for _ in range(3)] == [0, 0.5, 1.0]
+		assert clock.sleeps == []
+
+	def test_adapts_within_bounds(self):
+		clock = FakeClock()
+		bucket = TokenBucket(rate=16, min_rate=2, clock=clock, sleep=clock.sleep)
+
+		for _ in range(10):
+			bucket.slow_down()
+		assert bucket.rate == 2
+
+		for _ in range(40):
+			bucket.speed_up()
+		assert bucket.rate == 16
+
+
+class TestThrottle:
+	def test_retries_429_with_retry_after(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=3)
+		session = make_session(response(429, headers={"Retry-After": "7"}), response(200))
+
+		r = throttle.request(session, "grafana", "POST", "/api/dashboards/db")
+
+		assert r.status_code == 200
+		assert clock.sleeps == [7.0]
+		assert throttle.metrics.retries == 1
+		assert throttle.metrics.throttled == 1
+
+	def test_long_retry_after_is_ignored(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=3, backoff_base=1, max_backoff=60)
+		session = make_session(response(503, headers={"Retry-After": "86400"}), response(200))
+
+		r = throttle.request(session, "grafana", "GET", "/api/search")
+
+		assert r.status_code == 200
+		assert clock.sleeps == [1]
+
+	def test_backoff_is_capped(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=4, backoff_base=1, backoff_cap=3)
+		session = make_session(*[response(502)] * 4, response(200))
+
+		throttle.request(session, "grafana", "GET", "/api/search")
+
+		assert clock.sleeps == [1, 2, 3, 3]
+
+	def test_post_not_retried_on_500(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=3)
+		session = make_session(response(500), response(200))
+
+		r = throttle.request(session, "grafana", "POST", "/api/dashboards/db")
+
+		assert r.status_code == 500
+		assert session.request.call_count == 1
+
+	def test_connection_errors(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=1)
+
+		get_session = make_session(niquests.exceptions.ConnectionError(), response(200))
+		assert throttle.request(get_session, "grafana", "GET", "/api/search").status_code == 200
+
+		post_session = make_session(niquests.exceptions.ConnectionError(), response(200))
+		with pytest.raises(niquests.exceptions.ConnectionError):
+			throttle.request(post_session, "grafana", "POST", "/api/dashboards/db")
+
+		assert throttle.metrics.connection_errors == 2
+
+	def test_exhausted_returns_last_response(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=2)
+		session = make_session(*[response(503)] * 3)
+
+		r = throttle.request(session, "grafana", "GET", "/api/search")
+
+		assert r.status_code == 503
+		assert throttle.metrics.requests == 3
+		assert throttle.metrics.retries == 2
+
+	def test_slows_down_on_latency(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, rate=10, latency_target=1)
+
+		def slow_request(*args, **kwargs):
+			clock.now += 2
+			return response(200)
+
+		session = mock.Mock()
+		session.request.side_effect = slow_request
+		throttle.request(session, "grafana", "GET", "/api/search")
+
+		assert throttle.bucket("grafana").rate == 5
+		assert throttle.metrics.slowdowns == 1
+
+	def test_buckets_per_host(self):
+		throttle = Throttle(rate=10)
+		assert throttle.bucket("a") is throttle.bucket("a")
+		assert throttle.bucket("a") is not throttle.bucket("b")
+		assert Throttle().bucket("a") is None
+
+
+class TestWrap:
+	def test_grafana_api_errors_after_retries(self):
+		"""Retries are exhausted, so GrafanaApi raises its own errors."""
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=1)
+		gfn = GrafanaApi.from_url("http://localhost:3000")
+		gfn.client.s = make_session(response(500), response(500))
+
+		throttle.wrap(gfn)
+		with pytest.raises(GrafanaServerError):
+			gfn.search.search_dashboards()
+
+		assert throttle.metrics.server_errors == 2
+
+	def test_grafana_api_recovers(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, max_retries=1)
+		gfn = GrafanaApi.from_url("http://localhost:3000")
+		gfn.client.s = make_session(response(429), response(200, [{"uid": "a"}]))
+
+		throttle.wrap(gfn)
+		throttle.wrap(gfn)
+
+		assert gfn.search.search_dashboards() == [{"uid": "a"}]
+		assert isinstance(gfn.client.s, ThrottledSession)
+		assert not isinstance(gfn.client.s._session, ThrottledSession)
+
+	def test_async_grafana_api_recovers(self):
+		clock = FakeClock()
+		throttle = make_throttle(clock, rate=1, burst=1, max_retries=1)
+		gfn = AsyncGrafanaApi.from_url("http://localhost:3000")
+		gfn.client.s = mock.AsyncMock()
+		gfn.client.s.request.side_effect = [response(429, headers={"Retry-After": "3"}), response(200, [{"uid": "a"}])]
+
+		throttle.wrap(gfn)
+
+		assert asyncio.run(gfn.search.search_dashboards()) == [{"uid": "a"}]
+		assert isinstance(gfn.client.s, AsyncThrottledSession)
+		assert clock.sleeps == [3.0]
+		assert throttle.metrics.slowdowns == 1
+		assert throttle.metrics.retries == 1
@@ -0,0 +1,65 @@
+"""Tests for helpers."""
+import threading
+import time
+
+import pytest
+
+from grafanarmadillo.util import Cache, prefetch_map
+
+
+class TestPrefetchMap:
+	"""Test mapping over items in a pool of threads."""
+
+	def test_ordered(self):
+		def slow_for_small(x):
+			time.sleep((10 - x) / 1000)
+			return x
+
+		assert list(prefetch_map(slow_for_small, range(10), workers=4)) == list(range(10))
+
+	def test_bounded(self):
+		started = []
+		lock = threading.Lock()
+
+		def f(x):
+			with lock:
+				started.append(x)
+			return x
+
+		results = prefetch_map(f, range(100), workers=2, lookahead=3)
+		next(results)
+		time.sleep(0.05)
+
+		assert len(started) <= 4, "should not run ahead of the consumer by more than the lookahead"
+		results.close()
+
+	def test_raises(self):
+		def f(x):
+			if x == 3:
+				raise ValueError(x)
+			return x
+
+		results = prefetch_map(f, range(10), workers=2)
+		assert [next(results) for _ in range(3)] == [0, 1, 2]
+		with pytest.raises(ValueError):
+			next(results)
+
+
+class TestCache:
+	"""Test caching values."""
+
+	def test_falsy_only_cached_when_asked(self):
+		cache = Cache()
+		calls = []
+
+		def f():
+			calls.append(1)
+			return []
+
+		cache.getor("empty", f)
+		cache.getor("empty", f)
+		assert len(calls) == 2
+
+		cache.getor("empty_cached", f, cache_falsy=True)
+		cache.getor("empty_cached", f, cache_falsy=True)
+		assert len(calls) == 3